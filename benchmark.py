@@ -0,0 +1,1506 @@
+"""قياسات أداء محلية لمراحل إنتاج المحتوى
+
+الاستخدام:
+    python benchmark.py backgrounds [--repeat 5]
+    python benchmark.py long-video [--slides-only] [--workers N]
+    python benchmark.py encoders [--short]
+    python benchmark.py segments
+    python benchmark.py workflow [--generate-s 20] [--upload-s 30] [--min-duration 300]
+    python benchmark.py upload [--size-mb 64] [--chunk-mb 4] [--fail-after 5]
+    python benchmark.py ledger [--entries 100000] [--workers 4]
+    python benchmark.py duplicates [--topics 50000] [--scripts 5000]
+    python benchmark.py stream [--words-per-s 40] [--min-duration 300]
+    python benchmark.py layout [--texts 300]
+    python benchmark.py narration [--latency-s 0.5] [--concurrency 4]
+    python benchmark.py music [--track-s 180] [--duration 300]
+    python benchmark.py encoder-profile [--format long]
+    python benchmark.py suite [--quick] [--cases ...] [--output PATH] [--baseline PATH] [--save-baseline]
+                              [--threshold 0.15]
+    python benchmark.py trace [--spans 20000] [--slides 30]
+    python benchmark.py memory [--scenes 8 32] [--scene-s 1] [--size 1920x1080]
+    python benchmark.py artifacts [--runs 10] [--cap-mb 64] [--run-mb 24]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import textwrap
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from concurrent.futures import ProcessPoolExecutor
+
+from main import (FONT_BOLD, FONT_REGULAR, ArtifactStore, BackgroundCache, ContentEmpire, ContentLedger, EncoderTuner,
+                  GeminiClient, MusicLibrary, NarrationCache, Narrator, NearDuplicateIndex, OfflineTTSBackend,
+                  ProfessionalVideoCreator, ResponseCache, ScenePlan, ScriptSegmenter, SegmentCache,
+                  StillImageEncoder, TextLayout, TRACER, Tracer, YouTubeUploader, moviepy_editor)
+
+SLIDE_SIZES = [(1920, 1080), (1080, 1920)]
+
+def legacy_background(creator, size, pattern_type):
+    """التنفيذ القديم بالرسم عبر ImageDraw، للمقارنة فقط"""
+    if pattern_type == "gradient":
+        color1 = random.choice(creator.background_colors)
+        color2 = random.choice([c for c in creator.background_colors if c != color1])
+        image = Image.new('RGB', size, color1)
+        draw = ImageDraw.Draw(image)
+        for i in range(size[1]):
+            r = int(color1[0] + (color2[0] - color1[0]) * (i / size[1]))
+            g = int(color1[1] + (color2[1] - color1[1]) * (i / size[1]))
+            b = int(color1[2] + (color2[2] - color1[2]) * (i / size[1]))
+            draw.line([(0, i), (size[0], i)], fill=(r, g, b))
+    elif pattern_type == "dots":
+        image = Image.new('RGB', size, random.choice(creator.background_colors))
+        draw = ImageDraw.Draw(image)
+        for _ in range(200):
+            x = random.randint(0, size[0])
+            y = random.randint(0, size[1])
+            radius = random.randint(2, 6)
+            brightness = random.randint(180, 255)
+            draw.ellipse([x, y, x + radius, y + radius], fill=(brightness,) * 3)
+    elif pattern_type == "circuit":
+        base_color = random.choice(creator.background_colors)
+        image = Image.new('RGB', size, (10, 10, 20))
+        draw = ImageDraw.Draw(image)
+        for _ in range(50):
+            x1 = random.randint(0, size[0])
+            y1 = random.randint(0, size[1])
+            x2 = x1 + random.randint(50, 200)
+            y2 = y1 + random.randint(-50, 50)
+            draw.line([(x1, y1), (x2, y2)], fill=base_color, width=2)
+            draw.ellipse([x1-3, y1-3, x1+3, y1+3], fill=(0, 255, 0))
+            draw.ellipse([x2-3, y2-3, x2+3, y2+3], fill=(255, 0, 0))
+    else:
+        image = Image.new('RGB', size, random.choice(creator.background_colors))
+    return image
+
+def time_call(func, repeat):
+    """أفضل زمن (بالميلي ثانية) من عدة تكرارات"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def bench_backgrounds(repeat=5):
+    creator = ProfessionalVideoCreator()
+    results = []
+
+    for size in SLIDE_SIZES:
+        for pattern in creator.visual_patterns:
+            legacy_ms = time_call(lambda: legacy_background(creator, size, pattern), repeat)
+            legacy_array_ms = time_call(lambda: np.asarray(legacy_background(creator, size, pattern)), repeat)
+            engine_ms = time_call(lambda: creator.create_dynamic_background(size, pattern, use_cache=False), repeat)
+            array_ms = time_call(
+                lambda: creator.create_dynamic_background(size, pattern, as_array=True, use_cache=False), repeat)
+            cached_ms = time_call(
+                lambda: creator.background_cache.get(pattern, size, (25, 99, 235), (124, 58, 237), variant=0), repeat)
+            results.append({
+                "size": f"{size[0]}x{size[1]}",
+                "pattern": pattern,
+                "legacy_ms": round(legacy_ms, 2),
+                "legacy_array_ms": round(legacy_array_ms, 2),
+                "engine_ms": round(engine_ms, 2),
+                "array_ms": round(array_ms, 2),
+                "cached_ms": round(cached_ms, 2),
+            })
+
+    # "legacy" للأنماط lines/grid/waves كان لوناً ثابتاً فقط
+    print(f"{'size':<10} {'pattern':<9} {'legacy ms':>10} {'legacy+array':>13} {'PIL ms':>8} {'array ms':>9} {'cached ms':>10}")
+    for row in results:
+        print(f"{row['size']:<10} {row['pattern']:<9} {row['legacy_ms']:>10.2f} {row['legacy_array_ms']:>13.2f} "
+              f"{row['engine_ms']:>8.2f} {row['array_ms']:>9.2f} {row['cached_ms']:>10.2f}")
+    return results
+
+def snapshot_files(*paths):
+    files = {}
+    for path in paths:
+        for root, _, names in os.walk(path):
+            for name in names:
+                full = os.path.join(root, name)
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    continue
+                files[full] = (stat.st_size, stat.st_mtime_ns, (stat.st_dev, stat.st_ino))
+    return files
+
+def bytes_written_since(before, *paths):
+    """مجموع أحجام الملفات الجديدة أو المعدّلة منذ اللقطة السابقة؛ روابط الملف الواحد (output/ والمخزن) تُحسب مرة"""
+    after = snapshot_files(*paths)
+    changed = {inode: size for path, (size, mtime, inode) in after.items() if before.get(path) != (size, mtime, inode)}
+    return sum(changed.values())
+
+def run_long_video(creator, topic, script, slides_only):
+    """بناء شرائح الفيديو الطويل (أو الفيديو كاملاً) وقياس الزمن والبايتات المكتوبة"""
+    paths = (creator.temp_dir, "output", creator.artifact_store.root)
+    before = snapshot_files(*paths)
+    start = time.perf_counter()
+
+    if slides_only:
+        from moviepy.editor import ImageClip
+        scenes = creator.prepare_scenes(script, scene_count=15)
+        texts = [(f"Complete Guide to:\n{topic}", "title")] + [(s, "main") for s in scenes]
+        texts.append(("Thanks for watching!\n\nDon't forget to subscribe\nfor more tech education", "outro"))
+        frames = creator.slide_output(len(texts), (1920, 1080))
+        jobs = [creator.slide_job("text", text, i, frames, slide_type=slide_type)
+                for i, (text, slide_type) in enumerate(texts)]
+        for slide in asyncio.run(creator.render_slides(jobs, frames)):
+            ImageClip(slide, duration=8).get_frame(0)
+        if frames is not None:
+            frames.close()
+    else:
+        asyncio.run(creator.create_long_video(topic, script))
+
+    return {
+        "wall_s": round(time.perf_counter() - start, 3),
+        "bytes_written": bytes_written_since(before, *paths),
+    }
+
+def sample_script(topic, content_type="long_video"):
+    # get_fallback_content لا تعتمد على حالة الكائن
+    return ContentEmpire.get_fallback_content(None, topic, content_type)
+
+def bench_long_video(slides_only=False, workers=None):
+    """مقارنة مسار PNG عبر temp/ بالمسار من الذاكرة لفيديو طويل واحد"""
+    os.makedirs("output", exist_ok=True)
+    creator = ProfessionalVideoCreator()
+    if workers:
+        creator.render_workers = workers
+    topic = "Cloud Computing Explained: AWS vs Azure vs Google Cloud"
+    script = sample_script(topic)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="long_video_bench_") as cache_dir:
+        for label, keep_pngs in (("png_roundtrip", True), ("in_memory", False)):
+            random.seed(0)
+            creator.keep_slide_pngs = keep_pngs
+            local_store(creator, os.path.join(cache_dir, label))
+            results[label] = run_long_video(creator, topic, script, slides_only)
+            print(f"{label:<14} wall {results[label]['wall_s']:>8.3f}s   "
+                  f"written {results[label]['bytes_written'] / 1e6:>8.2f} MB")
+    creator.close()
+    return results
+
+def bench_encoders(short=False):
+    """مقارنة ترميز moviepy بالترميز المباشر للشرائح الثابتة عبر ffmpeg"""
+    os.makedirs("output", exist_ok=True)
+    creator = ProfessionalVideoCreator()
+    topic = "Cloud Computing Explained: AWS vs Azure vs Google Cloud"
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="encoders_bench_") as cache_dir:
+        for backend in ("moviepy", "ffmpeg"):
+            random.seed(0)
+            creator.encoder_backend = backend
+            # مخزن فارغ لكل مرمّز، وإلا أعاد الثاني فيديو الأول بنفس المفتاح
+            local_store(creator, os.path.join(cache_dir, backend))
+            before = snapshot_files("output")
+            start = time.perf_counter()
+            if short:
+                asyncio.run(creator.create_short_video(topic, sample_script(topic, "short_video")))
+            else:
+                asyncio.run(creator.create_long_video(topic, sample_script(topic)))
+            results[backend] = {
+                "wall_s": round(time.perf_counter() - start, 3),
+                "output_bytes": bytes_written_since(before, "output"),
+            }
+            print(f"{backend:<8} wall {results[backend]['wall_s']:>8.3f}s   "
+                  f"output {results[backend]['output_bytes'] / 1e6:>7.2f} MB")
+    creator.close()
+    return results
+
+def bench_segments():
+    """فيديو طويل من ذاكرة فارغة، ثم إعادته بعد تمديد السكربت، ثم إعادته كما هو"""
+    os.makedirs("output", exist_ok=True)
+    creator = ProfessionalVideoCreator()
+    topic = "Cloud Computing Explained: AWS vs Azure vs Google Cloud"
+    # سكربت قصير حتى يغيّر التمديد المشاهد الأخيرة فقط
+    script = "\n\n".join(sample_script(topic).split("\n\n")[:3])
+    extra_text = ContentEmpire.get_extended_content(None, topic)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="segments_bench_") as cache_dir:
+        local_store(creator, cache_dir)
+        for label, extra in (("cold", None), ("extended", extra_text), ("rerun", extra_text)):
+            random.seed(0)
+            before = creator.segment_cache.stats()
+            start = time.perf_counter()
+            asyncio.run(creator.create_long_video(topic, script, extra_text=extra))
+            after = creator.segment_cache.stats()
+            results[label] = {
+                "wall_s": round(time.perf_counter() - start, 3),
+                "reused": after["hits"] - before["hits"],
+                "encoded": after["misses"] - before["misses"],
+            }
+            print(f"{label:<9} wall {results[label]['wall_s']:>8.3f}s   "
+                  f"reused {results[label]['reused']:>3}   encoded {results[label]['encoded']:>3}")
+    creator.close()
+    return results
+
+class FakeUploader:
+    """بديل محلي لـ YouTubeUploader و BloggerUploader: استدعاء متزامن يحاكي زمن الشبكة"""
+
+    def __init__(self, delay, kind):
+        self.delay = delay
+        self.kind = kind
+        self.count = 0
+
+    def upload_video(self, video_path, title, description):
+        time.sleep(self.delay)
+        self.count += 1
+        return f"https://youtube.example/watch?v={self.kind}{self.count}"
+
+    def publish_post(self, title, content):
+        time.sleep(self.delay)
+        self.count += 1
+        return f"https://blog.example/{self.kind}{self.count}"
+
+def fake_empire(generate_s, upload_s, cache_dir, model=None):
+    """ContentEmpire بخدمات محلية: توليد بتأخير ثابت، ورفع ونشر متزامنان
+
+    مع model (مثل FakeGeminiModel) يمر التوليد بمسار Gemini الحقيقي بدلاً من التأخير الثابت.
+    """
+    empire = ContentEmpire()
+    empire.youtube_uploader = FakeUploader(upload_s, "video")
+    empire.blogger_uploader = FakeUploader(upload_s / 3, "post")
+    local_store(empire.video_creator, os.path.join(cache_dir, "artifacts"))
+    empire.keep_old_outputs = True
+    # سجل مؤقت حتى لا تُحجز مواضيع في cache/ledger.db أثناء القياس
+    empire.ledger = ContentLedger(os.path.join(cache_dir, "ledger.db"), legacy_topics_path=None)
+
+    if model is not None:
+        empire.response_cache = ResponseCache(os.path.join(cache_dir, "responses"))
+        empire.gemini = GeminiClient("local", requests_per_minute=600)
+        empire.gemini.model = model
+        empire.gemini.model_name = "local-fake"
+        return empire
+
+    async def request_content(topic, content_type, variant=0, on_text=None):
+        await asyncio.sleep(generate_s)
+        # يُعامل كمحتوى بديل فلا يمر بكشف التكرار
+        return sample_script(topic, content_type), True
+    empire.request_content = request_content
+    return empire
+
+def bench_workflow(generate_s=20, upload_s=30, min_duration=None):
+    """الworkflows الثلاث بالتتابع (كما كانت) مقابل رسم مراحل واحد لليوم كاملاً"""
+    async def sequential(empire):
+        await empire.run_12_00_workflow()
+        await empire.run_14_00_workflow()
+        await empire.run_16_00_workflow()
+
+    async def scheduled(empire):
+        await empire.run_stages(
+            "daily workflow",
+            empire.add_long_video_stages,
+            empire.add_short_14_00_stages,
+            empire.add_short_16_00_stages,
+        )
+
+    results = {}
+    for label, run in (("sequential", sequential), ("scheduled", scheduled)):
+        with tempfile.TemporaryDirectory(prefix="workflow_bench_") as cache_dir:
+            random.seed(0)
+            empire = fake_empire(generate_s, upload_s, cache_dir)
+            if min_duration is not None:
+                empire.video_creator.LONG_VIDEO_MIN_DURATION = min_duration
+            before = snapshot_files("output")
+            start = time.perf_counter()
+            asyncio.run(run(empire))
+            results[label] = {
+                "wall_s": round(time.perf_counter() - start, 3),
+                "uploads": empire.youtube_uploader.count,
+                "posts": empire.blogger_uploader.count,
+            }
+            empire.video_creator.close()
+            for path in set(snapshot_files("output")) - set(before):
+                os.remove(path)
+        print(f"{label:<11} wall {results[label]['wall_s']:>8.3f}s   "
+              f"uploads {results[label]['uploads']}   posts {results[label]['posts']}")
+    return results
+
+class FakeGeminiModel:
+    """بديل محلي لـ genai.GenerativeModel يُرجع نصاً ثابتاً بسرعة words_per_s كلمة في الثانية"""
+
+    def __init__(self, text, words_per_s=40, chunk_words=12):
+        self.text = text
+        self.words_per_s = words_per_s
+        self.chunk_words = chunk_words
+
+    def chunks(self):
+        # تقطيع عند حدود الكلمات مع الإبقاء على المسافات والأسطر الفارغة كما هي
+        pieces = re.findall(r'\S+\s*', self.text)
+        for i in range(0, len(pieces), self.chunk_words):
+            yield "".join(pieces[i:i + self.chunk_words])
+
+    async def generate_content_async(self, prompt, stream=False):
+        if not stream:
+            await asyncio.sleep(len(self.text.split()) / self.words_per_s)
+            return type("Response", (), {"text": self.text})()
+
+        async def response():
+            for chunk in self.chunks():
+                await asyncio.sleep(len(chunk.split()) / self.words_per_s)
+                yield type("Chunk", (), {"text": chunk})()
+        return response()
+
+def synthetic_script(rng, paragraphs=8, sentences=6, words=None):
+    """سكربت بطول رد Gemini المعتاد (حوالي 900 كلمة) بفقرات وجمل متفاوتة الطول"""
+    words = words or ["cloud", "latency", "storage", "teams", "deploy", "secure", "scale", "data", "model", "costs",
+                      "network", "service", "region", "backup", "monitor", "tools", "learn", "build", "faster", "simple"]
+    out = []
+    for _ in range(paragraphs):
+        para = []
+        for _ in range(sentences):
+            sentence = " ".join(rng.choice(words, rng.integers(6, 30)))
+            para.append(sentence.capitalize() + rng.choice([".", "!", "?"]))
+        out.append(" ".join(para))
+    return "\n\n".join(out)
+
+def check_segmenter(creator, texts, rng, chunkings=200):
+    """مطابقة ScriptSegmenter لـ script_sentences على تقطيعات عشوائية؛ تُرجع عدد حالات عدم التطابق"""
+    mismatches = 0
+    for text in texts:
+        expected = creator.script_sentences(text)
+        for _ in range(chunkings):
+            cuts = sorted(int(cut) for cut in rng.choice(len(text), min(len(text), rng.integers(1, 80)), replace=False))
+            segmenter = ScriptSegmenter(creator.script_sentences)
+            scenes = []
+            for start, end in zip([0] + cuts, cuts + [len(text)]):
+                scenes += segmenter.feed(text[start:end])
+            scenes += segmenter.finish()
+            mismatches += scenes != expected
+    return mismatches
+
+def bench_stream(words_per_s=40, min_duration=None):
+    """الفيديو الطويل بعد اكتمال السكربت مقابل رسم المشاهد أثناء وصوله"""
+    rng = np.random.default_rng(0)
+    script = synthetic_script(rng)
+    creator = ProfessionalVideoCreator()
+    texts = [script, sample_script("Cloud Computing"), "Short. Text!\n\n\n  Another paragraph here?  Yes it is indeed.  "]
+    mismatches = check_segmenter(creator, texts, rng)
+    print(f"segmenter  {len(texts) * 200} random chunkings, {mismatches} mismatches with script_sentences")
+
+    results = {"segmenter_mismatches": mismatches, "script_words": len(script.split())}
+    for label, stream in (("full", False), ("streaming", True)):
+        with tempfile.TemporaryDirectory(prefix="stream_bench_") as cache_dir:
+            random.seed(0)
+            model = FakeGeminiModel(script, words_per_s=words_per_s)
+            empire = fake_empire(0, 0, cache_dir, model=model)
+            empire.stream_scenes = stream
+            if min_duration is not None:
+                empire.video_creator.LONG_VIDEO_MIN_DURATION = min_duration
+            before = snapshot_files("output")
+            start = time.perf_counter()
+            asyncio.run(empire.run_stages("long video", empire.add_long_video_stages))
+            results[label] = {
+                "wall_s": round(time.perf_counter() - start, 3),
+                "uploads": empire.youtube_uploader.count,
+                "segments_reused": empire.video_creator.segment_cache.hits,
+            }
+            empire.video_creator.close()
+            for path in set(snapshot_files("output")) - set(before):
+                os.remove(path)
+        print(f"{label:<10} wall {results[label]['wall_s']:>8.3f}s   uploads {results[label]['uploads']}   "
+              f"segments found prerendered {results[label]['segments_reused']}")
+    print(f"script     {results['script_words']} words at {words_per_s} words/s "
+          f"({results['script_words'] / words_per_s:.1f}s of generation)")
+    return results
+
+def legacy_layout(text, draw, first_font, font, width, max_width):
+    """اللف القديم: width حرفاً للسطر ثم قياس كل سطر بـ textbbox؛ يُرجع عدد الأسطر الخارجة عن العرض"""
+    overflow = 0
+    for i, line in enumerate(textwrap.wrap(text, width=width)):
+        left, _, right, _ = draw.textbbox((0, 0), line, font=first_font if i == 0 else font)
+        overflow += right - left > max_width
+    return overflow
+
+def trial_fit(text, font_path, draw, box, min_size, max_size, line_spacing=20):
+    """ملاءمة بالتجربة: كل حجم من الأكبر للأصغر، ولف بالكلمات مع قياس كل سطر مرشح بـ textbbox"""
+    for size in range(max_size, min_size - 1, -1):
+        font = ImageFont.truetype(font_path, size)
+        lines, line = [], ""
+        for word in text.split():
+            candidate = f"{line} {word}".strip()
+            left, _, right, _ = draw.textbbox((0, 0), candidate, font=font)
+            if line and right - left > box[0]:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+        ascent, descent = font.getmetrics()
+        if len(lines) * (ascent + descent) + (len(lines) - 1) * line_spacing <= box[1]:
+            return size, lines
+    return min_size, lines
+
+# (الاسم، الخط، عرض اللف القديم بالحروف، خطا السطر الأول والباقي قديماً، عرض الإطار، صندوق TextLayout،
+#  أصغر وأكبر حجم)
+LAYOUT_FORMATS = [
+    ("long", FONT_REGULAR, 50, ((FONT_REGULAR, 40), (FONT_REGULAR, 40)), 1920, (1920 - 150, 1080 - 360), 40, 70),
+    ("short", FONT_BOLD, 25, ((FONT_BOLD, 85), (FONT_REGULAR, 55)), 1080, (1080 - 120, 1920 // 2), 55, 85),
+]
+
+def bench_layout(texts=300):
+    """لف وملاءمة نصوص المشاهد: الطريقة القديمة، الملاءمة بالتجربة، و TextLayout"""
+    rng = np.random.default_rng(0)
+    creator = ProfessionalVideoCreator()
+    sentences = []
+    while len(sentences) < texts:
+        sentences += creator.script_sentences(synthetic_script(rng))
+    sentences = sentences[:texts]
+    # كلمات طويلة (أسماء منتجات، روابط) مثل التي كانت تخرج عن الإطار
+    for i in range(0, texts, 10):
+        sentences[i] = "https://cloud.example.com/kubernetes/" + sentences[i].replace(" ", "-", 6)
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    results = {}
+    for name, font_path, wrap_width, legacy_fonts, frame_width, box, min_size, max_size in LAYOUT_FORMATS:
+        first_font, font = (ImageFont.truetype(path, size) for path, size in legacy_fonts)
+        start = time.perf_counter()
+        overflow = sum(legacy_layout(text, draw, first_font, font, wrap_width, frame_width) for text in sentences)
+        legacy_ms = (time.perf_counter() - start) / texts * 1000
+
+        start = time.perf_counter()
+        trial = [trial_fit(text, font_path, draw, box, min_size, max_size) for text in sentences]
+        trial_ms = (time.perf_counter() - start) / texts * 1000
+
+        layout = TextLayout()
+        start = time.perf_counter()
+        fitted = [layout.fit(text, font_path, box, min_size, max_size) for text in sentences]
+        cold_ms = (time.perf_counter() - start) / texts * 1000
+        start = time.perf_counter()
+        for text in sentences:
+            layout.fit(text, font_path, box, min_size, max_size)
+        memo_us = (time.perf_counter() - start) / texts * 1e6
+
+        # العرض الفعلي لكل سطر بالحجم المختار، مقاساً بـ Pillow
+        too_wide = 0
+        for result in fitted:
+            font = ImageFont.truetype(font_path, result["font_size"])
+            too_wide += sum(font.getlength(line) > box[0] for line in result["lines"])
+        same_size = sum(size == result["font_size"] for (size, _), result in zip(trial, fitted))
+
+        results[name] = {
+            "legacy_ms": round(legacy_ms, 3), "legacy_lines_off_frame": overflow,
+            "trial_fit_ms": round(trial_ms, 3),
+            "layout_cold_ms": round(cold_ms, 3), "layout_memoized_us": round(memo_us, 2),
+            "layout_lines_too_wide": too_wide, "same_size_as_trial": same_size,
+        }
+        print(f"{name}: legacy wrap({wrap_width})+textbbox {legacy_ms:>7.3f} ms/text  "
+              f"{overflow} lines wider than the {frame_width}px frame")
+        print(f"{name}: trial-and-error fit      {trial_ms:>7.3f} ms/text")
+        print(f"{name}: TextLayout fit (cold)    {cold_ms:>7.3f} ms/text  {too_wide} lines wider than the box, "
+              f"{same_size}/{texts} same size as trial fit")
+        print(f"{name}: TextLayout fit (memoized) {memo_us:>6.2f} us/text")
+    return results
+
+def bench_narration(latency_s=0.5, concurrency=4):
+    """تركيب التعليق لفيديوهين طويلين: تسلسلي مقابل متوازٍ، وإعادة استخدام الجمل المتكررة"""
+    rng = np.random.default_rng(0)
+    creator = ProfessionalVideoCreator()
+    scripts = [synthetic_script(rng, paragraphs=2, sentences=4), synthetic_script(rng, paragraphs=2, sentences=4)]
+    topic = "Cloud Computing Explained"
+
+    results = {}
+    for label, limit in (("sequential", 1), ("concurrent", concurrency)):
+        with tempfile.TemporaryDirectory(prefix="narration_bench_") as cache_dir:
+            backend = OfflineTTSBackend(latency=latency_s)
+            creator.narrator = Narrator(backend, NarrationCache(ArtifactStore(cache_dir)), max_concurrency=limit)
+            runs = []
+            for script in scripts:
+                start = time.perf_counter()
+                plan = asyncio.run(creator.plan_narrated_long_video(topic, script))
+                synthesized = creator.narrator.synthesized - sum(run["synthesized"] for run in runs)
+                runs.append({
+                    "wall_s": round(time.perf_counter() - start, 2),
+                    "scenes": len(plan),
+                    "synthesized": synthesized,
+                    "planned_s": round(plan.duration, 1),
+                })
+            results[label] = runs
+        for i, run in enumerate(runs, 1):
+            print(f"{label:<10} video {i}: {run['scenes']} scenes, {run['synthesized']:>2} synthesized "
+                  f"(rest from cache) in {run['wall_s']:>6.2f}s, planned {run['planned_s']}s")
+
+    # مقارنة تقدير عدد الكلمات (words x 0.6، حتى 10 ثوان) بمدد التعليق في مشاهد الفيديو القصير
+    spoken = {"words x 0.6 estimate": [], "narration timing": []}
+    with tempfile.TemporaryDirectory(prefix="narration_bench_") as cache_dir:
+        creator.narrator = Narrator(OfflineTTSBackend(), NarrationCache(ArtifactStore(cache_dir)),
+                                    max_concurrency=concurrency)
+        for _ in range(10):
+            script = synthetic_script(rng, paragraphs=1, sentences=5)
+            narrated = asyncio.run(creator.plan_narrated_short_video(topic, script))
+            clips = asyncio.run(creator.narrator.narrate([scene["text"] for scene in narrated]))
+            for label, plan in (("words x 0.6 estimate", creator.plan_short_video(topic, script)),
+                                ("narration timing", narrated)):
+                spoken[label] += [(scene["duration"], clips[scene["text"]]["duration"])
+                                  for scene in plan.scenes[1:-1] if clips.get(scene["text"])]
+    for label, scenes in spoken.items():
+        cut = sum(1 for duration, speech in scenes if speech + creator.NARRATION_LEAD > duration)
+        silence = float(np.mean([max(duration - speech, 0) for duration, speech in scenes]))
+        results[label] = {"scenes_cut": cut, "mean_silence_s": round(silence, 2)}
+        print(f"{label:<21}: {cut}/{len(scenes)} short scenes shorter than their narration, "
+              f"{silence:.2f}s mean silence per scene")
+    return results
+
+def bench_music(track_s=180, duration=300):
+    """موسيقى الخلفية: فك الـ mp3 في كل ترميز مقابل PCM مفكوك مسبقاً ومعيّن من الذاكرة"""
+    encoder = StillImageEncoder()
+    volume = 0.3
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="music_bench_") as work_dir:
+        # مسار اصطناعي: وتر بثلاث نغمات مع تغير بطيء في الشدة
+        source = os.path.join(work_dir, "background_music.mp3")
+        subprocess.run([
+            encoder.binary(), '-y', '-loglevel', 'error', '-f', 'lavfi', '-i',
+            f"aevalsrc='0.2*(sin(2*PI*220*t)+sin(2*PI*277*t)+sin(2*PI*330*t))*(0.6+0.4*sin(2*PI*0.1*t))'"
+            f":s=44100:d={track_s}",
+            '-ac', '2', '-b:a', '128k', source,
+        ], check=True)
+
+        cache_dir = os.path.join(work_dir, "cache")
+        start = time.perf_counter()
+        library = MusicLibrary(encoder, sources=(source,), cache_dir=cache_dir)
+        library.refresh()
+        results["predecode_s"] = round(time.perf_counter() - start, 3)
+        # تشغيل لاحق بعد git checkout: وقت التعديل تغير والمحتوى نفسه
+        os.utime(source)
+        start = time.perf_counter()
+        library = MusicLibrary(encoder, sources=(source,), cache_dir=cache_dir)
+        library.refresh()
+        results["reindex_s"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        for _ in range(1000):
+            track = library.track(library.pick("Cloud Computing Explained"))
+        results["pick_us"] = round((time.perf_counter() - start) * 1000, 1)
+        print(f"pre-decode {track_s}s track once: {results['predecode_s']:.3f}s   "
+              f"re-index after checkout: {results['reindex_s'] * 1000:.1f}ms   "
+              f"pick + lookup: {results['pick_us']:.1f}us")
+
+        # الصوت وحده لفيديو بطول duration، كما في تمريرة التجميع
+        legacy_input = ['-stream_loop', '-1', '-i', source]
+        for label, music_input in (("mp3 decode", legacy_input), ("mapped pcm", MusicLibrary.ffmpeg_input(track))):
+            output = os.path.join(work_dir, f"{label.split()[0]}.m4a")
+            cmd = [encoder.binary(), '-y', '-loglevel', 'error'] + music_input + [
+                '-af', f'volume={volume}', '-c:a', 'aac', '-ar', '44100', '-t', str(duration), output]
+            start = time.perf_counter()
+            subprocess.run(cmd, check=True)
+            results[f"ffmpeg {label}"] = round(time.perf_counter() - start, 3)
+            print(f"ffmpeg  {label:<11} {duration}s soundtrack: {results[f'ffmpeg {label}']:>6.3f}s")
+
+        clips = (
+            ("mp3 decode", lambda: moviepy_editor.afx.audio_loop(
+                moviepy_editor.AudioFileClip(source).volumex(volume), duration=duration)),
+            ("mapped pcm", lambda: library.audio_clip(track, duration, volume)),
+        )
+        for label, make_clip in clips:
+            start = time.perf_counter()
+            clip = make_clip()
+            samples = clip.to_soundarray(fps=44100, buffersize=50000)
+            results[f"moviepy {label}"] = round(time.perf_counter() - start, 3)
+            print(f"moviepy {label:<11} {duration}s soundtrack: {results[f'moviepy {label}']:>6.3f}s   "
+                  f"peak {np.abs(samples).max():.3f}")
+            clip.close()
+    return results
+
+def legacy_encode_segment(encoder, still, duration, output_path, fps, preset='medium', threads=4):
+    """أمر ترميز المقطع قبل المعايرة: -loop 1 يفك الصورة ويحولها لكل إطار"""
+    frame_count = max(int(round(duration * fps)), 1)
+    encoder.run([
+        encoder.binary(), '-y', '-loglevel', 'error', '-loop', '1', '-framerate', str(fps), '-i', still,
+        '-frames:v', str(frame_count), '-vf', 'format=yuv420p',
+        '-c:v', 'libx264', '-preset', preset, '-threads', str(threads),
+        '-video_track_timescale', str(fps * 1000), output_path,
+    ])
+
+def bench_encoder_profile(video_format="long"):
+    """المعايرة على هذا الجهاز، ثم ترميز مشاهد فيديو حقيقي بالإعدادات الثابتة القديمة وبالمعايرة"""
+    creator = ProfessionalVideoCreator()
+    topic = "Cloud Computing Explained: AWS vs Azure vs Google Cloud"
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="encoder_bench_") as work_dir:
+        creator.encoder_tuner = EncoderTuner(creator.still_encoder, path=os.path.join(work_dir, "profiles.json"))
+        start = time.perf_counter()
+        profile = creator.encoder_profile(video_format)
+        results["calibration_s"] = round(time.perf_counter() - start, 2)
+        results["profile"] = profile
+
+        if video_format == "short":
+            plan = creator.plan_short_video(topic, sample_script(topic, "short_video"))
+            slides = [creator.create_short_slide(spec["text"], size=plan.size, as_array=True) for spec in plan]
+        else:
+            plan = creator.plan_long_video(topic, sample_script(topic))
+            slides = [creator.create_text_slide(spec["text"], size=plan.size, slide_type=spec["slide_type"],
+                                                as_array=True) for spec in plan]
+        stills = [creator.still_encoder.write_still(slide, plan.size, os.path.join(work_dir, f"{i:03d}.bmp"))
+                  for i, slide in enumerate(slides)]
+        print(f"{video_format}: {len(plan)} scenes, {plan.duration:.0f}s; calibration {results['calibration_s']}s -> "
+              f"{profile}")
+
+        default = creator.VIDEO_FORMATS[video_format]["profile"]
+        configs = (
+            ("legacy", lambda still, spec, path: legacy_encode_segment(
+                creator.still_encoder, still, spec["duration"], path, plan.fps, default["preset"], default["threads"])),
+            ("tuned", lambda still, spec, path: creator.still_encoder.encode_segment(
+                still, spec["duration"], plan.size, path, fps=plan.fps, profile=profile)),
+        )
+        for label, encode in configs:
+            start = time.perf_counter()
+            total_bytes = 0
+            for i, (still, spec) in enumerate(zip(stills, plan)):
+                path = os.path.join(work_dir, f"{label}_{i:03d}.mp4")
+                encode(still, spec, path)
+                total_bytes += os.path.getsize(path)
+            seconds = time.perf_counter() - start
+            results[label] = {
+                "encode_s": round(seconds, 2),
+                "speed": round(plan.duration / seconds, 2),
+                "mb_per_min": round(total_bytes * 60 / plan.duration / 1e6, 3),
+            }
+            print(f"{label:<7} encode {seconds:>7.2f}s  {results[label]['speed']:>5.2f}x realtime  "
+                  f"{results[label]['mb_per_min']:>6.3f} MB/min")
+
+        record = next(iter(creator.encoder_tuner.load().values()))
+        print(f"calibration estimate: {record['speed']}x realtime, {record['mb_per_min']} MB/min")
+    creator.close()
+    return results
+
+class LocalServices:
+    """خادم محلي واحد بدل YouTube و Blogger و Telegram
+
+    YouTube: بروتوكول الرفع القابل للاستئناف؛ POST يفتح جلسة ويعيد Location، و PUT مع
+    Content-Range يضيف جزءاً ويرد 308 حتى يكتمل الملف، و "bytes */size" يسأل عن الإزاحة.
+    fail_after يجعل الخادم يرد 503 بعد عدد من الأجزاء لمحاكاة انقطاع يوقف التشغيل، و drop_after
+    يقطع الاتصال في منتصف الجزء بدون رد. starts بداية كل جزء مقبول و digests بصمة ما استلمته كل جلسة.
+    Blogger: POST v3/blogs/{id}/posts يسجل المقال ويعيد رابطه. Telegram: POST
+    bot{token}/sendMessage يسجل الرسالة. delay زمن ذهاب وعودة مصطنع لكل طلب.
+    """
+
+    def __init__(self, fail_after=None, delay=0.0, drop_after=None):
+        self.sessions = {}
+        self.fail_after = fail_after
+        self.drop_after = drop_after
+        self.delay = delay
+        self.chunks = 0
+        self.bytes_received = 0
+        self.starts = []
+        self.digests = {}
+        self.posts = []
+        self.messages = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, headers=None, body=b""):
+                if server.delay:
+                    time.sleep(server.delay)
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if re.match(r"/v3/blogs/[^/]+/posts", self.path):
+                    return self.blogger_post(body)
+                if re.match(r"/bot[^/]+/sendMessage", self.path):
+                    with server.lock:
+                        server.messages.append(parse_qs(body.decode()).get("text", [""])[0])
+                    return self.reply(200, {"Content-Type": "application/json"}, b'{"ok": true}')
+                if "uploadType=resumable" not in self.path:
+                    return self.reply(400)
+                session_id = uuid.uuid4().hex
+                with server.lock:
+                    server.sessions[session_id] = 0
+                    server.digests[session_id] = hashlib.sha256()
+                host, port = self.server.server_address[:2]
+                self.reply(200, {"Location": f"http://{host}:{port}/upload/session/{session_id}"})
+
+            def blogger_post(self, body):
+                with server.lock:
+                    server.posts.append(json.loads(body or b"{}"))
+                    post_id = len(server.posts)
+                body = json.dumps({"id": str(post_id), "url": f"{server.url}blog/{post_id}"}).encode()
+                self.reply(200, {"Content-Type": "application/json"}, body)
+
+            def do_PUT(self):
+                session_id = self.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length", 0))
+                if length and server.drop_after is not None and server.chunks >= server.drop_after:
+                    # نصف الجزء ثم إغلاق الاتصال بدون رد، كانقطاع الشبكة أثناء الرفع
+                    self.rfile.read(length // 2)
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                data = self.rfile.read(length)
+                with server.lock:
+                    if session_id not in server.sessions:
+                        return self.reply(404)
+                    if server.fail_after is not None and server.chunks >= server.fail_after:
+                        return self.reply(503)
+
+                    received = server.sessions[session_id]
+                    match = re.match(r"bytes (\d+)-(\d+)/(\d+)", self.headers.get("Content-Range", ""))
+                    total = int(self.headers.get("Content-Range", "").rsplit("/", 1)[-1])
+                    if match and int(match.group(1)) == received:
+                        server.sessions[session_id] = received = received + len(data)
+                        server.digests[session_id].update(data)
+                        server.starts.append(int(match.group(1)))
+                        server.chunks += 1
+                        server.bytes_received += len(data)
+
+                    if received >= total:
+                        body = json.dumps({"id": f"local-{session_id[:8]}"}).encode()
+                        return self.reply(200, {"Content-Type": "application/json"}, body)
+                    headers = {"Range": f"bytes=0-{received - 1}"} if received else {}
+                    self.reply(308, headers)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def local_youtube_service(url, name="youtube"):
+    """خدمة Google (youtube أو blogger) من وثيقة الاكتشاف المضمنة في googleapiclient، موجهة إلى الخادم المحلي"""
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    from googleapiclient.http import build_http
+    document = json.loads(get_static_doc(name, "v3"))
+    # رابط الرفع يُبنى من rootUrl، و api_endpoint وحده يُبقي https
+    document["rootUrl"] = url
+    # build_http لا يعامل 308 كتحويل، وهو رد "Resume Incomplete" في هذا البروتوكول
+    return build_from_document(document, http=build_http())
+
+def bench_upload(size_mb=64, chunk_mb=4, fail_after=5):
+    """رفع يتوقف بعد fail_after جزءاً ثم يُستأنف في "تشغيل" ثانٍ"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="upload_bench_") as work_dir:
+        video_path = os.path.join(work_dir, "video.mp4")
+        with open(video_path, "wb") as f:
+            f.write(os.urandom(int(size_mb * 1024 * 1024)))
+        state_dir = os.path.join(work_dir, "uploads")
+
+        with LocalServices(fail_after=fail_after) as server:
+            service = local_youtube_service(server.url)
+            for label in ("interrupted", "resumed"):
+                uploader = YouTubeUploader(service=service, chunk_size=int(chunk_mb * 1024 * 1024),
+                                           state_dir=state_dir)
+                uploader.max_retries = 1
+                before = server.bytes_received
+                start = time.perf_counter()
+                url = uploader.upload_video(video_path, "Benchmark upload", "local stand-in")
+                elapsed = time.perf_counter() - start
+                results[label] = {
+                    "url": url,
+                    "wall_s": round(elapsed, 3),
+                    "bytes_sent": server.bytes_received - before,
+                    "pending_sessions": len(os.listdir(state_dir)),
+                }
+                print(f"{label:<12} sent {results[label]['bytes_sent'] / 1e6:>8.2f} MB in "
+                      f"{elapsed:>6.2f}s   url {url}   saved sessions {results[label]['pending_sessions']}")
+                # التشغيل التالي: الخادم عاد للعمل
+                server.fail_after = None
+    return results
+
+class ScriptedGeminiModel(FakeGeminiModel):
+    """FakeGeminiModel بسكربت اصطناعي مختلف لكل طلب، فلا يرفض كشف التكرار الردود"""
+
+    def __init__(self, seed=0, words_per_s=200):
+        super().__init__("", words_per_s=words_per_s)
+        self.rng = np.random.default_rng(seed)
+
+    async def generate_content_async(self, prompt, stream=False):
+        # مفردات عشوائية لكل رد، وإلا تشابهت كل السكربتات في بصمات MinHash
+        letters = list("abcdefghijklmnopqrstuvwxyz")
+        words = ["".join(self.rng.choice(letters, self.rng.integers(3, 9))) for _ in range(40)]
+        model = FakeGeminiModel(synthetic_script(self.rng, words=words), self.words_per_s, self.chunk_words)
+        return await model.generate_content_async(prompt, stream=stream)
+
+def local_empire(services, cache_dir):
+    """ContentEmpire كامل على خدمات محلية: Gemini مصطنع، و YouTube و Blogger و Telegram عبر HTTP محلي"""
+    empire = ContentEmpire()
+    empire.ledger = ContentLedger(os.path.join(cache_dir, "ledger.db"), legacy_topics_path=None)
+    empire.response_cache = ResponseCache(os.path.join(cache_dir, "responses"))
+    empire.fallback_cache = ResponseCache(os.path.join(cache_dir, "responses", "fallback"))
+    empire.gemini = GeminiClient("local", requests_per_minute=600)
+    empire.gemini.model = ScriptedGeminiModel()
+    empire.gemini.model_name = "local-fake"
+
+    empire.youtube_uploader = YouTubeUploader(service=local_youtube_service(services.url),
+                                              state_dir=os.path.join(cache_dir, "uploads"))
+    empire.blogger_uploader.service = local_youtube_service(services.url, "blogger")
+    empire.blogger_uploader.blog_id = "local-blog"
+    empire.blogger_uploader.initialized = True
+    empire.config.TELEGRAM_BOT_TOKEN = "local"
+    empire.config.TELEGRAM_CHAT_ID = "benchmark"
+    empire.config.TELEGRAM_API_URL = services.url.rstrip("/")
+    empire.keep_old_outputs = True
+    local_creator(empire.video_creator, cache_dir)
+    return empire
+
+def local_creator(creator, cache_dir):
+    """ذاكرات الخلفيات والمقاطع في مجلد القياس، فكل حالة تبدأ باردة ولا تمس cache/"""
+    creator.background_cache = BackgroundCache(creator.background_engine, os.path.join(cache_dir, "backgrounds"))
+    return local_store(creator, os.path.join(cache_dir, "artifacts"))
+
+def local_store(creator, root):
+    """ArtifactStore في root ومعه ذاكرتا المقاطع والتعليق، فلا يُعاد فيديو أو مقطع من تشغيل سابق"""
+    creator.artifact_store = ArtifactStore(root)
+    creator.segment_cache = SegmentCache(creator.artifact_store)
+    if creator.narrator is not None:
+        creator.narrator.cache = NarrationCache(creator.artifact_store)
+    return creator
+
+def video_frames(path, binary):
+    """عدد إطارات ملف فيديو من المدة ومعدل الإطارات في ترويسته"""
+    stderr = subprocess.run([binary, '-i', path], capture_output=True, text=True).stderr
+    duration = re.search(r"Duration: (\d+):(\d+):([\d.]+)", stderr)
+    fps = re.search(r"([\d.]+) fps", stderr)
+    if not duration or not fps:
+        return 0
+    hours, minutes, seconds = duration.groups()
+    return int(round((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * float(fps.group(1))))
+
+def suite_slides(cache_dir, count, build):
+    """count شريحة (أو خلفية) بـ build(creator, text, i)؛ كل واحدة إطار"""
+    creator = local_creator(ProfessionalVideoCreator(), cache_dir)
+    texts = creator.prepare_scenes(sample_script("Cloud Computing Explained: AWS vs Azure vs Google Cloud"))
+    for i in range(count):
+        build(creator, texts[i % len(texts)], i)
+    creator.close()
+    return {"frames": count, "calls": count}
+
+def suite_backgrounds(cache_dir, quick):
+    def build(creator, text, i):
+        pattern_type = creator.visual_patterns[i % len(creator.visual_patterns)]
+        creator.create_dynamic_background((1920, 1080), pattern_type=pattern_type, as_array=True)
+    return suite_slides(cache_dir, 12 if quick else 60, build)
+
+def suite_text_slides(cache_dir, quick):
+    return suite_slides(cache_dir, 5 if quick else 30,
+                        lambda creator, text, i: creator.create_text_slide(text, as_array=True))
+
+def suite_short_slides(cache_dir, quick):
+    return suite_slides(cache_dir, 5 if quick else 30,
+                        lambda creator, text, i: creator.create_short_slide(text, as_array=True))
+
+def suite_prepare_scenes(cache_dir, quick):
+    creator = ProfessionalVideoCreator()
+    script = sample_script("Cloud Computing Explained: AWS vs Azure vs Google Cloud")
+    calls = 500 if quick else 5000
+    for _ in range(calls):
+        creator.prepare_scenes(script)
+    creator.close()
+    return {"frames": None, "calls": calls}
+
+def suite_video(kind):
+    def run(cache_dir, quick):
+        creator = local_creator(ProfessionalVideoCreator(), cache_dir)
+        topic = "Cloud Computing Explained: AWS vs Azure vs Google Cloud"
+        if kind == "short":
+            path = asyncio.run(creator.create_short_video(topic, sample_script(topic, "short_video")))
+        else:
+            path = asyncio.run(creator.create_long_video(topic, sample_script(topic), min_duration=60 if quick else None))
+        creator.close()
+        return {"frames": video_frames(path, creator.still_encoder.binary()) if path else 0, "calls": 1}
+    return run
+
+def suite_daily_workflow(cache_dir, quick):
+    before = snapshot_files("output")
+    with LocalServices(delay=0.05) as services:
+        empire = local_empire(services, cache_dir)
+        if quick:
+            empire.video_creator.LONG_VIDEO_MIN_DURATION = 60
+        asyncio.run(empire.run_daily_workflow())
+        empire.video_creator.close()
+        empire.ledger.close()
+        videos = [path for path in set(snapshot_files("output")) - set(before) if path.endswith(".mp4")]
+        binary = empire.video_creator.still_encoder.binary()
+        return {
+            "frames": sum(video_frames(path, binary) for path in videos),
+            "calls": 1,
+            "upload_bytes": services.bytes_received,
+            "posts": len(services.posts),
+            "messages": len(services.messages),
+        }
+
+SUITE_CASES = {
+    "create_dynamic_background": suite_backgrounds,
+    "create_text_slide": suite_text_slides,
+    "create_short_slide": suite_short_slides,
+    "prepare_scenes": suite_prepare_scenes,
+    "create_short_video": suite_video("short"),
+    "create_long_video": suite_video("long"),
+    "run_daily_workflow": suite_daily_workflow,
+}
+
+def suite_case(name, work_dir, quick):
+    """حالة واحدة في عملية جديدة (spawn)، فذروة الذاكرة لها وحدها؛ الفيديوهات الناتجة تُحذف بعد القياس"""
+    logging.getLogger("main").setLevel(logging.WARNING)
+    random.seed(0)
+    cache_dir = os.path.join(work_dir, name)
+    os.makedirs(cache_dir)
+    paths = ("output", "temp", cache_dir)
+    before = snapshot_files(*paths)
+
+    start = time.perf_counter()
+    result = SUITE_CASES[name](cache_dir, quick)
+    wall = time.perf_counter() - start
+
+    written = bytes_written_since(before, *paths)
+    for path in set(snapshot_files("output")) - set(before):
+        os.remove(path)
+    frames = result.pop("frames")
+    return {
+        "wall_s": round(wall, 3),
+        "frames": frames,
+        "fps": round(frames / wall, 2) if frames else None,
+        "calls": result.pop("calls"),
+        # ru_maxrss بالكيلوبايت على Linux؛ عملية Python وحدها (ذروة ffmpeg لا تُقاس هكذا لأن
+        # العملية المتفرعة ترث ذروة أبيها قبل exec)
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "bytes_written": written,
+        **result,
+    }
+
+def compare_results(results, baseline, threshold):
+    """مقارنة بالخط الأساسي؛ تُرجع أسماء الحالات التي تباطأت أو زادت ذاكرتها أكثر من threshold"""
+    if baseline.get("host") != results["host"]:
+        print(f"⚠️ baseline was recorded on {baseline.get('host')}, timings may not be comparable")
+    regressions = []
+    print(f"{'case':<27} {'wall base':>10} {'wall now':>10} {'change':>8} {'rss base':>9} {'rss now':>9}")
+    for name, now in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        change = now["wall_s"] / base["wall_s"] - 1 if base["wall_s"] else 0.0
+        # فروق أصغر من الضجيج (10ms، 20MB) لا تُحسب تراجعاً
+        slower = change > threshold and now["wall_s"] - base["wall_s"] > 0.01
+        bigger = (now["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold)
+                  and now["peak_rss_mb"] - base["peak_rss_mb"] > 20)
+        status = "REGRESSION" if slower or bigger else ""
+        if status:
+            regressions.append(name)
+        print(f"{name:<27} {base['wall_s']:>9.3f}s {now['wall_s']:>9.3f}s {change:>+7.1%} "
+              f"{base['peak_rss_mb']:>7.1f}MB {now['peak_rss_mb']:>7.1f}MB {status}")
+    return regressions
+
+def bench_suite(cases=None, quick=False, output="output/benchmark_results.json", baseline=None,
+                save_baseline=False, threshold=0.15):
+    """كل حالات القياس بلا شبكة، كل حالة في عملية مستقلة، والنتيجة JSON تُقارن بخط أساسي"""
+    cases = cases or list(SUITE_CASES)
+    os.makedirs("output", exist_ok=True)
+    # المعايرة مرة قبل القياس (مثل run_stages) حتى لا تدخل في زمن أول حالة فيديو
+    creator = ProfessionalVideoCreator()
+    creator.tune_encoders()
+    host = creator.encoder_tuner.fingerprint() if creator.encoder_tuner else EncoderTuner(creator.still_encoder).fingerprint()
+    creator.close()
+
+    results = {"host": host, "quick": quick, "recorded": datetime.now().isoformat(timespec='seconds'), "cases": {}}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="suite_bench_") as work_dir:
+        for name in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                case = results["cases"][name] = pool.submit(suite_case, name, work_dir, quick).result()
+            fps = f"{case['fps']:>8.1f} fps" if case["fps"] else " " * 12
+            print(f"{name:<27} {case['wall_s']:>9.3f}s {fps}  peak rss {case['peak_rss_mb']:>7.1f} MB  "
+                  f"wrote {case['bytes_written'] / 1e6:>8.2f} MB")
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results: {output}")
+
+    regressions = []
+    if baseline and save_baseline:
+        with open(baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved: {baseline}")
+    elif baseline:
+        with open(baseline) as f:
+            regressions = compare_results(results, json.load(f), threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) above {threshold:.0%}: {', '.join(regressions)}")
+        else:
+            print(f"✅ no regressions above {threshold:.0%}")
+    results["regressions"] = regressions
+    return results
+
+def bench_trace(spans=20000, slides=30, repeat=3):
+    """كلفة التتبع: مقطع فارغ معطلاً ومفعلاً، ثم رسم شرائح بالتتبع العام (TRACER) وبدونه"""
+    results = {}
+    for enabled in (False, True):
+        tracer = Tracer(enabled=enabled)
+        start = time.perf_counter()
+        for _ in range(spans):
+            with tracer.span("noop", "bench"):
+                pass
+        label = "on" if enabled else "off"
+        results[f"span_{label}_us"] = round((time.perf_counter() - start) / spans * 1e6, 2)
+        print(f"empty span, tracing {label:<3}: {results[f'span_{label}_us']:>8.2f}us")
+
+    with tempfile.TemporaryDirectory(prefix="trace_bench_") as cache_dir:
+        creator = local_creator(ProfessionalVideoCreator(), cache_dir)
+        creator.render_workers = 1
+        texts = creator.prepare_scenes(sample_script("Cloud Computing Explained: AWS vs Azure vs Google Cloud"))
+        jobs = [creator.slide_job("long", texts[i % len(texts)], i, None) for i in range(slides)]
+        # الخلفيات تُخزّن بعد أول رسم، فالجولة الأولى تُهمل
+        asyncio.run(creator.render_slides(jobs, None))
+        enabled = TRACER.enabled
+        timings = {False: [], True: []}
+        try:
+            # تبديل متناوب حتى لا يظلم تغير حمل الجهاز أحد الوضعين
+            for _ in range(repeat):
+                for mode in (False, True):
+                    TRACER.enabled = mode
+                    start = time.perf_counter()
+                    asyncio.run(creator.render_slides(jobs, None))
+                    timings[mode].append(time.perf_counter() - start)
+        finally:
+            TRACER.enabled = enabled
+            creator.close()
+    for mode in (False, True):
+        label = "on" if mode else "off"
+        results[f"slides_{label}_s"] = round(min(timings[mode]), 3)
+        print(f"{slides} slides, tracing {label:<3}: {results[f'slides_{label}_s']:>8.3f}s")
+    results["slides_overhead"] = round(results["slides_on_s"] / results["slides_off_s"] - 1, 4)
+    print(f"measured overhead: {results['slides_overhead']:+.2%}   "
+          f"per-span cost x {slides} spans: {results['span_on_us'] * slides / 1000:.2f}ms")
+    return results
+
+def legacy_compose_video(creator, plan, output_path):
+    """المسار السابق: كل الشرائح في مخزن واحد، و ImageClip لكل مشهد في concatenate_videoclips(compose)"""
+    frames = creator.slide_output(len(plan), plan.size)
+    jobs = [creator.slide_job(spec["builder"], spec["text"], i, frames, slide_type=spec["slide_type"], size=plan.size)
+            for i, spec in enumerate(plan)]
+    slides = asyncio.run(creator.render_slides(jobs, frames))
+    clips = [moviepy_editor.ImageClip(slide, duration=spec["duration"]) for slide, spec in zip(slides, plan)]
+    video = moviepy_editor.concatenate_videoclips(clips, method="compose")
+    video.write_videofile(output_path, fps=plan.fps, codec='libx264', preset=plan.profile["preset"],
+                          threads=plan.profile["threads"], verbose=False, logger=None)
+    if frames is not None:
+        frames.close()
+
+MEMORY_MODES = ("compose", "pool moviepy", "pool ffmpeg", "pool segments")
+
+def memory_case(mode, scenes, scene_s, size, work_dir):
+    """فيديو من scenes مشهداً في عملية جديدة (spawn)، فذروة RSS له وحده"""
+    logging.getLogger("main").setLevel(logging.WARNING)
+    random.seed(0)
+    creator = ProfessionalVideoCreator()
+    creator.render_workers = 1
+    # ذاكرة الخلفيات لها حدها الثابت (256 MB) وتمتلئ بتنوع الأنماط لا بطول الفيديو، فتُصغّر هنا
+    # إلى خلفية واحدة حتى يظهر ما يحجزه الرسم والترميز وحدهما
+    creator.background_cache = BackgroundCache(creator.background_engine, os.path.join(work_dir, "backgrounds"),
+                                               max_memory_bytes=0)
+    plan = ScenePlan(size, 24, dict(StillImageEncoder.DEFAULT_PROFILE, preset="ultrafast", threads=1))
+    for i in range(scenes):
+        plan.add("text", f"Scene {i + 1} of {scenes}\nManaged services scale with demand", scene_s)
+
+    output_path = os.path.join(work_dir, f"{mode.replace(' ', '_')}_{scenes}.mp4")
+    start = time.perf_counter()
+    if mode == "compose":
+        legacy_compose_video(creator, plan, output_path)
+    else:
+        creator.encoder_backend = "moviepy" if mode == "pool moviepy" else "ffmpeg"
+        local_store(creator, os.path.join(work_dir, f"artifacts_{mode.replace(' ', '_')}_{scenes}"))
+        if mode != "pool segments":
+            creator.segment_cache = None
+        asyncio.run(creator.render_video(plan, output_path))
+    wall_s = time.perf_counter() - start
+    creator.close()
+    os.remove(output_path)
+    return {
+        "wall_s": round(wall_s, 3),
+        # ru_maxrss بالكيلوبايت على Linux؛ ذاكرة ffmpeg نفسه لا تتغير مع عدد المشاهد
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def bench_memory(scene_counts=(8, 32), scene_s=1.0, size=(1920, 1080)):
+    """ذروة الذاكرة حسب عدد المشاهد: كل الشرائح مع compose في moviepy مقابل مخزن الإطارات الثابت
+
+    مسارات المخزن تفشل إذا زادت ذروتها بأكثر من ربع إطار لكل مشهد إضافي.
+    """
+    frame_mb = size[0] * size[1] * 3 / 1e6
+    print(f"{'mode':<15}" + "".join(f"{f'{count} scenes':>22}" for count in scene_counts) + f"{'MB/scene':>10}")
+    results = {"frame_mb": round(frame_mb, 2), "modes": {}, "unbounded": []}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="memory_bench_") as work_dir:
+        for mode in MEMORY_MODES:
+            runs = {}
+            for count in scene_counts:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    runs[count] = pool.submit(memory_case, mode, count, scene_s, size, work_dir).result()
+            low, high = min(scene_counts), max(scene_counts)
+            growth = (runs[high]["peak_rss_mb"] - runs[low]["peak_rss_mb"]) / (high - low)
+            results["modes"][mode] = {"runs": runs, "mb_per_scene": round(growth, 2)}
+            if mode != "compose" and growth > frame_mb / 4:
+                results["unbounded"].append(mode)
+            print(f"{mode:<15}" + "".join(f"{runs[count]['peak_rss_mb']:>9.1f} MB {runs[count]['wall_s']:>8.2f}s"
+                                          for count in scene_counts) + f"{growth:>+10.2f}")
+    print(f"one {size[0]}x{size[1]} frame: {frame_mb:.1f} MB")
+    if results["unbounded"]:
+        print(f"❌ peak memory grows with scene count: {', '.join(results['unbounded'])}")
+    else:
+        print("✅ frame-pool peak memory independent of scene count")
+    return results
+
+def bench_artifacts(runs=10, cap_mb=64, run_mb=24, object_mb=2):
+    """ArtifactStore: القرص عبر تشغيلات متتالية مقابل temp/ و output/ بلا حذف، نفس الفيديو مرتين،
+    وتصدير/استرجاع الأرشيف مع ملف تالف
+    """
+    rng = np.random.default_rng(0)
+    cap = cap_mb * 1024 * 1024
+    size = object_mb * 1024 * 1024
+    # ربع ملفات كل تشغيل ثابتة (مقدمة، خاتمة، جمل عامة) والباقي جديد
+    shared = [rng.bytes(size) for _ in range(max(run_mb // object_mb // 4, 1))]
+    results = {"runs": [], "over_cap": []}
+    with tempfile.TemporaryDirectory(prefix="artifacts_bench_") as work_dir:
+        # min_age الافتراضي كما في الإنتاج: ملفات التشغيل نفسه تُحذف بترتيب LRU إذا تجاوزت الحد
+        store = ArtifactStore(os.path.join(work_dir, "store"), max_disk_bytes=cap)
+        produced = written = 0
+        print(f"{'run':<5}{'produced MB':>13}{'unbounded MB':>14}{'store MB':>10}{'evicted':>9}{'scans':>7}")
+        for run in range(runs):
+            store.begin_run(f"run_{run}")
+            evicted = store.evicted
+            scans = store.scans
+            blobs = shared + [rng.bytes(size) for _ in range(run_mb // object_mb - len(shared))]
+            for blob in blobs:
+                written += len(blob)
+                key = ArtifactStore.key("bench", hashlib.sha256(blob).hexdigest())
+                if store.get(key, ".bin") is None:
+                    def produce(path, blob=blob):
+                        with open(path, 'wb') as f:
+                            f.write(blob)
+                    store.put(key, ".bin", produce)
+                    produced += len(blob)
+            store.end_run()
+            removed = store.evicted - evicted
+            scans = store.scans - scans
+            disk = sum(entry_size for _, entry_size, _ in store.entries())
+            results["runs"].append({"produced_mb": round(produced / 1e6, 1), "disk_mb": round(disk / 1e6, 1),
+                                    "evicted": removed, "scans": scans})
+            if disk > cap:
+                results["over_cap"].append(run)
+            print(f"{run:<5}{produced / 1e6:>13.1f}{written / 1e6:>14.1f}{disk / 1e6:>10.1f}{removed:>9}{scans:>7}")
+        results["duplicate_mb_avoided"] = round((written - produced) / 1e6, 1)
+        print(f"cap {cap / 1e6:.1f} MB; identical artifacts not rewritten: {results['duplicate_mb_avoided']} MB")
+
+        # نفس الخطة مرتين: الثانية رابط للفيديو المخزن بدون رسم أو ترميز
+        creator = local_store(ProfessionalVideoCreator(), os.path.join(work_dir, "video"))
+        creator.render_workers = 1
+        plan = ScenePlan((1080, 1920), 30, dict(StillImageEncoder.DEFAULT_PROFILE, preset="ultrafast", threads=1))
+        for i in range(4):
+            plan.add("short", f"Scene {i + 1}\nManaged services scale with demand", 2.0)
+        paths = []
+        for label in ("first", "repeat"):
+            random.seed(0)
+            path = os.path.join(work_dir, f"{label}.mp4")
+            start = time.perf_counter()
+            asyncio.run(creator.render_video(plan, path))
+            results[f"video_{label}_s"] = round(time.perf_counter() - start, 3)
+            paths.append(path)
+        creator.close()
+        results["video_shared"] = os.path.samefile(*paths)
+        print(f"video      first {results['video_first_s']:.2f}s, repeat {results['video_repeat_s']:.3f}s, "
+              f"same file: {results['video_shared']}")
+
+        archive = os.path.join(work_dir, "artifacts.tar")
+        start = time.perf_counter()
+        count, total = store.export(archive)
+        results["export_s"] = round(time.perf_counter() - start, 3)
+        restored_store = ArtifactStore(os.path.join(work_dir, "restored"), max_disk_bytes=cap, min_age=0)
+        start = time.perf_counter()
+        restored = restored_store.restore(archive)
+        results["restore_s"] = round(time.perf_counter() - start, 3)
+        expected = sorted(ArtifactStore.digest_file(path) for _, _, path in store.entries())
+        actual = sorted(ArtifactStore.digest_file(path) for _, _, path in restored_store.entries())
+        results["restore_ok"] = restored == count and actual == expected
+        print(f"export     {count} files, {total / 1e6:.1f} MB in {results['export_s']:.2f}s; "
+              f"restore {restored} in {results['restore_s']:.2f}s, identical: {results['restore_ok']}")
+
+        # بايت واحد تالف في أرشيف: الملف يُرفض والباقي يُسترجع
+        with tarfile.open(archive) as tar:
+            member = next(member for member in tar.getmembers() if member.name.startswith("objects/"))
+        with open(archive, 'r+b') as f:
+            f.seek(member.offset_data + member.size // 2)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        corrupt_store = ArtifactStore(os.path.join(work_dir, "corrupt"), max_disk_bytes=cap, min_age=0)
+        restored = corrupt_store.restore(archive)
+        results["corrupt_rejected"] = restored == count - 1
+        print(f"corrupt    restored {restored} of {count}, damaged file rejected: {results['corrupt_rejected']}")
+
+    if results["over_cap"]:
+        print(f"❌ store above {cap_mb} MB after runs {results['over_cap']}")
+    return results
+
+def claim_worker(path, candidates, count):
+    """عملية مستقلة تحجز count موضوعاً من نفس القائمة المشتركة"""
+    ledger = ContentLedger(path, legacy_topics_path=None)
+    claimed = [ledger.claim_topic(candidates, "fallback") for _ in range(count)]
+    ledger.close()
+    return claimed
+
+def bench_ledger(entries=100000, workers=4, claims=1000):
+    """السجل النصي القديم مقابل ContentLedger عند entries موضوع مستخدم"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="ledger_bench_") as work_dir:
+        history = [f"Historic topic #{i}" for i in range(entries)]
+        text_path = os.path.join(work_dir, "used_topics.txt")
+        with open(text_path, "w") as f:
+            f.write("\n".join(history) + "\n")
+        candidates = [f"Candidate topic #{i}" for i in range(10)] + history[-10:]
+
+        # القديم: كل تشغيل يقرأ الملف كاملاً ثم يضيف سطراً
+        def legacy_run():
+            with open(text_path) as f:
+                used = set(line.strip() for line in f)
+            available = [t for t in candidates if t not in used]
+            with open(text_path, "a") as f:
+                f.write(random.choice(available) + "\n")
+        results["legacy_run_ms"] = round(time_call(legacy_run, 5), 2)
+
+        db_path = os.path.join(work_dir, "ledger.db")
+        start = time.perf_counter()
+        ledger = ContentLedger(db_path, legacy_topics_path=text_path)
+        results["import_s"] = round(time.perf_counter() - start, 3)
+        ledger.close()
+
+        def ledger_run():
+            run_ledger = ContentLedger(db_path, legacy_topics_path=text_path)
+            run_ledger.claim_topic(candidates, "fallback")
+            run_ledger.close()
+        results["ledger_run_ms"] = round(time_call(ledger_run, 5), 2)
+
+        ledger = ContentLedger(db_path, legacy_topics_path=None)
+        start = time.perf_counter()
+        for i in range(claims):
+            ledger.claim_topic([f"Fresh topic {i}-{j}" for j in range(10)], "fallback")
+        results["claim_ms"] = round((time.perf_counter() - start) / claims * 1000, 3)
+        results["lookup_us"] = round(time_call(lambda: ledger.is_used(history[entries // 2]), 100) * 1000, 2)
+        ledger.close()
+
+        # عمليات متوازية تتنافس على نفس المواضيع: يجب ألا يتكرر أي موضوع
+        shared = [f"Contended topic #{i}" for i in range(workers * 25)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(claim_worker, [db_path] * workers, [shared] * workers, [25] * workers))
+        claimed = [topic for batch in batches for topic in batch if topic != "fallback"]
+        results["parallel_claims"] = len(claimed)
+        results["parallel_duplicates"] = len(claimed) - len(set(claimed))
+
+    print(f"history entries          {entries}")
+    print(f"legacy file run          {results['legacy_run_ms']:>9.2f} ms   (read whole file + append)")
+    print(f"ledger run               {results['ledger_run_ms']:>9.2f} ms   (open + claim)")
+    print(f"one-time import          {results['import_s']:>9.3f} s")
+    print(f"claim_topic              {results['claim_ms']:>9.3f} ms")
+    print(f"indexed lookup           {results['lookup_us']:>9.2f} us")
+    print(f"parallel claims          {results['parallel_claims']} by {workers} processes, "
+          f"{results['parallel_duplicates']} duplicates")
+    return results
+
+def mutate(words, rng, fraction):
+    """نسخة معدلة: استبدال fraction من الكلمات بكلمات عشوائية"""
+    words = list(words)
+    for i in rng.choice(len(words), max(1, int(len(words) * fraction)), replace=False):
+        words[i] = f"w{rng.integers(100000)}"
+    return " ".join(words)
+
+def bench_duplicates_kind(label, count, length, threshold, rng, queries=500, fraction=0.1):
+    vocabulary = np.array([f"term{i}" for i in range(20000)])
+    items = [vocabulary[rng.integers(len(vocabulary), size=length)] for _ in range(count)]
+    index = NearDuplicateIndex(threshold=threshold)
+
+    start = time.perf_counter()
+    for i, words in enumerate(items):
+        index.add(i, index.signature(" ".join(words)))
+    build_s = time.perf_counter() - start
+
+    picks = rng.choice(count, queries, replace=False)
+    near = [index.signature(mutate(items[i], rng, fraction)) for i in picks]
+    fresh = [index.signature(" ".join(vocabulary[rng.integers(len(vocabulary), size=length)])) for _ in range(queries)]
+
+    start = time.perf_counter()
+    near_hits = sum(index.query(signature)[0] >= threshold for signature in near)
+    query_us = (time.perf_counter() - start) / queries * 1e6
+    false_hits = sum(index.query(signature)[0] >= threshold for signature in fresh)
+    text = " ".join(items[0])
+    signature_us = time_call(lambda: index.signature(text), 20) * 1000
+
+    row = {
+        "items": count,
+        "build_s": round(build_s, 2),
+        "signature_us": round(signature_us, 1),
+        "query_us": round(query_us, 1),
+        "recall": round(near_hits / queries, 3),
+        "false_positive_rate": round(false_hits / queries, 3),
+    }
+    print(f"{label:<8} {count:>7} items  build {row['build_s']:>6.2f}s  signature {row['signature_us']:>8.1f}us  "
+          f"query {row['query_us']:>6.1f}us  recall {row['recall']:.3f}  false+ {row['false_positive_rate']:.3f}")
+    return row
+
+def bench_duplicates(topics=50000, scripts=5000):
+    """زمن الاستعلام ودقة الكشف لنسخ معدلة بنسبة 10% من عناصر سابقة"""
+    rng = np.random.default_rng(0)
+    return {
+        "topics": bench_duplicates_kind("topics", topics, 8, 0.7, rng),
+        "scripts": bench_duplicates_kind("scripts", scripts, 300, 0.6, rng),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Content Empire benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    backgrounds = sub.add_parser("backgrounds", help="per-slide background cost")
+    backgrounds.add_argument("--repeat", type=int, default=5)
+
+    long_video = sub.add_parser("long-video", help="wall time and bytes written per long video")
+    long_video.add_argument("--slides-only", action="store_true", help="skip the encode")
+    long_video.add_argument("--workers", type=int, default=None, help="slide render processes")
+
+    encoders = sub.add_parser("encoders", help="moviepy vs still-image ffmpeg encode")
+    encoders.add_argument("--short", action="store_true", help="encode the short video instead")
+
+    sub.add_parser("segments", help="cold vs extended vs repeated long video with the segment cache")
+
+    workflow = sub.add_parser("workflow", help="sequential vs scheduled daily run against local stand-ins")
+    workflow.add_argument("--generate-s", type=float, default=20, help="simulated Gemini latency per call")
+    workflow.add_argument("--upload-s", type=float, default=30, help="simulated upload time per video")
+    workflow.add_argument("--min-duration", type=float, default=None, help="long video target length")
+
+    upload = sub.add_parser("upload", help="interrupted then resumed upload against a local resumable server")
+    upload.add_argument("--size-mb", type=float, default=64)
+    upload.add_argument("--chunk-mb", type=float, default=4)
+    upload.add_argument("--fail-after", type=int, default=5, help="chunks accepted before the server fails")
+
+    ledger = sub.add_parser("ledger", help="text-file topic history vs the SQLite ledger")
+    ledger.add_argument("--entries", type=int, default=100000)
+    ledger.add_argument("--workers", type=int, default=4)
+
+    duplicates = sub.add_parser("duplicates", help="MinHash/LSH near-duplicate index latency and accuracy")
+    duplicates.add_argument("--topics", type=int, default=50000)
+    duplicates.add_argument("--scripts", type=int, default=5000)
+
+    stream = sub.add_parser("stream", help="long video after the full script vs scenes rendered while it streams")
+    stream.add_argument("--words-per-s", type=float, default=40, help="simulated Gemini output speed")
+    stream.add_argument("--min-duration", type=float, default=None, help="long video target length")
+
+    layout = sub.add_parser("layout", help="pixel-width wrapping and font fitting vs char-count wrapping")
+    layout.add_argument("--texts", type=int, default=300)
+
+    narration = sub.add_parser("narration", help="scene narration: sequential vs concurrent, cache reuse, timing")
+    narration.add_argument("--latency-s", type=float, default=0.5, help="simulated TTS service latency per clip")
+    narration.add_argument("--concurrency", type=int, default=4)
+
+    music = sub.add_parser("music", help="per-render mp3 decode vs the pre-decoded memory-mapped music cache")
+    music.add_argument("--track-s", type=int, default=180)
+    music.add_argument("--duration", type=int, default=300, help="soundtrack length in seconds")
+
+    encoder_profile = sub.add_parser("encoder-profile", help="calibrated x264 settings vs the fixed defaults")
+    encoder_profile.add_argument("--format", choices=["long", "short"], default="long")
+
+    suite = sub.add_parser("suite", help="offline suite over local service stand-ins, JSON results vs a baseline")
+    suite.add_argument("--quick", action="store_true", help="fewer slides and a 60s long video")
+    suite.add_argument("--cases", nargs="+", choices=list(SUITE_CASES))
+    suite.add_argument("--output", default="output/benchmark_results.json")
+    suite.add_argument("--baseline", help="baseline JSON to compare against (or to write with --save-baseline)")
+    suite.add_argument("--save-baseline", action="store_true")
+    suite.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before a case regresses")
+    trace = sub.add_parser("trace", help="span tracing cost: empty spans and slide rendering with tracing off vs on")
+    trace.add_argument("--spans", type=int, default=20000)
+    trace.add_argument("--slides", type=int, default=30)
+    memory = sub.add_parser("memory", help="peak RSS vs scene count: all slides resident vs the fixed frame pool")
+    memory.add_argument("--scenes", type=int, nargs=2, default=[8, 32])
+    memory.add_argument("--scene-s", type=float, default=1.0)
+    memory.add_argument("--size", default="1920x1080", help="WIDTHxHEIGHT, e.g. 3840x2160")
+    artifacts = sub.add_parser("artifacts", help="artifact store: disk use across runs, repeated video, export/restore")
+    artifacts.add_argument("--runs", type=int, default=10)
+    artifacts.add_argument("--cap-mb", type=int, default=64)
+    artifacts.add_argument("--run-mb", type=int, default=24)
+
+    args = parser.parse_args()
+    if args.command == "suite" and args.save_baseline and not args.baseline:
+        parser.error("--save-baseline needs --baseline PATH")
+    if args.command == "backgrounds":
+        bench_backgrounds(repeat=args.repeat)
+    elif args.command == "long-video":
+        bench_long_video(slides_only=args.slides_only, workers=args.workers)
+    elif args.command == "encoders":
+        bench_encoders(short=args.short)
+    elif args.command == "segments":
+        bench_segments()
+    elif args.command == "upload":
+        bench_upload(size_mb=args.size_mb, chunk_mb=args.chunk_mb, fail_after=args.fail_after)
+    elif args.command == "ledger":
+        bench_ledger(entries=args.entries, workers=args.workers)
+    elif args.command == "suite":
+        results = bench_suite(cases=args.cases, quick=args.quick, output=args.output, baseline=args.baseline,
+                              save_baseline=args.save_baseline, threshold=args.threshold)
+        if results["regressions"]:
+            sys.exit(1)
+    elif args.command == "memory":
+        size = tuple(int(value) for value in args.size.lower().split("x"))
+        results = bench_memory(scene_counts=tuple(args.scenes), scene_s=args.scene_s, size=size)
+        if results["unbounded"]:
+            sys.exit(1)
+    elif args.command == "artifacts":
+        results = bench_artifacts(runs=args.runs, cap_mb=args.cap_mb, run_mb=args.run_mb)
+        checks = ("video_shared", "restore_ok", "corrupt_rejected")
+        if results["over_cap"] or not all(results[check] for check in checks):
+            sys.exit(1)
+    elif args.command == "trace":
+        bench_trace(spans=args.spans, slides=args.slides)
+    elif args.command == "encoder-profile":
+        bench_encoder_profile(video_format=args.format)
+    elif args.command == "music":
+        bench_music(track_s=args.track_s, duration=args.duration)
+    elif args.command == "narration":
+        bench_narration(latency_s=args.latency_s, concurrency=args.concurrency)
+    elif args.command == "layout":
+        bench_layout(texts=args.texts)
+    elif args.command == "stream":
+        bench_stream(words_per_s=args.words_per_s, min_duration=args.min_duration)
+    elif args.command == "duplicates":
+        bench_duplicates(topics=args.topics, scripts=args.scripts)
+    elif args.command == "workflow":
+        bench_workflow(generate_s=args.generate_s, upload_s=args.upload_s, min_duration=args.min_duration)
+
+if __name__ == "__main__":
+    main()
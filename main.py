@@ -1,32 +1,367 @@
+import time
+_import_start = time.perf_counter()
+
 import asyncio
 import logging
 import os
-import google.generativeai as genai
-from moviepy.editor import *
-from datetime import datetime
-import requests
+import importlib
+from datetime import datetime, timedelta
 import json
 import hashlib
+import platform
 import random
 import re
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from PIL import Image, ImageDraw, ImageFont
-import textwrap
-import numpy as np
 import sys
+import subprocess
+import tempfile
+import shutil
+import io
+import tarfile
+import heapq
+import threading
+import weakref
+import multiprocessing
+import resource
+import sqlite3
+import wave
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # إعدادات التسجيل
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class StartupProfile:
+    """أزمنة بدء التشغيل: الاستيرادات وبناء الكائنات، مع تمييز ما أُجّل لوقت أول استخدام"""
+
+    def __init__(self):
+        self.entries = []
+
+    def record(self, label, seconds, deferred=False):
+        self.entries.append((label, seconds, deferred))
+
+    def timed(self, label, func, *args, deferred=False, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(label, time.perf_counter() - start, deferred)
+
+    def report(self):
+        lines = [f"{'stage':<44} {'ms':>9}  when"]
+        for label, seconds, deferred in sorted(self.entries, key=lambda entry: -entry[1]):
+            lines.append(f"{label:<44} {seconds * 1000:>9.1f}  {'first use' if deferred else 'startup'}")
+        startup = sum(seconds for _, seconds, deferred in self.entries if not deferred)
+        deferred = sum(seconds for _, seconds, deferred in self.entries if deferred)
+        lines.append(f"{'total at startup':<44} {startup * 1000:>9.1f}")
+        lines.append(f"{'total deferred to first use':<44} {deferred * 1000:>9.1f}")
+        return "\n".join(lines)
+
+STARTUP_PROFILE = StartupProfile()
+
+def format_duration(seconds):
+    """مدة مقروءة للتقارير: 1.2s أو 48s أو 5m 12s"""
+    if seconds < 10:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+class NullSpan:
+    """المقطع المُرجع عند تعطيل التتبع: لا يقيس شيئاً"""
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class TraceSpan:
+    """مقطع مفتوح في Tracer؛ set يضيف قيماً تظهر في args الحدث"""
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.track = None
+        self.start = None
+        self.peak = 0
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.tracer.begin(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.end(self)
+        return False
+
+class Tracer:
+    """مقاطع زمنية (spans) متداخلة حول مراحل التشغيل، تُحفظ بصيغة Chrome trace (chrome://tracing أو Perfetto)
+
+    كل مقطع يسجل الزمن الفعلي، ووقت المعالج للعملية ولعملياتها الفرعية المنتهية (ffmpeg)،
+    وأعلى RSS أثناءه، والبايتات المقروءة والمكتوبة (rchar و wchar من /proc/self/io، وتشمل
+    الشبكة والأنابيب). العدادات على مستوى العملية، فالمقاطع المتزامنة تتقاسمها. RSS يُقرأ بخيط
+    كل sample_interval ثانية ما دام هناك مقطع مفتوح. مسار كل مقطع هو مهمة asyncio أو الخيط
+    الذي فتحه، والعمليات العاملة ترسل أحداثها مع نتائجها (drain ثم absorb).
+    التتبع اختياري (TRACE=1)؛ عند التعطيل يُرجع span كائناً فارغاً مشتركاً فلا يُقاس أي شيء.
+    """
+
+    def __init__(self, enabled=None, sample_interval=0.05):
+        if enabled is None:
+            enabled = os.getenv('TRACE', '0') == '1'
+        self.enabled = enabled
+        self.sample_interval = sample_interval
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.reset()
+        # العمليات العاملة المتفرعة تبدأ بأحداث فارغة وقفل جديد، ودون خيط العينات
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.events = []
+        # المسار بمفتاح المهمة أو الخيط نفسه: id() يتكرر لمهمة جديدة بعد انتهاء القديمة
+        self.tracks = weakref.WeakKeyDictionary()
+        self.track_count = 0
+        self.open_spans = set()
+        self.sampler = None
+
+    def span(self, name, category="stage", **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return TraceSpan(self, name, category, args)
+
+    def counters(self):
+        """(الزمن، وقت معالج العملية، وقت معالج العمليات الفرعية، بايتات مقروءة، بايتات مكتوبة)"""
+        times = os.times()
+        read = written = 0
+        try:
+            with open('/proc/self/io', 'rb') as f:
+                for line in f:
+                    if line.startswith(b'rchar:'):
+                        read = int(line[6:])
+                    elif line.startswith(b'wchar:'):
+                        written = int(line[6:])
+        except OSError:
+            pass
+        return (time.perf_counter(), times.user + times.system,
+                times.children_user + times.children_system, read, written)
+
+    def rss(self):
+        try:
+            with open('/proc/self/statm', 'rb') as f:
+                return int(f.read().split()[1]) * self.page_size
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def track(self):
+        """(pid, tid) لمسار المقطع: مهمة asyncio الحالية، أو الخيط خارج حلقة الأحداث"""
+        thread = threading.current_thread()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        owner = task if task is not None else thread
+        pid = os.getpid()
+        with self.lock:
+            tid = self.tracks.get(owner)
+            if tid is None:
+                # الأحداث والمسارات تبدأ فارغة في كل عملية (reset بعد التفرع)
+                if self.track_count == 0:
+                    process = "main" if multiprocessing.parent_process() is None else f"worker {pid}"
+                    self.events.append({"name": "process_name", "ph": "M", "pid": pid,
+                                        "args": {"name": process}})
+                self.track_count += 1
+                tid = self.tracks[owner] = self.track_count
+                self.events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                                    "args": {"name": task.get_name() if task is not None else thread.name}})
+        return pid, tid
+
+    def begin(self, span):
+        span.track = self.track()
+        span.peak = self.rss()
+        with self.lock:
+            self.open_spans.add(span)
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.sample, name="trace-sampler", daemon=True)
+                self.sampler.start()
+        span.start = self.counters()
+
+    def end(self, span):
+        end = self.counters()
+        rss = self.rss()
+        with self.lock:
+            self.open_spans.discard(span)
+        start = span.start
+        pid, tid = span.track
+        args = dict(span.args)
+        args.update({
+            "cpu_s": round(end[1] - start[1], 4),
+            "child_cpu_s": round(end[2] - start[2], 4),
+            "peak_rss_mb": round(max(span.peak, rss) / 1e6, 1),
+            "bytes_in": end[3] - start[3],
+            "bytes_out": end[4] - start[4],
+        })
+        event = {"name": span.name, "cat": span.category, "ph": "X", "pid": pid, "tid": tid,
+                 "ts": round(start[0] * 1e6, 1), "dur": round((end[0] - start[0]) * 1e6, 1), "args": args}
+        with self.lock:
+            self.events.append(event)
+
+    def sample(self):
+        while True:
+            time.sleep(self.sample_interval)
+            if not self.open_spans:
+                continue
+            rss = self.rss()
+            with self.lock:
+                for span in self.open_spans:
+                    if rss > span.peak:
+                        span.peak = rss
+
+    def mark(self):
+        """موضع البداية لتشغيل جديد (لـ save و summary)"""
+        with self.lock:
+            return len(self.events)
+
+    def drain(self):
+        """أحداث هذه العملية منذ آخر استدعاء، لإرجاعها من عملية عاملة"""
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+    def absorb(self, value, events):
+        """إضافة أحداث عملية عاملة وإرجاع نتيجتها"""
+        with self.lock:
+            self.events.extend(events)
+        return value
+
+    def run_events(self, since=0):
+        with self.lock:
+            # أسماء المسارات تُكتب مرة واحدة، فتُؤخذ من البداية دائماً
+            return ([event for event in self.events[:since] if event["ph"] == "M"] + self.events[since:])
+
+    def summary(self, since=0):
+        """مجاميع المقاطع حسب الاسم: العدد والزمن ووقت المعالج والبايتات وأعلى RSS"""
+        totals = {}
+        for event in self.run_events(since):
+            if event["ph"] != "X":
+                continue
+            entry = totals.setdefault(event["name"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "child_cpu_s": 0.0,
+                                                      "bytes_in": 0, "bytes_out": 0, "peak_rss_mb": 0.0})
+            args = event["args"]
+            entry["count"] += 1
+            entry["wall_s"] += event["dur"] / 1e6
+            entry["cpu_s"] += args["cpu_s"]
+            entry["child_cpu_s"] += args["child_cpu_s"]
+            entry["bytes_in"] += args["bytes_in"]
+            entry["bytes_out"] += args["bytes_out"]
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], args["peak_rss_mb"])
+        for entry in totals.values():
+            for field in ("wall_s", "cpu_s", "child_cpu_s"):
+                entry[field] = round(entry[field], 3)
+        return totals
+
+    def save(self, path, since=0):
+        """كتابة ملف Chrome trace؛ تُرجع المسار أو None عند الفشل"""
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            trace = {
+                "traceEvents": self.run_events(since),
+                "displayTimeUnit": "ms",
+                "otherData": {"host": platform.node(), "summary": self.summary(since)},
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(trace, f)
+            os.replace(tmp_path, path)
+            logger.info(f"🔎 Trace: {path} ({len(trace['traceEvents'])} events)")
+            return path
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save trace {path}: {e}")
+            return None
+
+TRACER = Tracer()
+
+class LazyModule:
+    """وكيل وحدة يؤجل استيرادها حتى أول وصول لأحد خصائصها
+
+    بعد التحميل تُنسخ خصائص الوحدة إلى الوكيل نفسه، فلا يمر الوصول اللاحق عبر __getattr__.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_module'] = None
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_load(), attr)
+
+    def _lazy_load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            name = self.__dict__['_lazy_name']
+            module = STARTUP_PROFILE.timed(f"import {name}", importlib.import_module, name, deferred=True)
+            self.__dict__.update((key, value) for key, value in module.__dict__.items() if not key.startswith('__'))
+            self.__dict__['_lazy_module'] = module
+        return module
+
+# الوحدات الثقيلة تُستورد عند أول استخدام في المرحلة التي تحتاجها
+np = LazyModule("numpy")
+genai = LazyModule("google.generativeai")
+moviepy_editor = LazyModule("moviepy.editor")
+requests = LazyModule("requests")
+httplib2 = LazyModule("httplib2")
+google_credentials = LazyModule("google.oauth2.credentials")
+google_auth_requests = LazyModule("google.auth.transport.requests")
+googleapiclient_discovery = LazyModule("googleapiclient.discovery")
+googleapiclient_errors = LazyModule("googleapiclient.errors")
+googleapiclient_http = LazyModule("googleapiclient.http")
+edge_tts = LazyModule("edge_tts")
+
+def build_service(name, version, credentials=None, http=None, cache_dir="cache/discovery"):
+    """بناء خدمة Google API من وثيقة اكتشاف محفوظة محلياً بدلاً من جلبها في كل تشغيل"""
+    start = time.perf_counter()
+    path = os.path.join(cache_dir, f"{name}.{version}.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            document = f.read()
+    except OSError:
+        # الوثيقة المضمنة مع googleapiclient، وإلا من خدمة الاكتشاف
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc(name, version)
+        if document is None:
+            url = f"https://www.googleapis.com/discovery/v1/apis/{name}/{version}/rest"
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            document = response.text
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(document)
+        os.replace(tmp_path, path)
+    
+    auth = {"http": http} if http is not None else {"credentials": credentials}
+    service = googleapiclient_discovery.build_from_document(document, **auth)
+    STARTUP_PROFILE.record(f"build {name} {version} service", time.perf_counter() - start, deferred=True)
+    return service
+
 class Config:
     def __init__(self):
         self.GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
         self.TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
         self.TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+        # يمكن توجيهه إلى خادم محلي (benchmark.py suite)
+        self.TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
         self.PEXELS_API_KEY = os.getenv('PEXELS_API_KEY')
         
         self.YOUTUBE_CHANNEL_URL = "https://youtube.com/@techcompass-d5l"
@@ -38,7 +373,7 @@ class Config:
             if not self.TELEGRAM_BOT_TOKEN or not self.TELEGRAM_CHAT_ID:
                 return False
                 
-            url = f"https://api.telegram.org/bot{self.TELEGRAM_BOT_TOKEN}/sendMessage"
+            url = f"{self.TELEGRAM_API_URL}/bot{self.TELEGRAM_BOT_TOKEN}/sendMessage"
             data = {"chat_id": self.TELEGRAM_CHAT_ID, "text": message, "parse_mode": "HTML"}
             response = requests.post(url, data=data, timeout=10)
             return response.status_code == 200
@@ -46,41 +381,201 @@ class Config:
             logger.error(f"Telegram error: {e}")
             return False
 
+class CredentialManager:
+    """إدارة مشتركة لبيانات اعتماد OAuth والبيانات المشتقة منها
+
+    الرموز التي تحمل نفس refresh_token تُحمّل ككائن واحد فتُجدَّد مرة واحدة لكل الخدمات،
+    وخيط خلفي يجددها قبل انتهائها بـ refresh_margin ثانية حتى لا يحدث التجديد أثناء رفع.
+    البيانات المشتقة (معرف المدونة، معرف القناة) تُحفظ مع بصمة الحساب وتُبطل عند تغير
+    الحساب أو بعد metadata_ttl أو عند استدعاء invalidate بعد خطأ 404/403.
+    """
+
+    def __init__(self, metadata_path="cache/credentials/metadata.json", refresh_margin=300,
+                 metadata_ttl=30 * 24 * 3600):
+        self.metadata_path = metadata_path
+        self.refresh_margin = refresh_margin
+        self.metadata_ttl = metadata_ttl
+        self.credentials = {}
+        self.refresh_locks = {}
+        self.by_env = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.refreshes = 0
+        self.metadata = self.load_metadata()
+
+    def fingerprint(self, token_data):
+        raw = f"{token_data.get('client_id')}|{token_data.get('refresh_token') or token_data.get('token')}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+    def load(self, env_name):
+        """تحميل بيانات اعتماد متغير البيئة دون تجديد؛ None إذا لم يوجد"""
+        with self.lock:
+            if env_name in self.by_env:
+                return self.by_env[env_name]
+            
+            token_json = os.getenv(env_name)
+            if not token_json:
+                return None
+            
+            token_data = json.loads(token_json)
+            fingerprint = self.fingerprint(token_data)
+            if fingerprint not in self.credentials:
+                creds = google_credentials.Credentials(
+                    token=token_data.get('token'),
+                    refresh_token=token_data.get('refresh_token'),
+                    token_uri=token_data.get('token_uri'),
+                    client_id=token_data.get('client_id'),
+                    client_secret=token_data.get('client_secret'),
+                    scopes=token_data.get('scopes')
+                )
+                if token_data.get('expiry'):
+                    # google-auth يستخدم توقيت UTC بدون منطقة زمنية
+                    creds.expiry = datetime.fromisoformat(token_data['expiry'].rstrip('Z')).replace(tzinfo=None)
+                self.credentials[fingerprint] = creds
+                self.refresh_locks[fingerprint] = threading.Lock()
+            self.by_env[env_name] = fingerprint
+            return fingerprint
+
+    def get(self, env_name):
+        """بيانات الاعتماد المشتركة جاهزة للاستخدام؛ لا تجدد إلا إذا انتهت فعلاً"""
+        fingerprint = self.load(env_name)
+        if fingerprint is None:
+            return None
+        self.ensure_fresh(fingerprint, margin=0)
+        return self.credentials[fingerprint]
+
+    def needs_refresh(self, creds, margin):
+        if not creds.refresh_token:
+            return False
+        # بدون مدة صلاحية معروفة (رمز محفوظ في secret) نعتبره منتهياً
+        if not creds.token or creds.expiry is None:
+            return True
+        return creds.expiry - timedelta(seconds=margin) <= datetime.utcnow()
+
+    def ensure_fresh(self, fingerprint, margin):
+        creds = self.credentials[fingerprint]
+        with self.refresh_locks[fingerprint]:
+            if self.needs_refresh(creds, margin):
+                creds.refresh(google_auth_requests.Request())
+                self.refreshes += 1
+                logger.info(f"🔑 Credentials refreshed (valid until {creds.expiry:%H:%M} UTC)")
+
+    def start(self, env_names):
+        """تحميل بيانات الاعتماد وبدء التجديد في الخلفية؛ لا يوقف بدء التشغيل"""
+        for env_name in env_names:
+            try:
+                self.load(env_name)
+            except Exception as e:
+                logger.error(f"❌ Could not load {env_name}: {e}")
+        if self.credentials and self.thread is None:
+            self.thread = threading.Thread(target=self.refresh_loop, name="credential-refresh", daemon=True)
+            self.thread.start()
+
+    def refresh_loop(self):
+        while not self.stop_event.is_set():
+            wake = 3600
+            for fingerprint in list(self.credentials):
+                try:
+                    self.ensure_fresh(fingerprint, margin=self.refresh_margin)
+                except Exception as e:
+                    logger.warning(f"⚠️ Background credential refresh failed: {e}")
+                    wake = min(wake, 60)
+                    continue
+                expiry = self.credentials[fingerprint].expiry
+                if expiry is not None:
+                    remaining = (expiry - datetime.utcnow()).total_seconds() - self.refresh_margin
+                    wake = min(wake, max(remaining, 30))
+            self.stop_event.wait(wake)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def load_metadata(self):
+        try:
+            with open(self.metadata_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_metadata(self):
+        os.makedirs(os.path.dirname(self.metadata_path), exist_ok=True)
+        tmp_path = f"{self.metadata_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.metadata, f)
+        os.replace(tmp_path, self.metadata_path)
+
+    def get_metadata(self, env_name, key, fetch):
+        """قيمة مشتقة محفوظة (مثل blog_id)، أو fetch() وحفظ النتيجة إن لم تكن None"""
+        fingerprint = self.load(env_name)
+        name = f"{env_name}:{key}"
+        with self.lock:
+            entry = self.metadata.get(name)
+        if (entry and entry.get("account") == fingerprint
+                and time.time() - entry.get("stored", 0) < self.metadata_ttl):
+            return entry["value"]
+        
+        value = fetch()
+        if value is not None:
+            with self.lock:
+                self.metadata[name] = {"value": value, "account": fingerprint, "stored": time.time()}
+                self.save_metadata()
+        return value
+
+    def invalidate(self, env_name, key):
+        with self.lock:
+            if self.metadata.pop(f"{env_name}:{key}", None) is not None:
+                self.save_metadata()
+
 class YouTubeUploader:
-    def __init__(self):
-        self.service = None
-        self.initialize_service()
+    def __init__(self, service=None, chunk_size=None, state_dir="cache/uploads", credentials=None):
+        self.credentials = credentials or CredentialManager()
+        # حجم كل جزء بالميغابايت (يجب أن يكون مضاعفاً لـ 256KB)
+        self.chunk_size = chunk_size or int(float(os.getenv('UPLOAD_CHUNK_MB', '8')) * 1024 * 1024)
+        self.max_retries = int(os.getenv('UPLOAD_RETRIES', '5'))
+        self.state_dir = state_dir
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.service = service
+        # الخدمة تُبنى عند أول رفع، فلا يدفع التشغيل كلفتها إن لم يصل لمرحلة الرفع
+        self.initialized = service is not None
+        self.init_lock = threading.Lock()
+    
+    def ensure_service(self):
+        with self.init_lock:
+            if not self.initialized:
+                self.initialized = True
+                self.initialize_service()
+        return self.service
     
     def initialize_service(self):
         try:
-            token_json = os.getenv('YOUTUBE_TOKEN_JSON')
-            if not token_json:
+            creds = self.credentials.get('YOUTUBE_TOKEN_JSON')
+            if creds is None:
                 logger.error("❌ YOUTUBE_TOKEN_JSON غير موجود")
                 return
             
-            token_data = json.loads(token_json)
-            
-            creds = Credentials(
-                token=token_data.get('token'),
-                refresh_token=token_data.get('refresh_token'),
-                token_uri=token_data.get('token_uri'),
-                client_id=token_data.get('client_id'),
-                client_secret=token_data.get('client_secret'),
-                scopes=token_data.get('scopes')
-            )
-            
-            if not creds.valid:
-                if creds.expired and creds.refresh_token:
-                    creds.refresh(Request())
-            
-            self.service = build('youtube', 'v3', credentials=creds)
+            self.service = build_service('youtube', 'v3', credentials=creds)
             logger.info("✅ YouTube API service initialized")
             
         except Exception as e:
             logger.error(f"❌ Failed to initialize YouTube service: {e}")
     
+    def channel_id(self):
+        """معرف قناة الحساب، محفوظ في CredentialManager بدلاً من طلبه كل تشغيل"""
+        if not self.ensure_service():
+            return None
+        
+        def fetch():
+            try:
+                channels = self.service.channels().list(part='id', mine=True).execute()
+                return channels['items'][0]['id'] if channels.get('items') else None
+            except Exception as e:
+                logger.error(f"❌ YouTube channel lookup failed: {e}")
+                return None
+        return self.credentials.get_metadata('YOUTUBE_TOKEN_JSON', 'channel_id', fetch)
+    
     def upload_video(self, video_path, title, description):
-        if not self.service:
+        if not self.ensure_service():
             logger.error("❌ YouTube service not initialized")
             return None
         
@@ -98,13 +593,9 @@ class YouTubeUploader:
                 }
             }
             
-            request = self.service.videos().insert(
-                part=','.join(body.keys()),
-                body=body,
-                media_body=MediaFileUpload(video_path, chunksize=-1, resumable=True)
-            )
-            
-            response = request.execute()
+            with TRACER.span("upload", "upload", file=os.path.basename(video_path),
+                             size_bytes=os.path.getsize(video_path)):
+                response = self.upload_resumable(video_path, body)
             video_id = response['id']
             video_url = f"https://www.youtube.com/watch?v={video_id}"
             
@@ -114,55 +605,164 @@ class YouTubeUploader:
         except Exception as e:
             logger.error(f"❌ YouTube upload failed: {e}")
             return None
+    
+    def state_path(self, video_path):
+        """ملف حالة جلسة الرفع بمفتاح من محتوى الفيديو (sha256 والحجم)
+
+        إعادة التشغيل تأخذ نفس الفيديو من ArtifactStore (video_key) بمسار ووقت تعديل مختلفين، فالمحتوى
+        وحده هو ما يتكرر بين التشغيلات. الجلسة تحتفظ بالعنوان والوصف اللذين بدأت بهما.
+        """
+        digest = ArtifactStore.digest_file(video_path)
+        return os.path.join(self.state_dir, f"{digest}_{os.path.getsize(video_path)}.json")
+    
+    def load_state(self, path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def save_state(self, path, resumable_uri, offset):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"resumable_uri": resumable_uri, "offset": offset, "updated": time.time()}, f)
+        os.replace(tmp_path, path)
+    
+    def upload_resumable(self, video_path, body):
+        """رفع على أجزاء عبر next_chunk() مع حفظ الجلسة والإزاحة لاستئنافها في تشغيل لاحق"""
+        size = os.path.getsize(video_path)
+        state_path = self.state_path(video_path)
+        state = self.load_state(state_path)
+        
+        request = self.service.videos().insert(
+            part=','.join(body.keys()),
+            body=body,
+            media_body=googleapiclient_http.MediaFileUpload(video_path, chunksize=self.chunk_size, resumable=True)
+        )
+        if state:
+            # استئناف جلسة سابقة: الطلب الأول يسأل الخادم عن الإزاحة الفعلية (PUT bytes */size)
+            request.resumable_uri = state["resumable_uri"]
+            request.resumable_progress = state["offset"]
+            logger.info(f"⏯️ Resuming upload at {state['offset'] / 1e6:.1f}/{size / 1e6:.1f} MB")
+        
+        start_offset = state["offset"] if state else 0
+        start = time.perf_counter()
+        response = None
+        failures = 0
+        resync = bool(state)
+        while response is None:
+            try:
+                if resync:
+                    response = self.sync_offset(request, size)
+                    resync = False
+                    if response is not None:
+                        break
+                status, response = request.next_chunk()
+            except googleapiclient_errors.HttpError as e:
+                if e.resp.status in (404, 410) and state:
+                    # الجلسة انتهت على الخادم: نبدأ من الصفر
+                    logger.warning("⚠️ Upload session expired, starting over")
+                    os.remove(state_path)
+                    return self.upload_resumable(video_path, body)
+                if e.resp.status < 500:
+                    raise
+                failures = self.chunk_failed(request, state_path, failures, e)
+                resync = request.resumable_uri is not None
+                continue
+            except (OSError, httplib2.HttpLib2Error) as e:
+                failures = self.chunk_failed(request, state_path, failures, e)
+                resync = request.resumable_uri is not None
+                continue
+            
+            failures = 0
+            if status is not None:
+                self.save_state(state_path, request.resumable_uri, status.resumable_progress)
+                logger.info(f"⬆️ Uploaded {status.progress() * 100:.0f}% of {os.path.basename(video_path)}")
+        
+        elapsed = time.perf_counter() - start
+        sent = size - start_offset
+        logger.info(f"📶 Upload throughput: {sent / max(elapsed, 1e-6) / 1e6:.2f} MB/s "
+                    f"({sent / 1e6:.1f} MB in {elapsed:.1f}s)")
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return response
+    
+    def chunk_failed(self, request, state_path, failures, error):
+        """حفظ الحالة بعد فشل جزء وإعادة المحاولة بتأخير متزايد، أو رفع الخطأ بعد max_retries"""
+        if request.resumable_uri:
+            self.save_state(state_path, request.resumable_uri, request.resumable_progress)
+        failures += 1
+        if failures > self.max_retries:
+            raise error
+        delay = min(2 ** failures, 30)
+        logger.warning(f"⚠️ Upload chunk failed ({error}), retry {failures}/{self.max_retries} in {delay}s")
+        time.sleep(delay)
+        return failures
+    
+    def sync_offset(self, request, size):
+        """سؤال الخادم عن البايتات المستلمة فعلاً (PUT بدون محتوى و Content-Range: bytes */size)
+
+        يضبط request.resumable_progress على ما بعد آخر بايت في ترويسة Range، فيكمل next_chunk() من هناك؛
+        يُرجع استجابة الرفع إذا كان الخادم قد استلم الملف كاملاً قبل انقطاع الاتصال.
+        """
+        headers = {'Content-Length': '0', 'Content-Range': f'bytes */{size}'}
+        resp, content = request.http.request(request.resumable_uri, method='PUT', headers=headers)
+        if resp.status in (200, 201):
+            return request.postproc(resp, content)
+        if resp.status != 308:
+            raise googleapiclient_errors.HttpError(resp, content, uri=request.resumable_uri)
+        request.resumable_progress = int(resp['range'].split('-')[1]) + 1 if 'range' in resp else 0
+        return None
 
 class BloggerUploader:
-    def __init__(self):
+    def __init__(self, credentials=None):
+        self.credentials = credentials or CredentialManager()
         self.blog_id = None
         self.service = None
-        self.initialize_service()
+        # الخدمة ومعرف المدونة يُجلبان عند أول نشر
+        self.initialized = False
+        self.init_lock = threading.Lock()
+    
+    def ensure_service(self):
+        with self.init_lock:
+            if not self.initialized:
+                self.initialized = True
+                self.initialize_service()
+        return self.service
     
     def initialize_service(self):
         try:
-            token_json = os.getenv('BLOGGER_TOKEN_JSON')
-            if not token_json:
+            creds = self.credentials.get('BLOGGER_TOKEN_JSON')
+            if creds is None:
                 logger.error("❌ BLOGGER_TOKEN_JSON غير موجود")
                 return
             
-            token_data = json.loads(token_json)
-            
-            creds = Credentials(
-                token=token_data.get('token'),
-                refresh_token=token_data.get('refresh_token'),
-                token_uri=token_data.get('token_uri'),
-                client_id=token_data.get('client_id'),
-                client_secret=token_data.get('client_secret'),
-                scopes=token_data.get('scopes')
-            )
-            
-            if not creds.valid:
-                if creds.expired and creds.refresh_token:
-                    creds.refresh(Request())
+            self.service = build_service('blogger', 'v3', credentials=creds)
             
-            self.service = build('blogger', 'v3', credentials=creds)
-            
-            try:
-                blogs = self.service.blogs().listByUser(userId='self').execute()
-                if blogs.get('items'):
-                    self.blog_id = blogs['items'][0]['id']
-                    logger.info(f"✅ Blogger blog ID: {self.blog_id}")
-                else:
-                    logger.error("❌ No blogs found")
-                    self.blog_id = "YOUR_BLOG_ID"
-            except:
+            # معرف المدونة لا يتغير، فيُحفظ بدلاً من طلب listByUser في كل تشغيل
+            self.blog_id = self.credentials.get_metadata('BLOGGER_TOKEN_JSON', 'blog_id', self.fetch_blog_id)
+            if self.blog_id is None:
                 self.blog_id = "YOUR_BLOG_ID"
+            else:
+                logger.info(f"✅ Blogger blog ID: {self.blog_id}")
             
             logger.info("✅ Blogger API service initialized")
             
         except Exception as e:
             logger.error(f"❌ Failed to initialize Blogger service: {e}")
     
+    def fetch_blog_id(self):
+        try:
+            blogs = self.service.blogs().listByUser(userId='self').execute()
+            if blogs.get('items'):
+                return blogs['items'][0]['id']
+            logger.error("❌ No blogs found")
+        except Exception as e:
+            logger.error(f"❌ Blogger blog lookup failed: {e}")
+        return None
+    
     def publish_post(self, title, content):
-        if not self.service or not self.blog_id:
+        if not self.ensure_service() or not self.blog_id:
             logger.error("❌ Blogger service not initialized")
             return None
         
@@ -173,11 +773,12 @@ class BloggerUploader:
                 'labels': ['technology', 'education', 'tutorial']
             }
             
-            post = self.service.posts().insert(
-                blogId=self.blog_id,
-                body=body,
-                isDraft=False
-            ).execute()
+            with TRACER.span("publish", "publish", content_bytes=len(content.encode('utf-8'))):
+                post = self.service.posts().insert(
+                    blogId=self.blog_id,
+                    body=body,
+                    isDraft=False
+                ).execute()
             
             post_url = post['url']
             logger.info(f"✅ Blog post published: {post_url}")
@@ -185,399 +786,2939 @@ class BloggerUploader:
             
         except Exception as e:
             logger.error(f"❌ Blogger publish failed: {e}")
+            if isinstance(e, googleapiclient_errors.HttpError) and e.resp.status in (403, 404):
+                # المدونة حُذفت أو تغيرت الصلاحيات: يُعاد البحث عن المعرف في التشغيل التالي
+                self.credentials.invalidate('BLOGGER_TOKEN_JSON', 'blog_id')
             return None
 
-class ProfessionalVideoCreator:
-    """منشئ فيديو محترف بدون استخدام APIs خارجية"""
-    
-    def __init__(self):
-        self.temp_dir = "temp"
-        os.makedirs(self.temp_dir, exist_ok=True)
-        
-        # قائمة من الألوان الجذابة للخلفيات
-        self.background_colors = [
-            (25, 99, 235),   # أزرق
-            (124, 58, 237),  # بنفسجي
-            (5, 150, 105),   # أخضر
-            (220, 38, 38),   # أحمر
-            (245, 158, 11),  # برتقالي
-            (139, 92, 246),  # بنفسجي فاتح
-            (14, 165, 233),  # سماوي
-            (236, 72, 153),  # وردي
-        ]
-        
-        # تأثيرات بصرية محلية
-        self.visual_patterns = [
-            "gradient", "dots", "lines", "grid", "waves", "circuit"
-        ]
-    
-    def create_dynamic_background(self, size=(1920, 1080), pattern_type=None):
-        """إنشاء خلفية ديناميكية محلية"""
-        if pattern_type is None:
-            pattern_type = random.choice(self.visual_patterns)
-        
-        if pattern_type == "gradient":
-            # تدرج لوني
-            color1 = random.choice(self.background_colors)
-            color2 = random.choice([c for c in self.background_colors if c != color1])
-            
-            image = Image.new('RGB', size, color1)
-            draw = ImageDraw.Draw(image)
-            
-            for i in range(size[1]):
-                r = int(color1[0] + (color2[0] - color1[0]) * (i / size[1]))
-                g = int(color1[1] + (color2[1] - color1[1]) * (i / size[1]))
-                b = int(color1[2] + (color2[2] - color1[2]) * (i / size[1]))
-                draw.line([(0, i), (size[0], i)], fill=(r, g, b))
-                
-        elif pattern_type == "dots":
-            # نقاط متلألئة
-            base_color = random.choice(self.background_colors)
-            image = Image.new('RGB', size, base_color)
-            draw = ImageDraw.Draw(image)
-            
-            for _ in range(200):
-                x = random.randint(0, size[0])
-                y = random.randint(0, size[1])
-                radius = random.randint(2, 6)
-                brightness = random.randint(180, 255)
-                color = (brightness, brightness, brightness)
-                draw.ellipse([x, y, x + radius, y + radius], fill=color)
-                
-        elif pattern_type == "circuit":
-            # نمط دائرة كهربائية
-            base_color = random.choice(self.background_colors)
-            image = Image.new('RGB', size, (10, 10, 20))
-            draw = ImageDraw.Draw(image)
-            
-            for _ in range(50):
-                x1 = random.randint(0, size[0])
-                y1 = random.randint(0, size[1])
-                x2 = x1 + random.randint(50, 200)
-                y2 = y1 + random.randint(-50, 50)
-                draw.line([(x1, y1), (x2, y2)], fill=base_color, width=2)
-                
-                # إضافة نقاط اتصال
-                draw.ellipse([x1-3, y1-3, x1+3, y1+3], fill=(0, 255, 0))
-                draw.ellipse([x2-3, y2-3, x2+3, y2+3], fill=(255, 0, 0))
-                
-        else:
-            # خلفية عادية مع تمويه خفيف
-            base_color = random.choice(self.background_colors)
-            image = Image.new('RGB', size, base_color)
-        
+class BackgroundEngine:
+    """محرك خلفيات يبني كل نمط كمصفوفات NumPy كاملة بدون رسم سطر بسطر
+
+    الرسم يتم على لوحة (height, width) من نوع uint32 كل بكسل فيها مضغوط بصيغة RGBX،
+    حتى تكون عمليات التعبئة والأقنعة على عنصر واحد لكل بكسل، ثم تُفك إلى RGB في النهاية.
+    """
+
+    # الأنماط التي تستخدم اللون الثاني؛ البقية تتجاهله
+    TWO_COLOR_PATTERNS = ("gradient", "waves")
+
+    def __init__(self, dark_color=(10, 10, 20)):
+        self.dark_color = dark_color
+        self.renderers = {
+            "gradient": self.render_gradient,
+            "dots": self.render_dots,
+            "lines": self.render_lines,
+            "grid": self.render_grid,
+            "waves": self.render_waves,
+            "circuit": self.render_circuit,
+        }
+
+    def render(self, pattern_type, size, color1, color2=None, seed=None):
+        """إرجاع خلفية بصيغة مصفوفة (height, width, 3) من نوع uint8"""
+        width, height = size
+        rng = np.random.default_rng(seed)
+        color1 = np.asarray(color1, dtype=np.float32)
+        color2 = np.asarray(color2 if color2 is not None else color1, dtype=np.float32)
+
+        renderer = self.renderers.get(pattern_type, self.render_solid)
+        canvas = renderer(width, height, color1, color2, rng)
+        return self.unpack(canvas)
+
+    def render_image(self, pattern_type, size, color1, color2=None, seed=None):
+        return Image.fromarray(self.render(pattern_type, size, color1, color2, seed))
+
+    @staticmethod
+    def pack(colors):
+        """تحويل ألوان (..., 3) إلى بكسلات RGBX مضغوطة"""
+        c = np.asarray(colors).astype(np.uint32)
+        return (c[..., 0] | (c[..., 1] << 8) | (c[..., 2] << 16)).astype('<u4')
+
+    @staticmethod
+    def unpack(canvas):
+        height, width = canvas.shape
+        channels = canvas.view(np.uint8).reshape(height, width, 4)
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[..., 0] = channels[..., 0]
+        image[..., 1] = channels[..., 1]
+        image[..., 2] = channels[..., 2]
         return image
-    
-    def create_text_slide(self, text, size=(1920, 1080), slide_type="main"):
-        """إنشاء شريحة نصية محترفة"""
+
+    def _canvas(self, width, height, color):
+        canvas = np.empty((height, width), dtype='<u4')
+        canvas[:] = self.pack(color)
+        return canvas
+
+    def _mix(self, color, target, amount):
+        return color + (np.asarray(target, dtype=np.float32) - color) * amount
+
+    def render_solid(self, width, height, color1, color2, rng):
+        return self._canvas(width, height, color1)
+
+    def render_gradient(self, width, height, color1, color2, rng):
+        # تدرج عمودي: لون واحد لكل صف ثم بث على العرض
+        t = (np.arange(height, dtype=np.float32) / height)[:, None]
+        rows = self.pack(color1 + (color2 - color1) * t)
+
+        canvas = np.empty((height, width), dtype='<u4')
+        canvas[:] = rows[:, None]
+        return canvas
+
+    def render_dots(self, width, height, color1, color2, rng, count=200):
+        canvas = self._canvas(width, height, color1)
+
+        x = rng.integers(0, width + 1, count)
+        y = rng.integers(0, height + 1, count)
+        diameter = rng.integers(2, 7, count)
+        brightness = rng.integers(180, 256, count)
+
+        # قالب دائري لكل نقطة داخل مربع 7x7
+        offsets = np.arange(7)
+        dy, dx = np.meshgrid(offsets, offsets, indexing='ij')
+        radius = (diameter / 2.0)[:, None, None]
+        inside = ((dx + 0.5 - radius) ** 2 + (dy + 0.5 - radius) ** 2) <= radius ** 2
+
+        xs = x[:, None, None] + dx
+        ys = y[:, None, None] + dy
+        mask = inside & (xs < width) & (ys < height)
+
+        grey = self.pack(np.repeat(brightness[:, None], 3, axis=1))
+        canvas[ys[mask], xs[mask]] = np.broadcast_to(grey[:, None, None], mask.shape)[mask]
+        return canvas
+
+    def render_lines(self, width, height, color1, color2, rng):
+        # خطوط قطرية: كل صف هو نفس النمط مزاحاً ببكسل واحد
+        spacing = int(rng.integers(60, 121))
+        thickness = int(rng.integers(2, 5))
+
+        stripe = (np.arange(width + height) % spacing) < thickness
+        band = np.where(stripe, self.pack(self._mix(color1, (255, 255, 255), 0.25)), self.pack(color1))
+        band = band.astype('<u4')
+
+        step = band.strides[0]
+        rows = np.lib.stride_tricks.as_strided(band, shape=(height, width), strides=(step, step))
+        return np.ascontiguousarray(rows)
+
+    def render_grid(self, width, height, color1, color2, rng):
+        # شبكة بخطوط أفقية وعمودية
+        canvas = self._canvas(width, height, self._mix(color1, (0, 0, 0), 0.35))
+        cell = int(rng.integers(60, 121))
+        line_color = self.pack(self._mix(color1, (255, 255, 255), 0.3))
+
+        canvas[(np.arange(height) % cell) < 2, :] = line_color
+        canvas[:, (np.arange(width) % cell) < 2] = line_color
+        return canvas
+
+    def render_waves(self, width, height, color1, color2, rng):
+        # حقل أمواج جيبية يمزج بين لونين
+        phases = rng.uniform(0, 2 * np.pi, 3).astype(np.float32)
+        freq = rng.uniform(1.5, 4.0, 3).astype(np.float32) * np.float32(2 * np.pi)
+
+        x = np.linspace(0, 1, width, dtype=np.float32)
+        y = np.linspace(0, 1, height, dtype=np.float32)
+
+        # sin(a + b) = sin(a)cos(b) + cos(a)sin(b) يجعل الموجة القطرية حاصل ضرب خارجي
+        diagonal_x = x * freq[2] + phases[2]
+        field = np.multiply.outer(np.cos(y * freq[2]), np.sin(diagonal_x))
+        field += np.multiply.outer(np.sin(y * freq[2]), np.cos(diagonal_x))
+        field += np.sin(x * freq[0] + phases[0])[None, :]
+        field += np.sin(y * freq[1] + phases[1])[:, None]
+
+        levels = ((field + 3.0) * np.float32(255 / 6)).astype(np.uint8)
+        t = (np.arange(256, dtype=np.float32) / 255)[:, None]
+        palette = self.pack(color1 + (color2 - color1) * t)
+        return palette[levels]
+
+    def render_circuit(self, width, height, color1, color2, rng, count=50):
+        # نمط دائرة كهربائية: مقاطع مستقيمة مع نقاط اتصال
+        canvas = self._canvas(width, height, self.dark_color)
+
+        x1 = rng.integers(0, width + 1, count)
+        y1 = rng.integers(0, height + 1, count)
+        x2 = x1 + rng.integers(50, 201, count)
+        y2 = y1 + rng.integers(-50, 51, count)
+
+        steps = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1))
+        t = np.arange(steps.max() + 1)[None, :] / steps[:, None]
+        valid = t <= 1.0
+        px = np.rint(x1[:, None] + (x2 - x1)[:, None] * t).astype(np.int64)[valid]
+        py = np.rint(y1[:, None] + (y2 - y1)[:, None] * t).astype(np.int64)[valid]
+
+        # عرض الخط 2 بكسل
+        px = np.concatenate([px, px])
+        py = np.concatenate([py, py + 1])
+        self._plot(canvas, px, py, color1)
+
+        self._plot_disks(canvas, x1, y1, 3, (0, 255, 0))
+        self._plot_disks(canvas, x2, y2, 3, (255, 0, 0))
+        return canvas
+
+    def _plot(self, canvas, xs, ys, color):
+        height, width = canvas.shape
+        keep = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        canvas[ys[keep], xs[keep]] = self.pack(color)
+
+    def _plot_disks(self, canvas, cx, cy, radius, color):
+        offsets = np.arange(-radius, radius + 1)
+        dy, dx = np.meshgrid(offsets, offsets, indexing='ij')
+        disk = (dx ** 2 + dy ** 2) <= radius ** 2
+        xs = (cx[:, None] + dx[disk][None, :]).ravel()
+        ys = (cy[:, None] + dy[disk][None, :]).ravel()
+        self._plot(canvas, xs, ys, color)
+
+class BackgroundCache:
+    """ذاكرة مؤقتة للخلفيات: LRU في الذاكرة مع ملفات .npy دائمة على القرص
+
+    لكل مفتاح (نمط، لونان، حجم) مجموعة ثابتة من النسخ، وكل نسخة تُرسم ببذرة مشتقة
+    من مفتاحها، لذلك تعطي نفس البكسلات في كل تشغيل وعلى أي جهاز.
+    """
+
+    # يجب رفعه عند تغيير مخرجات BackgroundEngine حتى لا تُستخدم ملفات قديمة
+    VERSION = 1
+
+    def __init__(self, engine, cache_dir="cache/backgrounds", variants=3,
+                 max_memory_bytes=256 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024):
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.variants = variants
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # حجم الملفات على القرص: مسح واحد هنا ثم يُحدّث مع كل كتابة وحذف
+        self.disk_bytes = self._disk_usage()
+
+    def key(self, pattern_type, size, color1, color2, variant):
+        if pattern_type not in self.engine.TWO_COLOR_PATTERNS:
+            color2 = None
+        raw = json.dumps([self.VERSION, pattern_type, list(size), list(color1),
+                          list(color2) if color2 else None, variant])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, pattern_type, size, color1, color2=None, variant=None, out=None):
+        """إرجاع نسخة قابلة للتعديل من الخلفية، أو نسخها داخل out إن وُجد"""
+        if variant is None:
+            variant = random.randrange(self.variants)
+        key = self.key(pattern_type, size, color1, color2, variant)
+
+        background = self.memory.get(key)
+        if background is not None:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self._copy(background, out)
+
+        background = self._load(key)
+        if background is not None:
+            self.stats["disk_hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            seed = int(key[:8], 16)
+            background = self.engine.render(pattern_type, size, color1, color2, seed=seed)
+            self._store(key, background)
+
+        self._remember(key, background)
+        return self._copy(background, out)
+
+    def _copy(self, background, out):
+        if out is None:
+            return background.copy()
+        np.copyto(out, background)
+        return out
+
+    def pregenerate(self, sizes, patterns, colors):
+        """توليد مجموعة النسخ مسبقاً لكل (نمط، زوج ألوان، حجم) حتى حد القرص"""
+        for size in sizes:
+            for pattern_type in patterns:
+                pairs = [(c1, c2) for c1 in colors for c2 in colors if c1 != c2]
+                if pattern_type not in self.engine.TWO_COLOR_PATTERNS:
+                    pairs = [(c1, None) for c1 in colors]
+                for color1, color2 in pairs:
+                    for variant in range(self.variants):
+                        if self.disk_bytes >= self.max_disk_bytes:
+                            return
+                        key = self.key(pattern_type, size, color1, color2, variant)
+                        if not os.path.exists(self._path(key)):
+                            seed = int(key[:8], 16)
+                            self._store(key, self.engine.render(pattern_type, size, color1, color2, seed=seed))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _remember(self, key, background):
+        background.setflags(write=False)
+        self.memory[key] = background
+        self.memory_bytes += background.nbytes
+
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= evicted.nbytes
+
+    def _load(self, key):
+        path = self._path(key)
         try:
-            # إنشاء خلفية ديناميكية
-            bg_image = self.create_dynamic_background(size)
-            draw = ImageDraw.Draw(bg_image)
-            
-            # تحديد حجم الخط بناءً على نوع الشريحة
-            if slide_type == "title":
-                title_font_size = 90
-                subtitle_font_size = 50
-                max_width = size[0] - 200
-            elif slide_type == "main":
-                title_font_size = 70
-                subtitle_font_size = 40
-                max_width = size[0] - 150
-            else:  # outro
-                title_font_size = 80
-                subtitle_font_size = 45
-                max_width = size[0] - 200
-            
-            # محاولة تحميل خطوط
-            try:
-                title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", title_font_size)
-                subtitle_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", subtitle_font_size)
-            except:
-                # خطوط افتراضية إذا فشل التحميل
-                title_font = ImageFont.load_default()
-                subtitle_font = ImageFont.load_default()
-            
-            # تقسيم النص إلى سطور
-            lines = textwrap.wrap(text, width=40 if slide_type == "title" else 50)
-            
-            if not lines:
-                return None
-            
-            # حساب الارتفاع الكلي
-            line_spacing = 20
-            total_height = (len(lines) * (title_font_size if slide_type == "title" else subtitle_font_size)) + ((len(lines) - 1) * line_spacing)
-            
-            # حساب نقطة البداية
-            y_start = (size[1] - total_height) // 2
-            
-            # إضافة خلفية شفافة للنص
-            text_bg_height = total_height + 60
-            text_bg_width = max_width + 100
-            text_bg_x = (size[0] - text_bg_width) // 2
-            text_bg_y = y_start - 30
-            
-            draw.rectangle(
-                [text_bg_x, text_bg_y, text_bg_x + text_bg_width, text_bg_y + text_bg_height],
-                fill=(0, 0, 0, 180),
-                outline=(255, 255, 255, 100),
-                width=3
-            )
-            
-            # رسم النص
-            current_y = y_start
-            for i, line in enumerate(lines):
-                if i == 0 and slide_type == "title":
-                    font = title_font
-                    text_color = (255, 255, 255)
-                else:
-                    font = subtitle_font
-                    text_color = (240, 240, 240)
-                
-                # حساب عرض النص
-                bbox = draw.textbbox((0, 0), line, font=font)
-                text_width = bbox[2] - bbox[0]
-                x_pos = (size[0] - text_width) // 2
-                
-                # إضافة ظل للنص
-                shadow_offset = 4
-                draw.text((x_pos + shadow_offset, current_y + shadow_offset), 
-                         line, font=font, fill=(0, 0, 0, 200))
-                
-                # النص الرئيسي
-                draw.text((x_pos, current_y), line, font=font, fill=text_color)
-                
-                current_y += (title_font_size if (i == 0 and slide_type == "title") else subtitle_font_size) + line_spacing
-            
-            # إضافة شعار في الزاوية
-            logo_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 35)
-            logo_text = "Tech Compass"
-            draw.text((50, size[1] - 90), logo_text, font=logo_font, fill=(255, 255, 255, 200))
-            draw.text((50, size[1] - 50), "Tech Education Channel", font=logo_font, fill=(200, 200, 200, 150))
-            
-            # حفظ الصورة
-            temp_path = os.path.join(self.temp_dir, f"slide_{slide_type}_{hash(text[:30])}.png")
-            bg_image.save(temp_path, 'PNG', quality=95)
-            
-            return temp_path
-            
+            background = np.load(path)
+            os.utime(path)
+            return background
+        except FileNotFoundError:
+            return None
         except Exception as e:
-            logger.error(f"❌ Text slide creation error: {e}")
+            logger.warning(f"⚠️ Corrupt background cache entry {path}: {e}")
+            self.disk_bytes -= os.path.getsize(path)
+            os.remove(path)
             return None
-    
-    def create_short_slide(self, text, size=(1080, 1920)):
-        """إنشاء شريحة للمقاطع القصيرة"""
+
+    def _store(self, key, background):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
         try:
-            # خلفية ديناميكية للشورت
-            bg_image = self.create_dynamic_background(size, pattern_type=random.choice(["gradient", "dots"]))
-            draw = ImageDraw.Draw(bg_image)
-            
-            # خطوط للشورت
+            with open(tmp_path, 'wb') as f:
+                np.save(f, background)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.disk_bytes += os.path.getsize(path) - replaced
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist background: {e}")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict_disk(self):
+        """حذف الأقدم استخداماً حتى الحد؛ المسح الكامل هنا فقط، ويصحح disk_bytes إن كتبت عملية أخرى"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+        self.disk_bytes = total
+
+FONT_BOLD = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+FONT_REGULAR = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+class FontRegistry:
+    """سجل خطوط مشترك على مستوى العملية حتى لا يُحمّل نفس الخط مرتين"""
+
+    def __init__(self):
+        self.fonts = {}
+
+    def get(self, path, size):
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is None:
+            try:
+                font = ImageFont.truetype(path, size)
+            except Exception:
+                # خط افتراضي إذا فشل التحميل
+                font = ImageFont.load_default()
+            self.fonts[key] = font
+        return font
+
+FONT_REGISTRY = FontRegistry()
+
+class TextRenderer:
+    """رسم النص عبر أقنعة ألفا مخزنة مؤقتاً ودمجها بـ NumPy
+
+    كل سطر يُحوّل إلى قناع مرة واحدة فقط لكل (نص، خط، حجم)، ومن نفس القناع يُرسم
+    الظل والنص الرئيسي.
+    """
+
+    def __init__(self, fonts=None, max_cache_bytes=64 * 1024 * 1024):
+        self.fonts = fonts or FONT_REGISTRY
+        self.max_cache_bytes = max_cache_bytes
+        self.masks = OrderedDict()
+        self.cache_bytes = 0
+        self.overlays = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def line_mask(self, text, font_path, font_size):
+        """إرجاع (القناع، إزاحة x، إزاحة y، العرض) لسطر واحد"""
+        key = (text, font_path, font_size)
+        entry = self.masks.get(key)
+        if entry is not None:
+            self.masks.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+        self.stats["misses"] += 1
+        font = self.fonts.get(font_path, font_size)
+        left, top, right, bottom = font.getbbox(text)
+        width, height = max(right - left, 1), max(bottom - top, 1)
+
+        layer = Image.new('L', (width, height), 0)
+        ImageDraw.Draw(layer).text((-left, -top), text, font=font, fill=255)
+        mask = np.asarray(layer)
+        mask.setflags(write=False)
+
+        entry = (mask, left, top, right - left)
+        self.masks[key] = entry
+        self.cache_bytes += mask.nbytes
+        while self.cache_bytes > self.max_cache_bytes and len(self.masks) > 1:
+            _, (evicted, _, _, _) = self.masks.popitem(last=False)
+            self.cache_bytes -= evicted.nbytes
+        return entry
+
+    def measure(self, text, font_path, font_size):
+        return self.line_mask(text, font_path, font_size)[3]
+
+    def composite(self, frame, mask, x, y, color):
+        """دمج لون عبر قناع ألفا في الإطار مع قص الحواف"""
+        frame_h, frame_w = frame.shape[:2]
+        mask_h, mask_w = mask.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + mask_w, frame_w), min(y + mask_h, frame_h)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x, None].astype(np.uint16)
+        region = frame[y0:y1, x0:x1]
+        color = np.asarray(color, dtype=np.uint16)
+        region[:] = ((region * (255 - alpha) + color * alpha + 127) // 255).astype(np.uint8)
+
+    def draw_text(self, frame, text, font_path, font_size, position, color, shadow_offset=0,
+                  shadow_color=(0, 0, 0)):
+        """رسم سطر مع ظل اختياري من نفس القناع، مثل ImageDraw.text"""
+        mask, left, top, _ = self.line_mask(text, font_path, font_size)
+        x, y = position[0] + left, position[1] + top
+        if shadow_offset:
+            self.composite(frame, mask, x + shadow_offset, y + shadow_offset, shadow_color)
+        self.composite(frame, mask, x, y, color)
+
+    def draw_panel(self, frame, box, fill, outline, width):
+        """مستطيل بحدود، بنفس إحداثيات ImageDraw.rectangle الشاملة"""
+        frame_h, frame_w = frame.shape[:2]
+        x0, y0, x1, y1 = box
+        outer = frame[max(y0, 0):max(min(y1 + 1, frame_h), 0), max(x0, 0):max(min(x1 + 1, frame_w), 0)]
+        outer[:] = outline
+
+        ix0, iy0, ix1, iy1 = x0 + width, y0 + width, x1 - width + 1, y1 - width + 1
+        if ix0 < ix1 and iy0 < iy1:
+            frame[max(iy0, 0):max(min(iy1, frame_h), 0), max(ix0, 0):max(min(ix1, frame_w), 0)] = fill
+
+    def branding_overlay(self, size):
+        """طبقة الشعار والعلامة المائية مركّبة مسبقاً لكل حجم"""
+        overlay = self.overlays.get(size)
+        if overlay is not None:
+            return overlay
+
+        items = [
+            ("Tech Compass", (50, size[1] - 90), (255, 255, 255)),
+            ("Tech Education Channel", (50, size[1] - 50), (200, 200, 200)),
+        ]
+        placed = []
+        for text, (x, y), color in items:
+            mask, left, top, _ = self.line_mask(text, FONT_BOLD, 35)
+            placed.append((mask, x + left, y + top, color))
+
+        x0 = min(x for _, x, _, _ in placed)
+        y0 = min(y for _, _, y, _ in placed)
+        x1 = max(x + m.shape[1] for m, x, _, _ in placed)
+        y1 = max(y + m.shape[0] for m, _, y, _ in placed)
+
+        # تركيب الطبقة مرة واحدة: لون لكل بكسل + قناع ألفا موحد
+        color_layer = np.zeros((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        alpha_layer = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        for mask, x, y, color in placed:
+            rows = slice(y - y0, y - y0 + mask.shape[0])
+            cols = slice(x - x0, x - x0 + mask.shape[1])
+            color_layer[rows, cols][mask > 0] = color
+            np.maximum(alpha_layer[rows, cols], mask, out=alpha_layer[rows, cols])
+
+        overlay = (color_layer, alpha_layer, x0, y0)
+        self.overlays[size] = overlay
+        return overlay
+
+    def apply_overlay(self, frame, overlay):
+        color_layer, alpha_layer, x, y = overlay
+        frame_h, frame_w = frame.shape[:2]
+        h = min(alpha_layer.shape[0], frame_h - y)
+        w = min(alpha_layer.shape[1], frame_w - x)
+        if h <= 0 or w <= 0:
+            return
+
+        alpha = alpha_layer[:h, :w, None].astype(np.uint16)
+        region = frame[y:y + h, x:x + w]
+        region[:] = ((region * (255 - alpha) + color_layer[:h, :w] * alpha + 127) // 255).astype(np.uint8)
+
+class TextLayout:
+    """تخطيط النص بعرض البكسل: لف السطور وملاءمة حجم الخط داخل صندوق
+
+    العرض يُحسب من جدول تقدم الحروف لكل (خط، حجم) دون رسم أي نص، وأكبر حجم يناسب الصندوق
+    يُختار ببحث ثنائي. كل تخطيط يُحفظ لكل (نص، خط، صندوق) فلا يُحسب نفس المشهد مرتين.
+    """
+
+    def __init__(self, fonts=None, max_layouts=1024):
+        self.fonts = fonts or FONT_REGISTRY
+        self.max_layouts = max_layouts
+        self.tables = {}
+        self.layouts = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def table(self, font_path, font_size):
+        """جدول تقدم الحروف وارتفاع السطر لخط وحجم؛ حروف ASCII تُحسب مسبقاً والباقي عند الحاجة"""
+        key = (font_path, font_size)
+        table = self.tables.get(key)
+        if table is None:
+            font = self.fonts.get(font_path, font_size)
+            ascent, descent = font.getmetrics()
+            table = {
+                "font": font,
+                "advances": {chr(code): font.getlength(chr(code)) for code in range(32, 127)},
+                "line_height": ascent + descent,
+            }
+            self.tables[key] = table
+        return table
+
+    def width(self, text, font_path, font_size):
+        table = self.table(font_path, font_size)
+        advances = table["advances"]
+        total = 0.0
+        for char in text:
+            advance = advances.get(char)
+            if advance is None:
+                advance = advances[char] = table["font"].getlength(char)
+            total += advance
+        return total
+
+    def wrap(self, text, font_path, font_size, max_width):
+        """لف النص بالكلمات حسب العرض بالبكسل؛ أسطر النص الأصلية تبقى منفصلة
+
+        الكلمة الأعرض من السطر تُقسم على الحروف بدلاً من أن تخرج عن الإطار.
+        """
+        space = self.width(" ", font_path, font_size)
+        lines = []
+        for paragraph in text.split("\n"):
+            line, line_width = [], 0.0
+            for word in paragraph.split():
+                word_width = self.width(word, font_path, font_size)
+                if line and line_width + space + word_width <= max_width:
+                    line.append(word)
+                    line_width += space + word_width
+                    continue
+                if line:
+                    lines.append(" ".join(line))
+                while word_width > max_width and len(word) > 1:
+                    # أطول بداية من الكلمة تسع السطر، حرف واحد على الأقل
+                    end, piece_width = 1, self.width(word[0], font_path, font_size)
+                    while end < len(word):
+                        advance = self.width(word[end], font_path, font_size)
+                        if piece_width + advance > max_width:
+                            break
+                        piece_width += advance
+                        end += 1
+                    lines.append(word[:end])
+                    word = word[end:]
+                    word_width = self.width(word, font_path, font_size)
+                line, line_width = [word], word_width
+            if line:
+                lines.append(" ".join(line))
+        return lines
+
+    def layout(self, text, font_path, font_size, max_width, line_spacing):
+        lines = self.wrap(text, font_path, font_size, max_width)
+        line_height = self.table(font_path, font_size)["line_height"]
+        return {
+            "lines": lines,
+            "widths": [int(round(self.width(line, font_path, font_size))) for line in lines],
+            "font_size": font_size,
+            "line_height": line_height,
+            "height": len(lines) * line_height + max(len(lines) - 1, 0) * line_spacing,
+        }
+
+    def fit(self, text, font_path, box, min_size, max_size, line_spacing=20):
+        """أكبر حجم خط بين min_size و max_size يجعل النص داخل box (عرض، ارتفاع)
+
+        إذا لم يناسب حتى min_size يُرجع تخطيط min_size ملفوفاً على عرض الصندوق.
+        النتيجة مشتركة بين الاستدعاءات فلا يجب تعديلها.
+        """
+        key = (text, font_path, tuple(box), min_size, max_size, line_spacing)
+        layout = self.layouts.get(key)
+        if layout is not None:
+            self.layouts.move_to_end(key)
+            self.stats["hits"] += 1
+            return layout
+        
+        self.stats["misses"] += 1
+        max_width, max_height = box
+        low, high = min_size, max_size
+        layout = None
+        while low <= high:
+            size = (low + high) // 2
+            candidate = self.layout(text, font_path, size, max_width, line_spacing)
+            if candidate["height"] <= max_height:
+                layout, low = candidate, size + 1
+            else:
+                high = size - 1
+        if layout is None:
+            layout = self.layout(text, font_path, min_size, max_width, line_spacing)
+        
+        self.layouts[key] = layout
+        if len(self.layouts) > self.max_layouts:
+            self.layouts.popitem(last=False)
+        return layout
+
+class SlideFrameBuffer:
+    """مخزن إطارات RGB مشترك معنون في الذاكرة لكل شرائح فيديو واحد
+
+    الشرائح تُرسم مباشرة داخل الإطارات، و ImageClip يستخدم نفس المصفوفة بدون نسخ.
+    يُفضّل /dev/shm حتى لا تُكتب الصفحات على القرص.
+    """
+
+    def __init__(self, count, size, directory=None, path=None):
+        if path is None:
+            if directory is None:
+                directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            fd, path = tempfile.mkstemp(prefix="slides_", suffix=".rgb", dir=directory)
+            os.close(fd)
+            mode = 'w+'
+        else:
+            mode = 'r+'
+
+        self.path = path
+        self.count = count
+        self.size = tuple(size)
+        self.frames = np.memmap(self.path, dtype=np.uint8, mode=mode, shape=(count, size[1], size[0], 3))
+
+    @classmethod
+    def attach(cls, spec):
+        """فتح مخزن موجود من عملية أخرى عبر spec()"""
+        path, count, size = spec
+        return cls(count, size, path=path)
+
+    def spec(self):
+        return (self.path, self.count, self.size)
+
+    def frame(self, index):
+        return self.frames[index]
+
+    def close(self):
+        # الملف يُحذف فوراً؛ الصفحات تبقى صالحة ما دامت هناك مراجع للمصفوفة
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class StillImageEncoder:
+    """ترميز شرائح ثابتة إلى MP4 عبر ffmpeg: مقطع مستقل لكل مشهد، أو كل المشاهد في أنبوب واحد
+
+    كل شريحة تمر إلى ffmpeg مرة واحدة ويكررها هو حسب مدتها، فلا تمر آلاف الإطارات المتطابقة
+    عبر Python. إعدادات الترميز مطابقة لـ write_videofile في moviepy (libx264، yuv420p، AAC)،
+    و profile (preset و crf و gop و threads) يأتي من EncoderTuner.
+    """
+
+    DEFAULT_PROFILE = {"preset": "medium", "crf": 23, "gop": 250, "threads": 4}
+
+    def __init__(self, temp_dir="temp", ffmpeg_binary=None):
+        self.temp_dir = temp_dir
+        self.ffmpeg_binary = ffmpeg_binary
+
+    def binary(self):
+        if self.ffmpeg_binary is None:
+            from moviepy.config import get_setting
+            self.ffmpeg_binary = get_setting("FFMPEG_BINARY")
+        return self.ffmpeg_binary
+
+    @staticmethod
+    def frame_array(source, size):
+        """مصفوفة (height, width, 3) من نوع uint8 لمصدر شريحة: مصفوفة أو مسار صورة أو لون ثابت"""
+        if isinstance(source, tuple):
+            return np.full((size[1], size[0], 3), source, dtype=np.uint8)
+        if isinstance(source, str):
+            with Image.open(source) as image:
+                return np.asarray(image.convert('RGB'))
+        return np.ascontiguousarray(source, dtype=np.uint8)
+
+    def write_still(self, source, size, path):
+        if isinstance(source, str):
+            return source
+        if isinstance(source, tuple):
+            source = np.full((size[1], size[0], 3), source, dtype=np.uint8)
+        # BMP بدون ضغط: أسرع كتابة وقراءة لإطار يُقرأ مرة واحدة
+        Image.fromarray(np.asarray(source)).save(path, 'BMP')
+        return path
+
+    def encode_stream(self, frames, frame_counts, output_path, size, fps=24, profile=None, music=None,
+                      music_volume=0.3, narration=None):
+        """ترميز إطار واحد لكل مشهد يصل من frames عبر أنبوب rawvideo، وإرجاع المدة الكلية بالثواني
+
+        الإطار N يأخذ pts بداية مشهده بوحدة الإطار، ثم يكرره مرشح fps حتى بداية المشهد التالي؛
+        آخر إطار يُكتب مرتين، والثانية عند pts نهاية الفيديو لتحدد مدة آخر مشهد. frames يُستهلك
+        إطاراً بإطار ولا يُطلب التالي قبل أن يُكتب الحالي في الأنبوب، فلا يحتاج المتصل أكثر من
+        إطارين مهما طال الفيديو.
+        """
+        width, height = size
+        total = sum(frame_counts)
+        # بداية المشهد N = مجموع إطارات ما قبله، كمجموع خطوات gte بدلاً من if متداخلة
+        pts = "+".join(["0"] + [f"{count}*gte(N\\,{i})" for i, count in enumerate(frame_counts, 1)])
+        cmd = [
+            self.binary(), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-framerate', str(fps), '-i', 'pipe:0',
+        ]
+        cmd += self.audio_inputs(music, narration)
+        # التحويل إلى yuv420p قبل fps، فيُحوّل كل مشهد مرة واحدة لا كل إطار مكرر
+        cmd += ['-map', '0:v', '-vf', f'settb=1/{fps},setpts={pts},format=yuv420p,fps={fps}',
+                '-frames:v', str(total)] + self.video_args(profile)
+        cmd += self.audio_output(music, music_volume, narration)
+        cmd += ['-t', f'{total / fps:.3f}', output_path]
+
+        # الإطار الأول يُطلب قبل تشغيل ffmpeg: إن كان frames يرسم في عمليات متفرعة فإنها تُنشأ
+        # الآن، ولا ترث طرف الكتابة في stdin فيبقى ffmpeg منتظراً نهاية الأنبوب إلى الأبد
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            raise ValueError("encode_stream needs at least one frame")
+        
+        # stderr في ملف حتى لا يمتلئ أنبوبه بينما ننتظر الكتابة في stdin
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=stderr)
             try:
-                main_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 85)
-                secondary_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 55)
-            except:
-                main_font = ImageFont.load_default()
-                secondary_font = ImageFont.load_default()
+                data = None
+                frame = first
+                while frame is not None:
+                    data = memoryview(self.frame_array(frame, size)).cast('B')
+                    process.stdin.write(data)
+                    frame = next(frames, None)
+                if data is not None:
+                    process.stdin.write(data)
+                process.stdin.close()
+            except BrokenPipeError:
+                # ffmpeg خرج مبكراً؛ الخطأ يُقرأ من stderr أدناه
+                pass
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            returncode = process.wait()
+            if returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode('utf-8', errors='replace').strip()[-500:]
+                raise RuntimeError(f"ffmpeg exited with {returncode}: {message}")
+
+        return total / fps
+
+    def encode_segment(self, source, duration, size, output_path, fps=24, profile=None):
+        """ترميز شريحة واحدة كمقطع مستقل يبدأ بإطار IDR، صالح للتجميع بـ -c copy"""
+        frame_count = max(int(round(duration * fps)), 1)
+        with tempfile.TemporaryDirectory(prefix="still_", dir=self.temp_dir) as work_dir:
+            still = self.write_still(source, size, os.path.join(work_dir, "still.bmp"))
+            # الصورة تُفك وتُحوّل إلى yuv420p مرة واحدة ثم يُكرر الإطار (tpad)، بدلاً من
+            # فكها وتحويلها لكل إطار مع -loop 1، وهو ما كان يأخذ معظم وقت الترميز
+            cmd = [
+                self.binary(), '-y', '-loglevel', 'error',
+                '-framerate', str(fps), '-i', still,
+                '-vf', f'format=yuv420p,tpad=stop_mode=clone:stop={frame_count - 1}',
+                '-frames:v', str(frame_count),
+            ] + self.video_args(profile) + [
+                '-video_track_timescale', str(fps * 1000),
+                output_path,
+            ]
+            self.run(cmd)
+        return frame_count / fps
+
+    def video_args(self, profile=None):
+        profile = profile or self.DEFAULT_PROFILE
+        return ['-c:v', 'libx264', '-preset', profile["preset"], '-crf', str(profile["crf"]),
+                '-g', str(profile["gop"]), '-threads', str(profile["threads"])]
+
+    def concat(self, segment_paths, output_path, total, music=None, music_volume=0.3, narration=None):
+        """تجميع مقاطع مرمّزة بالنسخ المباشر، مع ترميز الصوت (موسيقى وتعليق) فقط إن وُجد"""
+        with tempfile.TemporaryDirectory(prefix="concat_", dir=self.temp_dir) as work_dir:
+            list_path = os.path.join(work_dir, "segments.ffconcat")
+            with open(list_path, 'w') as f:
+                f.write("ffconcat version 1.0\n")
+                for path in segment_paths:
+                    f.write(f"file '{os.path.abspath(path)}'\n")
+
+            cmd = [self.binary(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+            cmd += self.audio_inputs(music, narration)
+            cmd += ['-map', '0:v', '-c:v', 'copy']
+            cmd += self.audio_output(music, music_volume, narration)
+            cmd += ['-t', f'{total:.3f}', output_path]
+            self.run(cmd)
+        return total
+
+    def audio_inputs(self, music, narration):
+        """مدخلات الصوت بعد الفيديو (المدخل 0): مقاطع التعليق بالترتيب ثم الموسيقى (مسار من MusicLibrary)"""
+        args = []
+        for path, _ in narration or []:
+            args += ['-i', path]
+        if music:
+            args += MusicLibrary.ffmpeg_input(music)
+        return args
+
+    def audio_output(self, music, music_volume, narration):
+        """مزج الصوت في تمريرة واحدة: كل مقطع تعليق مؤخر إلى بداية مشهده مع الموسيقى، ثم AAC"""
+        narration = narration or []
+        if not narration:
+            if not music:
+                return []
+            return ['-map', '1:a', '-af', f'volume={music_volume}', '-c:a', 'aac', '-ar', '44100']
+        
+        filters, labels = [], []
+        for i, (_, start) in enumerate(narration, 1):
+            filters.append(f"[{i}:a]adelay={int(round(start * 1000))}:all=1[n{i}]")
+            labels.append(f"[n{i}]")
+        if music:
+            filters.append(f"[{len(narration) + 1}:a]volume={music_volume}[music]")
+            labels.append("[music]")
+        filters.append(f"{''.join(labels)}amix=inputs={len(labels)}:duration=longest:"
+                       f"dropout_transition=0:normalize=0,apad[audio]")
+        return ['-filter_complex', ";".join(filters), '-map', '[audio]', '-c:a', 'aac', '-ar', '44100']
+
+    def run(self, cmd):
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {result.returncode}: {result.stderr.strip()[-500:]}")
+
+class EncoderTuner:
+    """اختيار إعدادات x264 (threads و preset و CRF و GOP) لكل صيغة فيديو بترميز معايرة قصير
+
+    لكل preset يُرمّز إطار واحد (تكلفة ثابتة: تشغيل ffmpeg وإطار IDR) ثم ثانيتان من نفس
+    الشريحة (تكلفة كل إطار إضافي)، ومنهما تُقدّر سرعة الترميز وحجم الملف لمشاهد بطول
+    scene_s. يُختار أصغر ملف يحقق min_speed (مضاعف الزمن الحقيقي)، ثم يُرفع CRF إذا تجاوز
+    الحجم max_mb_per_min، ثم أقل threads قريب من الأسرع. النتيجة تُحفظ لكل بصمة جهاز.
+    """
+
+    VERSION = 1
+    PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow')
+    BASE_CRF = 23
+    MAX_CRF = 29
+    CALIBRATION_S = 2
+
+    def __init__(self, encoder, path="cache/encoder_profiles.json", min_speed=None, max_mb_per_min=None):
+        self.encoder = encoder
+        self.path = path
+        self.min_speed = min_speed or float(os.getenv('ENCODE_MIN_SPEED', '2.0'))
+        self.max_mb_per_min = max_mb_per_min or float(os.getenv('VIDEO_MAX_MB_PER_MIN', '20'))
+        self.lock = threading.Lock()
+        self.profiles = {}
+
+    def fingerprint(self):
+        """بصمة الجهاز: نوع المعالج وعدد الأنوية المتاحة ونسخة ffmpeg"""
+        model = platform.processor() or platform.machine()
+        try:
+            with open('/proc/cpuinfo') as f:
+                for line in f:
+                    if line.startswith('model name'):
+                        model = line.split(':', 1)[1].strip()
+                        break
+        except OSError:
+            pass
+        return f"{model} x{self.cpus()} {platform.machine()} {os.path.basename(self.encoder.binary())}"
+
+    @staticmethod
+    def cpus():
+        """الأنوية المتاحة فعلاً لهذه العملية (قد تكون أقل من os.cpu_count في الحاويات)"""
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    def key(self, name, size, fps, scene_s):
+        raw = json.dumps([self.VERSION, self.fingerprint(), name, list(size), fps, scene_s,
+                          self.min_speed, self.max_mb_per_min])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def profile(self, name, size, fps, scene_s, sample):
+        """إعدادات الصيغة name؛ sample() ترسم شريحة نموذجية ولا تُستدعى إلا عند المعايرة"""
+        with self.lock:
+            if name in self.profiles:
+                return dict(self.profiles[name])
+            key = self.key(name, size, fps, scene_s)
+            saved = self.load()
+            record = saved.get(key)
+            if record is None:
+                record = self.calibrate(name, size, fps, scene_s, sample())
+                saved = self.load()
+                saved[key] = record
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(saved, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            self.profiles[name] = record["profile"]
+            return dict(record["profile"])
+
+    def calibrate(self, name, size, fps, scene_s, sample):
+        start = time.perf_counter()
+        host, cpus = self.fingerprint(), self.cpus()
+        frames = self.CALIBRATION_S * fps
+        scene_frames = int(round(scene_s * fps))
+
+        with tempfile.TemporaryDirectory(prefix="calibrate_", dir=self.encoder.temp_dir) as work_dir:
+            still = self.encoder.write_still(sample, size, os.path.join(work_dir, "sample.bmp"))
+
+            def cost(preset, crf, threads):
+                """(ثوانٍ لكل ثانية فيديو، بايت لكل ثانية فيديو) لمشاهد بطول scene_s وإطار IDR واحد لكل منها"""
+                profile = {"preset": preset, "crf": crf, "gop": scene_frames, "threads": threads}
+                one = self.measure(still, size, fps, 1, profile, work_dir)
+                many = self.measure(still, size, fps, frames, profile, work_dir)
+                per_frame_s = max(many[0] - one[0], 0) / (frames - 1)
+                per_frame_bytes = max(many[1] - one[1], 0) / (frames - 1)
+                seconds = (one[0] + per_frame_s * (scene_frames - 1)) / scene_s
+                size_bytes = (one[1] + per_frame_bytes * (scene_frames - 1)) / scene_s
+                return seconds, size_bytes
+
+            # الأسرع أولاً؛ أول preset أبطأ من الميزانية ينهي البحث
+            candidates = []
+            for preset in self.PRESETS:
+                seconds, size_bytes = cost(preset, self.BASE_CRF, cpus)
+                if candidates and 1 / seconds < self.min_speed:
+                    break
+                candidates.append((preset, seconds, size_bytes))
+            # أصغر ملف، والأسرع عند التقارب (ضمن 2%)
+            smallest = min(size_bytes for _, _, size_bytes in candidates)
+            preset, seconds, size_bytes = min(
+                (c for c in candidates if c[2] <= smallest * 1.02), key=lambda c: c[1])
+
+            crf = self.BASE_CRF
+            while size_bytes * 60 / 1e6 > self.max_mb_per_min and crf < self.MAX_CRF:
+                crf += 2
+                seconds, size_bytes = cost(preset, crf, cpus)
+
+            # أقل عدد خيوط ضمن 10% من الأسرع يترك أنوية لرسم الشرائح
+            timings = {cpus: seconds}
+            count = 1
+            while count < cpus:
+                timings[count] = cost(preset, crf, count)[0]
+                count *= 2
+            best = min(timings.values())
+            threads = min(count for count, value in timings.items() if value <= best * 1.1)
+            seconds = timings[threads]
+
+        profile = {"preset": preset, "crf": crf, "gop": scene_frames, "threads": threads}
+        tried = ", ".join(f"{p} {1 / s:.1f}x {b * 60 / 1e6:.2f}MB/min" for p, s, b in candidates)
+        logger.info(f"⚙️ Encoder profile for {name} on {host}: {preset}, crf {crf}, gop {scene_frames}, "
+                    f"{threads} threads -> {1 / seconds:.1f}x realtime, {size_bytes * 60 / 1e6:.2f} MB/min "
+                    f"(target >= {self.min_speed}x, <= {self.max_mb_per_min} MB/min; tried {tried}) "
+                    f"calibrated in {time.perf_counter() - start:.1f}s")
+        return {
+            "profile": profile,
+            "host": host,
+            "speed": round(1 / seconds, 2),
+            "mb_per_min": round(size_bytes * 60 / 1e6, 3),
+            "calibrated": datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def measure(self, still, size, fps, frames, profile, work_dir):
+        """ترميز frames إطاراً من الشريحة كما في encode_segment؛ تُرجع (الثواني، البايتات)"""
+        output_path = os.path.join(work_dir, f"calibration_{frames}.mp4")
+        start = time.perf_counter()
+        self.encoder.encode_segment(still, frames / fps, size, output_path, fps=fps, profile=profile)
+        return time.perf_counter() - start, os.path.getsize(output_path)
+
+class ArtifactStore:
+    """مخزن ملفات دائم بمفتاح SHA-256 في مجلدات مقسّمة: objects/ab/ab12….ext
+
+    المقاطع المرمّزة والتعليق الصوتي والفيديوهات النهائية وشرائح التصحيح كلها تحت حد واحد
+    max_disk_bytes (ARTIFACT_CACHE_MB). الكتابة ذرية عبر ملف مؤقت في نفس المجلد ثم os.replace،
+    وكل get أو put يحدّث وقت التعديل ويسجل الملف في مراجع التشغيل الحالي (ترتيب التصدير).
+    collect يحذف الأقدم استخداماً أولاً مهما كان عمره، إلا الملفات المثبتة صراحة (pin=True حتى
+    release) وملفات عمليات أخرى أحدث من min_age. export و restore ينقلان المخزن بين تشغيلات CI
+    كأرشيف tar واحد فيه manifest.json بالمفاتيح وبصمة كل ملف.
+    """
+
+    VERSION = 1
+    KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+    EXT_PATTERN = re.compile(r"\.[a-z0-9]+")
+    # عدد ملفات مراجع التشغيلات (runs/) المحفوظة لترتيب التصدير
+    RUN_HISTORY = 7
+    # ثوانٍ قبل محاولة collect أخرى من adopt بعد مسح لم ينزل بالحجم تحت الحد
+    COLLECT_INTERVAL = 60
+    # collect من adopt ينزل إلى هذه النسبة من الحد، فلا يمسح المخزن مع كل ملف جديد بعده
+    COLLECT_TARGET = 0.9
+
+    def __init__(self, root="cache/artifacts", max_disk_bytes=None, min_age=3600):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.runs_dir = os.path.join(root, "runs")
+        if max_disk_bytes is None:
+            max_disk_bytes = int(float(os.getenv('ARTIFACT_CACHE_MB', '1536')) * 1024 * 1024)
+        self.max_disk_bytes = max_disk_bytes
+        # ملفات .tmp اليتيمة، وملفات لم تكتبها أو تقرأها هذه العملية (عمليات الرسم العاملة)، تبقى min_age ثانية
+        self.min_age = min_age
+        self.lock = threading.Lock()
+        self.run_id = None
+        self.refs = {}
+        # كل ما كتبته أو قرأته أو استرجعته هذه العملية؛ الباقي قد يكون قيد الاستخدام في عملية أخرى
+        self.known = set()
+        # مسار -> عدد المستخدمين الحاليين؛ لا يُحذف حتى release
+        self.pins = {}
+        # الحجم الكلي على القرص: مسح واحد في أول collect ثم يُحدّث مع كل adopt وحذف
+        self.usage = None
+        self.next_collect = 0.0
+        self.evicted = 0
+        self.scans = 0
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        raw = json.dumps(parts, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def digest_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key, ext):
+        return os.path.join(self.objects_dir, key[:2], f"{key}{ext}")
+
+    def tmp_path(self, key, ext):
+        """مسار مؤقت فريد بجانب المسار النهائي، فيكون os.replace ذرياً (نفس نظام الملفات)"""
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp{ext}"
+
+    def get(self, key, ext, pin=False):
+        """مسار الملف إن وُجد (مع تحديث وقت استخدامه وتسجيله في مراجع التشغيل)، وإلا None
+
+        pin=True يثبته حتى release(path)، لمن سيقرؤه لاحقاً.
+        """
+        path = self.path(key, ext)
+        with self.lock:
+            # تحت القفل حتى لا يحذفه collect بين التحقق والتثبيت
+            try:
+                os.utime(path)
+            except OSError:
+                return None
+            self.remember(path, key, ext, pin)
+        return path
+
+    def put(self, key, ext, produce, pin=False):
+        """إنتاج ملف عبر produce(path) وحفظه بشكل ذري؛ تُرجع مساره في المخزن"""
+        tmp_path = self.tmp_path(key, ext)
+        try:
+            produce(tmp_path)
+            return self.adopt(key, ext, tmp_path, pin=pin)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, key, ext, source, pin=False):
+        """نقل ملف مكتمل من tmp_path إلى مكانه في المخزن بشكل ذري"""
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(source)
+        with self.lock:
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(source, path)
+            # مثبت خلال collect أدناه حتى لا يُحذف الملف الجديد نفسه
+            self.remember(path, key, ext, True)
+            if self.usage is not None:
+                self.usage += size - replaced
+            over = self.usage is None or (self.usage > self.max_disk_bytes and time.monotonic() >= self.next_collect)
+        try:
+            if over:
+                self.collect(int(self.max_disk_bytes * self.COLLECT_TARGET))
+        finally:
+            if not pin:
+                self.release([path])
+        return path
+
+    def remember(self, path, key, ext, pin):
+        self.refs[path] = (key, ext)
+        self.known.add(path)
+        if pin:
+            self.pins[path] = self.pins.get(path, 0) + 1
+
+    def pin(self, path):
+        """تثبيت ملف يحمله المستدعي مسبقاً؛ False إذا لم يعد موجوداً (حُذف منذ حصل عليه)"""
+        with self.lock:
+            if not os.path.exists(path):
+                return False
+            self.known.add(path)
+            self.pins[path] = self.pins.get(path, 0) + 1
+        return True
+
+    def release(self, paths):
+        """إنهاء تثبيت pin=True أو pin() لكل مسار؛ الملف يعود لترتيب LRU العادي"""
+        with self.lock:
+            for path in paths:
+                count = self.pins.get(path, 0) - 1
+                if count > 0:
+                    self.pins[path] = count
+                else:
+                    self.pins.pop(path, None)
+
+    def entries(self):
+        """[(وقت الاستخدام، الحجم، المسار)] لكل ملفات المخزن؛ يحذف الملفات المؤقتة اليتيمة"""
+        entries = []
+        now = time.time()
+        own_tmp = f".{os.getpid()}."
+        self.scans += 1
+        for shard in os.scandir(self.objects_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if '.tmp' in entry.name:
+                    # بقايا كتابة انقطعت؛ كتابات هذه العملية تحذفها put نفسها، وكتابات غيرها أحدث من min_age
+                    if own_tmp not in entry.name and now - stat.st_mtime > self.min_age:
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def collect(self, max_bytes=None):
+        """حذف الأقدم استخداماً حتى يصبح الحجم ≤ max_bytes؛ تُرجع (عدد المحذوف، البايتات المحررة)
+
+        لا يُحذف إلا ما ليس مثبتاً، وملفات العمليات الأخرى بعد min_age فقط. إذا بقي الحجم فوق
+        الحد لا يعيد adopt المسح قبل COLLECT_INTERVAL ثانية.
+        """
+        max_bytes = self.max_disk_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        removed = freed = 0
+        for mtime, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            with self.lock:
+                if path in self.pins or (path not in self.known and now - mtime < self.min_age):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self.known.discard(path)
+            total -= size
+            removed += 1
+            freed += size
+        with self.lock:
+            self.usage = total
+            self.evicted += removed
+            self.next_collect = time.monotonic() + self.COLLECT_INTERVAL if total > self.max_disk_bytes else 0.0
+        return removed, freed
+
+    def begin_run(self, run_id):
+        with self.lock:
+            self.run_id = run_id
+            self.refs = {}
+
+    def end_run(self):
+        """حفظ مراجع التشغيل في runs/<run_id>.json (تُصدَّر أولاً) ثم تطبيق الحد
+
+        التثبيتات التي لم تُحرر (خطة لم تُرسم مثلاً) تنتهي مع التشغيل.
+        """
+        with self.lock:
+            run_id, refs = self.run_id, sorted(self.refs.values())
+            self.pins = {}
+        if run_id is not None:
+            os.makedirs(self.runs_dir, exist_ok=True)
+            path = os.path.join(self.runs_dir, f"{run_id}.json")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"run_id": run_id, "finished_at": time.time(), "objects": refs}, f)
+            os.replace(tmp_path, path)
+            for old in self.run_files()[self.RUN_HISTORY:]:
+                os.remove(old)
+        return self.collect()
+
+    def run_files(self):
+        """ملفات مراجع التشغيلات، الأحدث أولاً"""
+        if not os.path.isdir(self.runs_dir):
+            return []
+        paths = [os.path.join(self.runs_dir, name) for name in os.listdir(self.runs_dir) if name.endswith('.json')]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def export(self, path, max_bytes=None):
+        """كتابة أرشيف tar للاسترجاع بـ restore: ملفات آخر التشغيلات أولاً ثم الأحدث استخداماً
+
+        حتى max_bytes (افتراضياً حد المخزن)؛ الكتابة ذرية. تُرجع (عدد الملفات، البايتات).
+        """
+        max_bytes = self.max_disk_bytes if max_bytes is None else max_bytes
+        stats = {entry_path: (mtime, size) for mtime, size, entry_path in self.entries()}
+        order = []
+        runs = []
+        for run_path in self.run_files():
+            try:
+                with open(run_path, 'r') as f:
+                    run = json.load(f)
+            except (OSError, ValueError):
+                continue
+            runs.append(run)
+            order += [self.path(key, ext) for key, ext in run["objects"]]
+        order += [entry_path for entry_path in sorted(stats, key=lambda p: -stats[p][0])]
+
+        objects = []
+        chosen = set()
+        total = 0
+        for entry_path in order:
+            if entry_path in chosen or entry_path not in stats:
+                continue
+            mtime, size = stats[entry_path]
+            if total + size > max_bytes:
+                continue
+            name = os.path.basename(entry_path)
+            key, ext = name[:64], name[64:]
+            try:
+                digest = self.digest_file(entry_path)
+            except OSError:
+                continue
+            chosen.add(entry_path)
+            total += size
+            objects.append({"key": key, "ext": ext, "size": size, "mtime": mtime, "sha256": digest})
+
+        manifest = json.dumps({"version": self.VERSION, "created_at": time.time(), "runs": runs,
+                               "objects": objects}).encode('utf-8')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with tarfile.open(tmp_path, 'w') as tar:
+                info = tarfile.TarInfo("manifest.json")
+                info.size = len(manifest)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(manifest))
+                for entry in objects:
+                    tar.add(self.path(entry["key"], entry["ext"]),
+                            arcname=f"objects/{entry['key'][:2]}/{entry['key']}{entry['ext']}")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return len(objects), total
+
+    def restore(self, path):
+        """استرجاع ملفات أرشيف export الناقصة هنا بعد التحقق من بصمتها؛ تُرجع عدد المسترجع"""
+        restored = corrupt = 0
+        try:
+            with tarfile.open(path, 'r') as tar:
+                manifest = json.load(tar.extractfile("manifest.json"))
+                if manifest.get("version") != self.VERSION:
+                    logger.warning(f"⚠️ Ignoring artifact export {path} (version {manifest.get('version')})")
+                    return 0
+                for entry in manifest["objects"]:
+                    key, ext = entry["key"], entry["ext"]
+                    # المفاتيح تصبح مسارات: لا يُقبل إلا hex و امتداد بسيط
+                    if not self.KEY_PATTERN.fullmatch(key) or not self.EXT_PATTERN.fullmatch(ext):
+                        corrupt += 1
+                        continue
+                    target = self.path(key, ext)
+                    if os.path.exists(target):
+                        continue
+                    try:
+                        source = tar.extractfile(f"objects/{key[:2]}/{key}{ext}")
+                    except KeyError:
+                        corrupt += 1
+                        continue
+                    tmp_path = self.tmp_path(key, ext)
+                    try:
+                        digest = hashlib.sha256()
+                        with open(tmp_path, 'wb') as f:
+                            for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                                digest.update(chunk)
+                                f.write(chunk)
+                        if digest.hexdigest() != entry["sha256"]:
+                            corrupt += 1
+                            continue
+                        os.replace(tmp_path, target)
+                        # وقت الاستخدام الأصلي حتى يبقى ترتيب LRU كما كان
+                        os.utime(target, (entry["mtime"], entry["mtime"]))
+                        with self.lock:
+                            self.known.add(target)
+                        restored += 1
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                
+                os.makedirs(self.runs_dir, exist_ok=True)
+                for run in manifest.get("runs", []):
+                    name = re.sub(r'[^\w.-]+', '_', str(run["run_id"]))
+                    run_path = os.path.join(self.runs_dir, f"{name}.json")
+                    if not os.path.exists(run_path):
+                        with open(run_path, 'w') as f:
+                            json.dump(run, f)
+                        os.utime(run_path, (run["finished_at"], run["finished_at"]))
+        except (OSError, KeyError, ValueError, tarfile.TarError) as e:
+            logger.warning(f"⚠️ Could not restore artifact export {path}: {e}")
+        with self.lock:
+            self.usage = None
+        if corrupt:
+            logger.warning(f"⚠️ Skipped {corrupt} corrupt entries in {path}")
+        return restored
+
+    def import_directory(self, directory, ext):
+        """نقل ذاكرة قديمة مسطحة (<key><ext> في مجلد واحد) إلى المخزن مرة واحدة ثم حذف المجلد"""
+        if not os.path.isdir(directory):
+            return 0
+        moved = 0
+        for name in os.listdir(directory):
+            full = os.path.join(directory, name)
+            key = name[:-len(ext)] if name.endswith(ext) else ""
+            try:
+                if self.KEY_PATTERN.fullmatch(key):
+                    target = self.path(key, ext)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(full, target)
+                    moved += 1
+                else:
+                    # بقايا .tmp من الإصدار القديم
+                    os.remove(full)
+            except OSError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+        with self.lock:
+            self.usage = None
+        if moved:
+            logger.info(f"📦 Moved {moved} cached files from {directory} into {self.root}")
+        return moved
+
+    def stats(self):
+        with self.lock:
+            return {"run_objects": len(self.refs), "pinned": len(self.pins),
+                    "disk_mb": round(self.usage / 1e6) if self.usage is not None else None,
+                    "evicted": self.evicted, "scans": self.scans}
+
+class SegmentCache:
+    """مقاطع المشاهد المرمّزة في ArtifactStore
+
+    المفتاح يشمل نص المشهد وتخطيط الشريحة والمدة وإعدادات الترميز، فأي تغيير في أحدها
+    يعطي مقطعاً جديداً. المقدمة والخاتمة الثابتتان تُستخدمان من يوم لآخر.
+    """
+
+    VERSION = 1
+    EXT = ".mp4"
+
+    def __init__(self, store=None, legacy_dir=None):
+        self.store = store if store is not None else ArtifactStore()
+        self.hits = 0
+        self.misses = 0
+        if legacy_dir:
+            self.store.import_directory(legacy_dir, self.EXT)
+
+    def key(self, spec, size, encoder_settings, layout_version):
+        raw = json.dumps([
+            self.VERSION, layout_version, spec["builder"], spec["slide_type"], spec["text"],
+            round(spec["duration"], 3), list(size), encoder_settings, "libx264", "yuv420p",
+        ], sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return self.store.path(key, self.EXT)
+
+    def contains(self, key):
+        """وجود المقطع بدون احتسابه إصابة؛ يُسجل في مراجع التشغيل ويُحدّث وقت استخدامه"""
+        return self.store.get(key, self.EXT) is not None
+
+    def get(self, key, pin=False):
+        path = self.store.get(key, self.EXT, pin=pin)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key, encode, pin=False):
+        """ترميز مقطع عبر encode(path) وحفظه بشكل ذري؛ تُرجع مساره في المخزن"""
+        return self.store.put(key, self.EXT, encode, pin=pin)
+
+    def release(self, paths):
+        self.store.release(paths)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+class MusicLibrary:
+    """موسيقى الخلفية مفكوكة مسبقاً إلى PCM خام (s16le) تُقرأ عبر memmap
+
+    كل ملف يُفك ويُعاد تشكيله إلى 44.1kHz ستيريو ويُطبّع صوته إلى TARGET_LUFS مرة واحدة
+    عند ظهوره أو تغيّر محتواه، والفهرس index.json يحفظ مدة كل مسار ومكان ملفه. وقت الرسم
+    يقرأ ffmpeg الملف الخام مباشرة بدون فك ترميز، والتكرار شرائح على المصفوفة بدون نسخ.
+    """
+
+    VERSION = 1
+    SAMPLE_RATE = 44100
+    CHANNELS = 2
+    TARGET_LUFS = -14.0
+    PEAK_LIMIT = 10 ** (-1.0 / 20)
+    EXTENSIONS = ('.mp3', '.wav', '.ogg', '.m4a', '.aac', '.flac')
+    LOUDNESS = re.compile(r'I:\s+(-?[\d.]+|-inf) LUFS')
+
+    def __init__(self, encoder, sources=("assets/background_music.mp3", "assets/music"), cache_dir="cache/music"):
+        self.encoder = encoder
+        self.sources = sources
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+        self.mapped = {}
+        self.decoded = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index = self.load_index()
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get("version") == self.VERSION:
+                return index["tracks"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def save_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": self.VERSION, "tracks": self.index}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def source_files(self):
+        files = []
+        for source in self.sources:
+            if os.path.isdir(source):
+                files += sorted(os.path.join(source, name) for name in os.listdir(source)
+                                if name.lower().endswith(self.EXTENSIONS))
+            elif os.path.exists(source):
+                files.append(source)
+        return files
+
+    def pick(self, seed=None):
+        """اختيار ملف موسيقى (ثابت لنفس seed)؛ None إذا لم توجد موسيقى"""
+        files = self.source_files()
+        if not files:
+            return None
+        if seed is None:
+            return random.choice(files)
+        return files[int(hashlib.sha1(str(seed).encode('utf-8')).hexdigest()[:8], 16) % len(files)]
+
+    def refresh(self):
+        """المعالجة المسبقة: فك كل ملف جديد أو متغير وحذف ما لم يعد له مصدر"""
+        tracks = [track for track in map(self.track, self.source_files()) if track is not None]
+        with self.lock:
+            sources = set(self.source_files())
+            removed = [source for source in self.index if source not in sources]
+            for source in removed:
+                del self.index[source]
+            if removed:
+                self.save_index()
+            keep = {os.path.basename(track["path"]) for track in self.index.values()}
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.s16le') and name not in keep:
+                    os.remove(os.path.join(self.cache_dir, name))
+        return tracks
+
+    def track(self, source):
+        """مدخل الفهرس لملف موسيقى، مع فكه أولاً إذا لم يُعالج بعد؛ None إذا فشل الفك"""
+        with self.lock:
+            try:
+                stat = os.stat(source)
+            except OSError:
+                return None
+            entry = self.index.get(source)
+            if (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                    and os.path.exists(entry["path"])):
+                return entry
+
+            # git checkout يغير وقت التعديل فقط؛ المحتوى نفسه لا يُفك من جديد
+            with open(source, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            path = os.path.join(self.cache_dir, f"{self.key(digest)}.s16le")
+            if entry and entry["sha256"] == digest and os.path.exists(path):
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            else:
+                try:
+                    entry = self.decode(source, path)
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not decode background music {source}: {e}")
+                    return None
+                entry.update(source=source, sha256=digest, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self.index[source] = entry
+            self.save_index()
+            return entry
+
+    def key(self, digest):
+        raw = json.dumps([self.VERSION, digest, self.SAMPLE_RATE, self.CHANNELS, self.TARGET_LUFS])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def decode(self, source, path):
+        """فك إلى float32 مع قياس الشدة (EBU R128) في نفس التمريرة، ثم كتابة s16le مطبّع"""
+        start = time.perf_counter()
+        float_path = f"{path}.{os.getpid()}.f32.tmp"
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            cmd = [
+                self.encoder.binary(), '-y', '-nostdin', '-hide_banner', '-i', source, '-vn',
+                '-af', 'ebur128=framelog=quiet', '-ac', str(self.CHANNELS), '-ar', str(self.SAMPLE_RATE),
+                '-f', 'f32le', float_path,
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg exited with {result.returncode}: {result.stderr.strip()[-500:]}")
+            match = self.LOUDNESS.findall(result.stderr)
+            loudness = float(match[-1]) if match else float('-inf')
+
+            samples = np.memmap(float_path, dtype='<f4', mode='r').reshape(-1, self.CHANNELS)
+            if len(samples) == 0:
+                raise ValueError("no audio samples")
+            chunk = self.SAMPLE_RATE * 10
+            peak = max(float(np.abs(samples[i:i + chunk]).max()) for i in range(0, len(samples), chunk))
+            gain = 10 ** ((self.TARGET_LUFS - loudness) / 20) if np.isfinite(loudness) else 1.0
+            if peak > 0:
+                gain = min(gain, self.PEAK_LIMIT / peak)
+
+            with open(tmp_path, 'wb') as f:
+                for i in range(0, len(samples), chunk):
+                    scaled = np.clip(samples[i:i + chunk] * (gain * 32767), -32768, 32767)
+                    f.write(np.rint(scaled).astype('<i2').tobytes())
+            frames = len(samples)
+            del samples
+            os.replace(tmp_path, path)
+        finally:
+            for leftover in (float_path, tmp_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        self.decoded += 1
+        gain_db = 20 * np.log10(gain)
+        logger.info(f"🎵 Pre-decoded {source}: {frames / self.SAMPLE_RATE:.1f}s, {loudness:.1f} LUFS, "
+                    f"gain {gain_db:+.1f} dB in {time.perf_counter() - start:.2f}s")
+        return {
+            "path": path,
+            "sample_rate": self.SAMPLE_RATE,
+            "channels": self.CHANNELS,
+            "frames": frames,
+            "duration": frames / self.SAMPLE_RATE,
+            "loudness": loudness if np.isfinite(loudness) else None,
+            "gain_db": round(float(gain_db), 2),
+        }
+
+    def samples(self, track):
+        """مصفوفة (إطارات، قنوات) int16 معيّنة من الملف الخام؛ تُفتح مرة لكل ملف"""
+        samples = self.mapped.get(track["path"])
+        if samples is None:
+            samples = np.memmap(track["path"], dtype='<i2', mode='r', shape=(track["frames"], track["channels"]))
+            self.mapped[track["path"]] = samples
+        return samples
+
+    def segments(self, track, start, count):
+        """العينات [start, start + count) من المسار مكرراً، كعروض على الملف بدون نسخ"""
+        samples = self.samples(track)
+        start %= len(samples)
+        views = []
+        while count > 0:
+            view = samples[start:start + count]
+            views.append(view)
+            count -= len(view)
+            start = 0
+        return views
+
+    def audio_clip(self, track, duration, volume=1.0):
+        """مقطع moviepy يكرر المسار حتى duration؛ النسخة الوحيدة هي كتلة العينات المطلوبة بعد الكسب"""
+        rate, scale = track["sample_rate"], volume / 32768
+
+        def make_frame(t):
+            if np.ndim(t) == 0:
+                return self.segments(track, int(round(t * rate)), 1)[0][0] * scale
+            out = np.empty((len(t), track["channels"]))
+            position = 0
+            for view in self.segments(track, int(round(t[0] * rate)), len(t)):
+                np.multiply(view, scale, out=out[position:position + len(view)])
+                position += len(view)
+            return out
+
+        return moviepy_editor.AudioClip(make_frame, duration=duration, fps=rate)
+
+    @staticmethod
+    def ffmpeg_input(track):
+        """مدخل ffmpeg للملف الخام مكرراً بلا نهاية (لا يحتاج فك ترميز)"""
+        return ['-f', 's16le', '-ar', str(track["sample_rate"]), '-ac', str(track["channels"]),
+                '-stream_loop', '-1', '-i', track["path"]]
+
+    def stats(self):
+        return {"tracks": len(self.index), "decoded": self.decoded}
+
+class NarrationCache:
+    """مقاطع التعليق الصوتي (WAV) في ArtifactStore بمفتاح من نص المشهد وإعدادات الصوت
+
+    الجمل المتكررة (المشاهد العامة، المقدمة، الخاتمة) تُركّب مرة واحدة فقط عبر كل التشغيلات.
+    """
+
+    VERSION = 1
+    EXT = ".wav"
+
+    def __init__(self, store=None, legacy_dir=None):
+        self.store = store if store is not None else ArtifactStore()
+        self.hits = 0
+        self.misses = 0
+        if legacy_dir:
+            self.store.import_directory(legacy_dir, self.EXT)
+
+    def key(self, text, settings):
+        raw = json.dumps([self.VERSION, settings, text], sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return self.store.path(key, self.EXT)
+
+    def tmp_path(self, key):
+        return self.store.tmp_path(key, self.EXT)
+
+    def get(self, key):
+        path = self.store.get(key, self.EXT)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key, tmp_path):
+        """نقل مقطع مكتمل من tmp_path إلى المخزن بشكل ذري"""
+        return self.store.adopt(key, self.EXT, tmp_path)
+
+    def pin(self, path):
+        return self.store.pin(path)
+
+    def release(self, paths):
+        self.store.release(paths)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+class OfflineTTSBackend:
+    """بديل محلي بدون شبكة للاختبار والقياس: نغمة قصيرة لكل كلمة بسرعة كلام ثابتة
+
+    latency تحاكي زمن استجابة خدمة حقيقية لكل طلب.
+    """
+
+    name = "offline"
+
+    def __init__(self, words_per_minute=165, sample_rate=24000, latency=0.0):
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+        self.latency = latency
+
+    def settings(self):
+        return {"backend": self.name, "wpm": self.words_per_minute, "rate": self.sample_rate}
+
+    async def synthesize(self, text, path):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        await asyncio.to_thread(self.write, text, path)
+
+    def write(self, text, path):
+        word_samples = int(self.sample_rate * 60 / self.words_per_minute)
+        t = np.arange(word_samples) / self.sample_rate
+        envelope = np.sin(np.pi * np.arange(word_samples) / word_samples) ** 2
+        words = []
+        for word in text.split():
+            # نغمة ثابتة لكل كلمة حتى يكون الناتج حتمياً
+            pitch = 110 + int(hashlib.md5(word.encode('utf-8')).hexdigest()[:4], 16) % 140
+            words.append(envelope * np.sin(2 * np.pi * pitch * t))
+        pcm = (np.concatenate(words or [np.zeros(word_samples)]) * 0.5 * 32767).astype('<i2')
+        with wave.open(path, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(self.sample_rate)
+            out.writeframes(pcm.tobytes())
+
+class EdgeTTSBackend:
+    """أصوات Microsoft Edge عبر edge-tts (يحتاج شبكة)؛ الناتج MP3 يُحوّل إلى WAV أحادي"""
+
+    name = "edge"
+
+    def __init__(self, encoder, voice=None, rate=None):
+        self.encoder = encoder
+        self.voice = voice or os.getenv('NARRATION_VOICE', 'en-US-GuyNeural')
+        self.rate = rate or os.getenv('NARRATION_RATE', '+0%')
+
+    def settings(self):
+        return {"backend": self.name, "voice": self.voice, "rate": self.rate}
+
+    async def synthesize(self, text, path):
+        mp3_path = f"{path}.mp3"
+        try:
+            await edge_tts.Communicate(text, self.voice, rate=self.rate).save(mp3_path)
+            await asyncio.to_thread(self.encoder.run, [
+                self.encoder.binary(), '-y', '-loglevel', 'error', '-i', mp3_path,
+                '-ac', '1', '-ar', '24000', '-c:a', 'pcm_s16le', path,
+            ])
+        finally:
+            if os.path.exists(mp3_path):
+                os.remove(mp3_path)
+
+class Narrator:
+    """تعليق صوتي لمشاهد الخطة عبر واجهة TTS قابلة للاستبدال
+
+    backend أي كائن فيه name و settings() و synthesize(text, path) يكتب WAV. المشاهد تُركّب
+    بالتوازي تحت حد NARRATION_CONCURRENCY، والمقاطع تُخزّن حسب المحتوى في NarrationCache،
+    والمدة تُقرأ من ترويسة WAV فتُستخدم مباشرة في توقيت المشاهد.
+    """
+
+    def __init__(self, backend, cache=None, max_concurrency=None):
+        self.backend = backend
+        self.cache = cache or NarrationCache()
+        self.max_concurrency = max_concurrency or int(os.getenv('NARRATION_CONCURRENCY', '4'))
+        self.loop = None
+        self.clips = {}
+        self.synthesized = 0
+        self.failures = 0
+
+    @staticmethod
+    def speech_text(text):
+        """النص المنطوق: بدون الرموز التعبيرية والرموز التي قد تُقرأ بأسمائها"""
+        return " ".join(re.sub(r"[^\w\s.,!?;:'\"()%&/-]", " ", text).split())
+
+    @staticmethod
+    def duration(path):
+        with wave.open(path, 'rb') as clip:
+            return clip.getnframes() / clip.getframerate()
+
+    async def clip(self, text):
+        """مقطع تعليق لنص مشهد: {"path", "duration"}، أو None إذا لم يكن فيه كلام أو فشل التركيب"""
+        speech = self.speech_text(text)
+        if not speech:
+            return None
+        key = self.cache.key(speech, self.backend.settings())
+        # كل مستدعٍ يثبّت المقطع في المخزن حتى يُرمّز الفيديو (render_video يحرره)
+        clip = self.clips.get(key)
+        if clip is not None and self.cache.pin(clip["path"]):
+            return clip
+        self.bind_loop()
+        # نفس الجملة في مشهدين أو مرحلتين تنتظر نفس التركيب
+        task = self.pending.get(key)
+        if task is None or task.cancelled():
+            task = self.pending[key] = asyncio.ensure_future(self.load_or_synthesize(key, speech))
+        clip = await task
+        self.pending.pop(key, None)
+        if clip is None or not self.cache.pin(clip["path"]):
+            self.clips.pop(key, None)
+            return None
+        self.clips[key] = clip
+        return clip
+
+    def bind_loop(self):
+        """الحد والمهام المعلقة تخص حلقة الأحداث الحالية؛ كل asyncio.run جديد يبدأ بها من جديد"""
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.semaphore = asyncio.BoundedSemaphore(self.max_concurrency)
+            self.pending = {}
+
+    async def load_or_synthesize(self, key, speech):
+        path = self.cache.get(key)
+        if path is None:
+            tmp_path = self.cache.tmp_path(key)
+            try:
+                async with self.semaphore:
+                    await self.backend.synthesize(speech, tmp_path)
+                path = self.cache.put(key, tmp_path)
+                self.synthesized += 1
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"⚠️ Narration failed for '{speech[:40]}': {e}")
+                return None
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return {"path": path, "duration": self.duration(path)}
+
+    def release(self, paths):
+        """إنهاء تثبيت مقاطع أرجعتها clip أو narrate (مرة لكل مقطع أُرجع)"""
+        self.cache.release(paths)
+
+    async def narrate(self, texts):
+        """تركيب كل النصوص بالتوازي؛ تُرجع {النص: المقطع أو None}، وكل مقطع مثبت مرة واحدة"""
+        texts = list(dict.fromkeys(texts))
+        clips = await asyncio.gather(*(self.clip(text) for text in texts))
+        return dict(zip(texts, clips))
+
+    def stats(self):
+        return {"synthesized": self.synthesized, "failures": self.failures, **self.cache.stats()}
+
+class ScenePlan:
+    """خطة فيديو موقوتة تُبنى قبل رسم أي شريحة
+
+    كل مشهد قاموس فيه builder و text و slide_type و duration و fallback و narration (مسار
+    مقطع التعليق أو None)، والمدة الكلية معروفة مسبقاً بدقة الإطار، فلا حاجة لفتح الفيديو
+    بعد الترميز لقياسه.
+    """
+
+    def __init__(self, size, fps, profile, music_path=None):
+        self.size = size
+        self.fps = fps
+        # إعدادات x264 من EncoderTuner: preset و crf و gop و threads
+        self.profile = profile
+        self.music_path = music_path
+        self.scenes = []
+        # المشاهد التي فشل رسمها في آخر ترميز (استُبدلت بلون أو حُذفت)
+        self.failed = 0
+        # مقاطع التعليق التي ثبّتها narrated_plan لهذه الخطة، مرة لكل نص؛ render_video يحررها
+        self.narration_pins = []
+
+    def add(self, builder, text, duration, slide_type="main", fallback=True):
+        """إضافة مشهد؛ fallback يعني استبداله بلون ثابت إذا فشل رسم الشريحة"""
+        scene = {
+            "builder": builder,
+            "text": text,
+            "slide_type": slide_type,
+            "duration": duration,
+            "fallback": fallback,
+            "narration": None,
+        }
+        self.scenes.append(scene)
+        return scene
+
+    def frame_count(self, scene):
+        return max(int(round(scene["duration"] * self.fps)), 1)
+
+    def encoder_settings(self):
+        """ما يغير بتات المقاطع المرمّزة (لمفتاح SegmentCache)؛ threads لا يدخل فيه"""
+        return {"fps": self.fps, "preset": self.profile["preset"], "crf": self.profile["crf"],
+                "gop": self.profile["gop"]}
+
+    def attach_narration(self, narration):
+        """ربط مقاطع التعليق {النص: المقطع} بمشاهدها"""
+        for scene in self.scenes:
+            clip = narration.get(scene["text"]) if narration else None
+            scene["narration"] = clip["path"] if clip else None
+
+    @property
+    def duration(self):
+        return sum(self.frame_count(scene) for scene in self.scenes) / self.fps
+
+    def __len__(self):
+        return len(self.scenes)
+
+    def __iter__(self):
+        return iter(self.scenes)
+
+class ScriptSegmenter:
+    """تقسيم تدريجي لسكربت يصل على دفعات إلى جمل مشاهد
+
+    الجزء المقروء يُقطع فقط بعد فاصل جملة ([.!?] ثم مسافات) أو فاصل فقرة يليه حرف غير فارغ،
+    فيكون ناتج split لكل الأجزاء مطابقاً لناتجه على النص الكامل.
+    """
+
+    GAP = re.compile(r'\s+(?=\S)')
+
+    def __init__(self, split):
+        self.split = split
+        self.buffer = ""
+
+    def feed(self, chunk):
+        """إضافة دفعة نص وإرجاع الجمل التي اكتملت بها"""
+        self.buffer += chunk
+        cut = 0
+        for match in self.GAP.finditer(self.buffer):
+            start = match.start()
+            if match.group().count('\n') >= 2 or (start > 0 and self.buffer[start - 1] in '.!?'):
+                cut = match.end()
+        if not cut:
+            return []
+        ready, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return self.split(ready)
+
+    def finish(self):
+        """الجمل المتبقية بعد آخر دفعة"""
+        ready, self.buffer = self.buffer, ""
+        return self.split(ready)
+
+class ScenePrerenderer:
+    """رسم وترميز مشاهد الفيديو الطويل أثناء وصول السكربت من Gemini
+
+    المقدمة والخاتمة تُرمّزان فوراً. جمل السكربت تُقسم وتبدأ تعليقاتها الصوتية أثناء وصوله، لكن
+    ترميز مشاهدها (الجزء المكلف) ينتظر approve بعد أن يجتاز السكربت كشف التكرار، فالسكربت
+    المرفوض لا يكلف رسماً. كل مشهد يُرمّز في SegmentCache بمدته من calculate_scene_duration (أو
+    من طول تعليقه)، بنفس قواعد plan_long_video. finish تبني الخطة النهائية وترمّز ما لم يطابقها
+    بعد (المد أو تعويض التقريب)، فيجد render_video كل المقاطع جاهزة.
+    """
+
+    def __init__(self, creator, topic, extra_text=None, min_duration=None, run=None):
+        self.creator = creator
+        self.topic = topic
+        self.extra_text = extra_text
+        if min_duration is None:
+            min_duration = creator.LONG_VIDEO_MIN_DURATION
+        self.min_duration = min_duration
+        self.main_target = min_duration - creator.LONG_INTRO_DURATION - creator.LONG_OUTRO_DURATION
+        # run(func, *args) يغلف رسم كل مشهد، مثلاً بحد مراحل cpu في المجدول
+        self.run = run
+        self.plan = creator.new_long_plan(topic)
+        self.encoder_settings = self.plan.encoder_settings()
+        self.started = set()
+        self.queue = []
+        # مشاهد السكربت لا تُرمّز قبل approve
+        self.approved = False
+        self.worker = None
+        self.rendered = 0
+        self.reused = 0
+        self.restart()
+        
+        self.add(self.plan.add("text", creator.long_intro_text(topic), creator.LONG_INTRO_DURATION,
+                               slide_type="title", fallback=False), minimum=creator.LONG_INTRO_DURATION)
+        self.add(self.plan.add("text", creator.LONG_OUTRO_TEXT, creator.LONG_OUTRO_DURATION,
+                               slide_type="outro", fallback=False), minimum=creator.LONG_OUTRO_DURATION)
+
+    def restart(self):
+        """البدء من جديد لسكربت آخر (إعادة توليد أو رد لم يصل على دفعات)"""
+        self.segmenter = ScriptSegmenter(self.creator.script_sentences)
+        self.text = ""
+        self.approved = False
+        self.main_count = 0
+        self.main_duration = 0
+        # المشاهد الرئيسية التي لم يبدأ رسمها تخص السكربت السابق
+        kept = []
+        for item in self.queue:
+            spec, key = item[0], item[1]
+            if spec["slide_type"] != "main":
+                kept.append(item)
+            else:
+                if key is not None:
+                    self.started.discard(key)
+                if item[2] is not None:
+                    item[2].add_done_callback(self.release_clip)
+        self.queue = kept
+
+    def release_clip(self, clip):
+        """تحرير مقطع تعليق ثبّته Narrator.clip بعد قراءة مدته؛ المشهد يُرمّز بدون الملف نفسه"""
+        if not clip.cancelled() and clip.exception() is None and clip.result() is not None:
+            self.creator.narrator.release([clip.result()["path"]])
+
+    def approve(self):
+        """السكربت الحالي اجتاز كشف التكرار: ترميز مشاهده المنتظرة"""
+        self.approved = True
+        if self.queue and (self.worker is None or self.worker.done()):
+            self.worker = asyncio.ensure_future(self.drain())
+
+    def feed(self, chunk):
+        self.text += chunk
+        for sentence in self.segmenter.feed(chunk):
+            self.add_main(sentence)
+
+    def add_main(self, text):
+        # نفس شرط plan_long_video: أول 15 جملة، ثم جمل إضافية ما دامت المدة ناقصة
+        if self.main_count >= 15 and self.main_duration >= self.main_target:
+            return
+        duration = self.creator.calculate_scene_duration(text, self.creator.LONG_SCENE_MIN, self.creator.LONG_SCENE_MAX)
+        self.main_count += 1
+        self.main_duration += duration
+        spec = {"builder": "text", "text": text, "slide_type": "main", "duration": duration, "fallback": True}
+        self.add(spec, minimum=self.creator.LONG_SCENE_MIN)
+
+    def claim(self, spec):
+        """مفتاح مقطع المشهد إذا لم يُرسم ولم يبدأ رسمه بعد، وإلا None"""
+        cache = self.creator.segment_cache
+        key = cache.key(spec, self.plan.size, self.encoder_settings, self.creator.LAYOUT_VERSION)
+        if key in self.started:
+            return None
+        self.started.add(key)
+        if cache.contains(key):
+            self.reused += 1
+            return None
+        return key
+
+    def add(self, spec, minimum=None):
+        """إضافة مشهد للرسم؛ minimum يعني أن مدته تُحسب من تعليقه الصوتي عند وجود الراوي"""
+        if minimum is not None and self.creator.narrator is not None:
+            # التعليق يبدأ فوراً بالتوازي، والمدة (ومعها مفتاح المقطع) تُعرف بعد انتهائه
+            clip = asyncio.ensure_future(self.creator.narrator.clip(spec["text"]))
+            self.queue.append((spec, None, clip, minimum))
+        else:
+            key = self.claim(spec)
+            if key is None:
+                return
+            self.queue.append((spec, key, None, None))
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.ensure_future(self.drain())
+
+    def next_item(self):
+        """أول مشهد في الطابور يمكن ترميزه الآن؛ مشاهد السكربت تنتظر approve"""
+        for i, item in enumerate(self.queue):
+            if self.approved or item[0]["slide_type"] != "main":
+                return self.queue.pop(i)
+        return None
+
+    async def drain(self):
+        # مشهد واحد في كل مرة بترتيب السكربت، فلا يزاحم رسم المراحل الأخرى
+        while (item := self.next_item()) is not None:
+            spec, key, clip, minimum = item
+            if clip is not None:
+                narration = {spec["text"]: await clip}
+                self.release_clip(clip)
+                spec["duration"] = self.creator.scene_duration(spec["text"], narration, minimum, spec["duration"])
+                key = self.claim(spec)
+                if key is None:
+                    continue
+            render = self.creator.prerender_scene
+            args = (spec, key, self.plan.size, self.plan.fps, self.plan.profile)
+            if await (self.run(render, *args) if self.run else render(*args)):
+                self.rendered += 1
+
+    async def finish(self):
+        """رسم ما تبقى من الخطة النهائية للسكربت الكامل وانتظار انتهاء كل المشاهد"""
+        self.approve()
+        # السكربت القصير تُمد مدد مشاهده في الخطة، فتُرمّز هنا بمددها الصحيحة
+        plan = await self.creator.plan_narrated_long_video(
+            self.topic, self.text, extra_text=self.extra_text, min_duration=self.min_duration)
+        for spec in plan:
+            self.add(spec)
+        # المشاهد تُرمّز بمددها فقط؛ مرحلة التعليق تبني خطتها وتثبت مقاطعها بنفسها
+        self.creator.release_narration(plan)
+        # drain قد تنتهي وتبدأ من جديد أثناء الانتظار
+        while self.worker is not None and not self.worker.done():
+            await self.worker
+        logger.info(f"🎞️ Prerendered {self.rendered} scenes while generating ({self.reused} already cached)")
+
+class ProfessionalVideoCreator:
+    """منشئ فيديو محترف بدون استخدام APIs خارجية"""
+
+    # يجب زيادته عند تغيير شكل الشرائح (الخطوط، المواضع، الألوان) لإبطال المقاطع المخزنة
+    LAYOUT_VERSION = 2
+    
+    # أقل مدة للفيديو الطويل بالثواني
+    LONG_VIDEO_MIN_DURATION = 300
+    
+    # مدد مشاهد الفيديو الطويل: المقدمة والخاتمة، وحدود المشهد الرئيسي
+    LONG_INTRO_DURATION = 10
+    LONG_OUTRO_DURATION = 8
+    LONG_SCENE_MIN, LONG_SCENE_MAX = 8, 15
+    LONG_OUTRO_TEXT = "Thanks for watching!\n\nDon't forget to subscribe\nfor more tech education"
+    
+    # الحجم ومعدل الإطارات ومتوسط مدة المشهد (للمعايرة) وإعدادات x264 بدون معايرة
+    VIDEO_FORMATS = {
+        "long": {"size": (1920, 1080), "fps": 24, "scene_s": 12,
+                 "profile": {"preset": "medium", "crf": 23, "gop": 250, "threads": 4}},
+        "short": {"size": (1080, 1920), "fps": 30, "scene_s": 5,
+                  "profile": {"preset": "fast", "crf": 23, "gop": 250, "threads": 4}},
+    }
+    CALIBRATION_TEXT = "Teams deploy faster with managed services\nand monitor latency in every region."
+    
+    # التعليق يبدأ بعد NARRATION_LEAD من بداية المشهد، والمشهد أطول من التعليق بـ NARRATION_PADDING
+    NARRATION_LEAD = 0.3
+    NARRATION_PADDING = 1.0
+    # مستوى الموسيقى الخلفية تحت التعليق الصوتي (0.3 بدونه)
+    MUSIC_UNDER_NARRATION = 0.12
+    
+    # إطارات الشرائح المحجوزة أثناء الرسم والترميز: المشهد الحالي والتالي (stream_slides)
+    FRAME_POOL_SLOTS = 2
+    
+    # مشاهد عامة لإكمال السكربتات القصيرة
+    FILLER_SCENES = [
+        "Let's explore this important topic in detail",
+        "This technology is changing how we work and live",
+        "Understanding the basics is crucial for success",
+        "Practical applications make learning more effective",
+        "Real-world examples help clarify complex concepts",
+        "Best practices ensure better results",
+        "Common challenges and how to overcome them",
+        "Future trends in this technology field",
+        "How to get started with practical implementation",
+        "Tips for mastering this technology quickly"
+    ]
+
+    def __init__(self):
+        self.temp_dir = "temp"
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self.background_engine = BackgroundEngine()
+        self.background_cache = BackgroundCache(self.background_engine)
+        self.text_renderer = TextRenderer()
+        self.text_layout = TextLayout()
+        
+        # حفظ الشرائح كملفات PNG في temp/ للتصحيح بدلاً من تمريرها من الذاكرة
+        self.keep_slide_pngs = os.getenv('SAVE_SLIDE_PNGS', '').lower() in ('1', 'true', 'yes')
+        
+        # عدد عمليات رسم الشرائح (افتراضياً عدد الأنوية)
+        self.render_workers = int(os.getenv('RENDER_WORKERS', '0')) or os.cpu_count() or 1
+        self.executor = None
+        self.attached_frames = None
+        
+        # "ffmpeg" للترميز المباشر للشرائح الثابتة، أو "moviepy"
+        self.encoder_backend = os.getenv('VIDEO_ENCODER', 'ffmpeg')
+        self.still_encoder = StillImageEncoder(self.temp_dir)
+        # المقاطع والتعليق والفيديوهات النهائية وشرائح التصحيح تحت حد قرص واحد
+        self.artifact_store = ArtifactStore()
+        self.music_library = MusicLibrary(self.still_encoder)
+        
+        # إعدادات الترميز تُعاير مرة لكل جهاز؛ ENCODER_TUNING=0 يستخدم الإعدادات الثابتة
+        self.encoder_tuner = None
+        if os.getenv('ENCODER_TUNING', '1').lower() not in ('0', 'false', 'no'):
+            self.encoder_tuner = EncoderTuner(self.still_encoder)
+        
+        # مقاطع المشاهد المرمّزة؛ SEGMENT_CACHE=0 يعطّلها ويرمّز الفيديو في تمريرة واحدة
+        self.segment_cache = None
+        if os.getenv('SEGMENT_CACHE', '1').lower() not in ('0', 'false', 'no'):
+            self.segment_cache = SegmentCache(self.artifact_store, legacy_dir="cache/segments")
+        
+        # التعليق الصوتي: NARRATION_BACKEND=edge أو offline (بديل محلي)، وبدونه فيديو صامت
+        self.narrator = self.create_narrator(os.getenv('NARRATION_BACKEND', 'none').lower())
+
+        # قائمة من الألوان الجذابة للخلفيات
+        self.background_colors = [
+            (25, 99, 235),   # أزرق
+            (124, 58, 237),  # بنفسجي
+            (5, 150, 105),   # أخضر
+            (220, 38, 38),   # أحمر
+            (245, 158, 11),  # برتقالي
+            (139, 92, 246),  # بنفسجي فاتح
+            (14, 165, 233),  # سماوي
+            (236, 72, 153),  # وردي
+        ]
+        
+        # تأثيرات بصرية محلية
+        self.visual_patterns = [
+            "gradient", "dots", "lines", "grid", "waves", "circuit"
+        ]
+    
+    def create_narrator(self, backend_name):
+        if backend_name in ('', 'none', '0', 'false', 'no'):
+            return None
+        cache = NarrationCache(self.artifact_store, legacy_dir="cache/narration")
+        if backend_name == "edge":
+            return Narrator(EdgeTTSBackend(self.still_encoder), cache)
+        if backend_name == "offline":
+            return Narrator(OfflineTTSBackend(), cache)
+        logger.warning(f"⚠️ Unknown NARRATION_BACKEND '{backend_name}', videos will be silent")
+        return None
+    
+    def create_dynamic_background(self, size=(1920, 1080), pattern_type=None, as_array=False, use_cache=True, out=None):
+        """إنشاء خلفية ديناميكية محلية"""
+        if pattern_type is None:
+            pattern_type = random.choice(self.visual_patterns)
+        
+        color1 = random.choice(self.background_colors)
+        color2 = random.choice([c for c in self.background_colors if c != color1])
+        
+        if use_cache:
+            background = self.background_cache.get(pattern_type, size, color1, color2, out=out)
+        else:
+            seed = random.getrandbits(32)
+            background = self.background_engine.render(pattern_type, size, color1, color2, seed=seed)
+            if out is not None:
+                np.copyto(out, background)
+                background = out
+        if as_array or out is not None:
+            return background
+        return Image.fromarray(background)
+    
+    def create_text_slide(self, text, size=(1920, 1080), slide_type="main", as_array=False, out=None):
+        """إنشاء شريحة نصية محترفة
+
+        تُرجع مسار PNG افتراضياً، أو مصفوفة RGB عند as_array (أو داخل out إن مُرّر).
+        """
+        try:
+            # إنشاء خلفية ديناميكية
+            frame = self.create_dynamic_background(size, as_array=True, out=out)
+            
+            # الخطوط (أصغر وأكبر حجم) وعرض المنطقة النصية حسب نوع الشريحة
+            if slide_type == "title":
+                # السطر الأول عنوان عريض والباقي (الموضوع) بخط عادي
+                heading, _, body = text.partition("\n")
+                blocks = [(heading, FONT_BOLD, 50, 90), (body, FONT_REGULAR, 40, 60)]
+                max_width = size[0] - 200
+            elif slide_type == "main":
+                blocks = [(text, FONT_REGULAR, 40, 70)]
+                max_width = size[0] - 150
+            else:  # outro
+                blocks = [(text, FONT_REGULAR, 45, 80)]
+                max_width = size[0] - 200
+            
+            # تقسيم النص إلى سطور بعرض البكسل وبأكبر حجم يناسب المنطقة
+            line_spacing = 20
+            layouts = self.layout_blocks(blocks, (max_width, size[1] - 360), line_spacing)
+            
+            if not layouts:
+                return None
             
-            # تقسيم النص
-            lines = textwrap.wrap(text, width=25)
+            # حساب الارتفاع الكلي
+            total_height = sum(layout["height"] for _, layout in layouts) + (len(layouts) - 1) * line_spacing
+            
+            # حساب نقطة البداية
+            y_start = (size[1] - total_height) // 2
+            
+            # إضافة خلفية للنص
+            text_bg_height = total_height + 60
+            text_bg_width = max_width + 100
+            text_bg_x = (size[0] - text_bg_width) // 2
+            text_bg_y = y_start - 30
+            
+            self.text_renderer.draw_panel(
+                frame,
+                [text_bg_x, text_bg_y, text_bg_x + text_bg_width, text_bg_y + text_bg_height],
+                fill=(0, 0, 0),
+                outline=(255, 255, 255),
+                width=3
+            )
+            
+            # رسم النص مع ظل من نفس القناع
+            text_colors = {FONT_BOLD: (255, 255, 255), FONT_REGULAR: (240, 240, 240)}
+            self.draw_layouts(frame, layouts, y_start, line_spacing, text_colors, shadow_offset=4)
+            
+            # إضافة شعار في الزاوية
+            self.text_renderer.apply_overlay(frame, self.text_renderer.branding_overlay(size))
+            
+            return self.finish_slide(frame, f"slide_{slide_type}", as_array or out is not None)
+            
+        except Exception as e:
+            logger.error(f"❌ Text slide creation error: {e}")
+            return None
+    
+    def create_short_slide(self, text, size=(1080, 1920), as_array=False, out=None):
+        """إنشاء شريحة للمقاطع القصيرة"""
+        try:
+            # خلفية ديناميكية للشورت
+            frame = self.create_dynamic_background(
+                size, pattern_type=random.choice(["gradient", "dots"]), as_array=True, out=out)
+            
+            # السطر الأول عريض (أو الجملة كلها)، وما بعد أول سطر جديد بخط عادي
+            heading, _, body = text.partition("\n")
+            line_spacing = 20
+            layouts = self.layout_blocks(
+                [(heading, FONT_BOLD, 55, 85), (body, FONT_REGULAR, 45, 70)],
+                (size[0] - 120, size[1] // 2), line_spacing)
             
             # حساب الارتفاع
-            total_height = (len(lines) * 100) + ((len(lines) - 1) * 20)
+            total_height = sum(layout["height"] for _, layout in layouts) + (len(layouts) - 1) * line_spacing
             y_start = (size[1] - total_height) // 2
             
-            # رسم كل سطر
-            current_y = y_start
-            for i, line in enumerate(lines):
-                font = main_font if i == 0 else secondary_font
-                text_color = (255, 255, 255) if i == 0 else (240, 240, 240)
-                
-                bbox = draw.textbbox((0, 0), line, font=font)
-                text_width = bbox[2] - bbox[0]
-                x_pos = (size[0] - text_width) // 2
-                
-                # ظل
-                draw.text((x_pos + 3, current_y + 3), line, font=font, fill=(0, 0, 0, 150))
-                # نص
-                draw.text((x_pos, current_y), line, font=font, fill=text_color)
-                
-                current_y += 100 if i == 0 else 70
+            # رسم كل سطر: ظل ونص من نفس القناع
+            text_colors = {FONT_BOLD: (255, 255, 255), FONT_REGULAR: (240, 240, 240)}
+            current_y = self.draw_layouts(frame, layouts, y_start, line_spacing, text_colors, shadow_offset=3)
             
             # إضافة أيقونة
             icons = ["🚀", "⚡", "💡", "🔥", "🎯", "✨", "🌟", "💫"]
             icon = random.choice(icons)
-            icon_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 120)
+            icon_font = (FONT_REGULAR, 120)
             
-            bbox = draw.textbbox((0, 0), icon, font=icon_font)
-            icon_width = bbox[2] - bbox[0]
+            icon_width = self.text_renderer.measure(icon, *icon_font)
             icon_x = (size[0] - icon_width) // 2
             
-            draw.text((icon_x, current_y + 50), icon, font=icon_font, fill=(255, 255, 255, 220))
-            
-            # حفظ
-            temp_path = os.path.join(self.temp_dir, f"short_slide_{hash(text[:20])}.png")
-            bg_image.save(temp_path, 'PNG', quality=95)
+            self.text_renderer.draw_text(frame, icon, *icon_font, (icon_x, current_y + 50), (255, 255, 255))
             
-            return temp_path
+            return self.finish_slide(frame, "short_slide", as_array or out is not None)
             
         except Exception as e:
             logger.error(f"❌ Short slide creation error: {e}")
             return None
     
-    async def create_long_video(self, topic, script):
-        """إنشاء فيديو طويل (8-10 دقائق)"""
+    def layout_blocks(self, blocks, box, line_spacing):
+        """ملاءمة كتل نص متتالية (نص، خط، أصغر حجم، أكبر حجم) داخل صندوق واحد
+
+        كل كتلة تأخذ أكبر حجم يناسب ما تبقى من ارتفاع الصندوق؛ تُرجع [(الخط، التخطيط)].
+        """
+        layouts = []
+        remaining = box[1]
+        for text, font_path, min_size, max_size in blocks:
+            if not text.strip():
+                continue
+            layout = self.text_layout.fit(
+                text, font_path, (box[0], max(remaining, 0)), min_size, max_size, line_spacing)
+            layouts.append((font_path, layout))
+            remaining -= layout["height"] + line_spacing
+        return layouts
+    
+    def draw_layouts(self, frame, layouts, y, line_spacing, colors, shadow_offset=0):
+        """رسم سطور التخطيطات في منتصف الإطار أفقياً؛ تُرجع y بعد آخر سطر"""
+        for font_path, layout in layouts:
+            for line, width in zip(layout["lines"], layout["widths"]):
+                x = (frame.shape[1] - width) // 2
+                self.text_renderer.draw_text(
+                    frame, line, font_path, layout["font_size"], (x, y), colors[font_path], shadow_offset=shadow_offset)
+                y += layout["line_height"] + line_spacing
+        return y
+    
+    def finish_slide(self, frame, prefix, as_array):
+        """إرجاع الشريحة كمصفوفة، أو حفظها PNG (دائماً عند تفعيل keep_slide_pngs للتصحيح)
+
+        الملف في ArtifactStore بمفتاح من البكسلات نفسها، فالشريحة المتطابقة تُكتب مرة واحدة.
+        """
+        if as_array and not self.keep_slide_pngs:
+            return frame
+        
+        digest = hashlib.sha256(np.ascontiguousarray(frame)).hexdigest()
+        key = ArtifactStore.key("slide", prefix, list(frame.shape), digest)
+        path = self.artifact_store.get(key, ".png")
+        if path is None:
+            path = self.artifact_store.put(key, ".png", lambda tmp_path: Image.fromarray(frame).save(tmp_path, 'PNG'))
+        return frame if as_array else path
+    
+    def slide_output(self, count, size):
+        """مخزن الإطارات لفيديو واحد، أو None عند حفظ الشرائح كملفات PNG"""
+        if self.keep_slide_pngs:
+            return None
+        return SlideFrameBuffer(count, size)
+    
+    def slide_kwargs(self, frames, index):
+        """وسائط دوال الشرائح: الرسم داخل إطار المخزن، أو ملف PNG بدونه"""
+        if frames is None:
+            return {}
+        return {"out": frames.frame(index)}
+    
+    def slide_job(self, builder, text, index, frames, slide_type="main", size=None):
+        """وصف شريحة قابل للإرسال إلى عملية عاملة؛ size None يعني حجم الصيغة الافتراضي"""
+        return {
+            "builder": builder,
+            "text": text,
+            "slide_type": slide_type,
+            "index": index,
+            "size": size,
+            # بذرة لكل شريحة حتى لا ترث العمليات المتفرعة نفس حالة random
+            "seed": random.getrandbits(32),
+            "frames": frames.spec() if frames is not None else None,
+            "keep_pngs": self.keep_slide_pngs,
+        }
+    
+    def render_slide(self, job, frames=None):
+        """رسم شريحة واحدة من وصفها؛ تُرجع None عند الفشل"""
+        random.seed(job["seed"])
+        self.keep_slide_pngs = job["keep_pngs"]
+        
+        if frames is None and job["frames"] is not None:
+            if self.attached_frames is None or self.attached_frames.spec() != tuple(job["frames"]):
+                self.attached_frames = SlideFrameBuffer.attach(job["frames"])
+            frames = self.attached_frames
+        kwargs = self.slide_kwargs(frames, job["index"])
+        if job["size"] is not None:
+            kwargs["size"] = tuple(job["size"])
+        
+        with TRACER.span("slide", "render", builder=job["builder"], index=job["index"]):
+            if job["builder"] == "short":
+                slide = self.create_short_slide(job["text"], **kwargs)
+            else:
+                slide = self.create_text_slide(job["text"], slide_type=job["slide_type"], **kwargs)
+        
+        if slide is None:
+            return None
+        # الإطار مكتوب في المخزن المشترك؛ لا داعي لإرجاع البكسلات عبر pickle
+        return True if frames is not None else slide
+    
+    def slide_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.render_workers)
+        return self.executor
+    
+    def close(self):
+        """إيقاف مجمع عمليات الرسم"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+    
+    async def render_slides(self, jobs, frames):
+        """رسم كل الشرائح عبر مجمع العمليات مع الحفاظ على ترتيب المشاهد"""
+        if self.render_workers <= 1 or len(jobs) <= 1:
+            results = [self.render_slide(job, frames) for job in jobs]
+        else:
+            loop = asyncio.get_running_loop()
+            executor = self.slide_executor()
+            futures = [loop.run_in_executor(executor, render_slide_job, job) for job in jobs]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            # العمليات العاملة تُرجع (النتيجة، أحداث التتبع)
+            results = [TRACER.absorb(*result) if isinstance(result, tuple) else result for result in results]
+            
+            if any(isinstance(result, BrokenProcessPool) for result in results):
+                # المجمع تعطل (مثلاً عملية قُتلت): نعيد الرسم محلياً
+                logger.warning("⚠️ Slide worker pool broke, rendering in-process")
+                self.executor = None
+                results = [self.render_slide(job, frames) if isinstance(result, BrokenProcessPool) else result
+                           for job, result in zip(jobs, results)]
+        
+        slides = []
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException) or result is None:
+                logger.error(f"❌ Slide {job['index']} failed: {result}")
+                slides.append(None)
+            elif frames is not None:
+                slides.append(frames.frame(job["index"]))
+            else:
+                slides.append(result)
+        return slides
+    
+    def encoder_profile(self, name):
+        """إعدادات x264 لصيغة name من EncoderTuner، أو الثابتة إذا كانت المعايرة معطلة أو فشلت"""
+        video_format = self.VIDEO_FORMATS[name]
+        if self.encoder_tuner is None:
+            return dict(video_format["profile"])
+        
+        def sample():
+            if name == "short":
+                return self.create_short_slide(self.CALIBRATION_TEXT, size=video_format["size"], as_array=True)
+            return self.create_text_slide(self.CALIBRATION_TEXT, size=video_format["size"], as_array=True)
+        
+        try:
+            return self.encoder_tuner.profile(
+                name, video_format["size"], video_format["fps"], video_format["scene_s"], sample)
+        except Exception as e:
+            logger.warning(f"⚠️ Encoder calibration failed, using default {name} profile: {e}")
+            self.encoder_tuner.profiles[name] = dict(video_format["profile"])
+            return dict(video_format["profile"])
+    
+    def tune_encoders(self):
+        """معايرة كل الصيغ مسبقاً (على جهاز جديد فقط) قبل أن يبدأ الرسم"""
+        return {name: self.encoder_profile(name) for name in self.VIDEO_FORMATS}
+    
+    def new_plan(self, name, music_path=None):
+        video_format = self.VIDEO_FORMATS[name]
+        return ScenePlan(video_format["size"], video_format["fps"], self.encoder_profile(name), music_path=music_path)
+    
+    def new_long_plan(self, topic=None):
+        # موسيقى خلفية من assets/background_music.mp3 أو assets/music/ إذا وُجدت
+        return self.new_plan("long", music_path=self.music_library.pick(topic))
+    
+    def long_intro_text(self, topic):
+        return f"Complete Guide to:\n{topic}"
+    
+    def plan_long_video(self, topic, script, extra_text=None, min_duration=None, narration=None):
+        """بناء خطة الفيديو الطويل وإكمالها إلى min_duration قبل الرسم
+
+        الإكمال بالترتيب: جمل السكربت بعد المشاهد الخمسة عشر، ثم جمل extra_text، ثم مد مدد
+        المشاهد الرئيسية حتى 15 ثانية، مع مشاهد عامة بالمدة القصوى إذا لم يكفِ المد.
+        مع narration ({النص: المقطع}) تُحسب مدة كل مشهد من طول تعليقه بدلاً من عدد الكلمات.
+        """
+        if min_duration is None:
+            min_duration = self.LONG_VIDEO_MIN_DURATION
+        min_dur, max_dur = self.LONG_SCENE_MIN, self.LONG_SCENE_MAX
+        intro_duration, outro_duration = self.LONG_INTRO_DURATION, self.LONG_OUTRO_DURATION
+        
+        plan = self.new_long_plan(topic)
+        
+        def main_duration(text):
+            return self.scene_duration(text, narration, min_dur, self.calculate_scene_duration(text, min_dur, max_dur))
+        
+        # 1. المقدمة (10 ثوان)
+        intro_text = self.long_intro_text(topic)
+        intro = plan.add("text", intro_text, self.scene_duration(intro_text, narration, intro_duration),
+                         slide_type="title", fallback=False)
+        
+        # 2. المشاهد الرئيسية
+        sentences = self.script_sentences(script)
+        if extra_text:
+            sentences += self.script_sentences(extra_text)
+        main = [plan.add("text", text, main_duration(text)) for text in sentences[:15]]
+        extra = sentences[15:]
+        
+        # السكربتات القصيرة تُكمل بمشاهد عامة بترتيب ثابت حتى تبقى مفاتيح المقاطع المخزنة ثابتة
+        filler_index = 0
+        while len(main) < 15:
+            text = self.FILLER_SCENES[filler_index % len(self.FILLER_SCENES)]
+            main.append(plan.add("text", text, main_duration(text)))
+            filler_index += 1
+        
+        # 3. الخاتمة (8 ثوان)، مدتها محسوبة قبل الإكمال لأن التعليق قد يطيلها
+        outro_duration = self.scene_duration(self.LONG_OUTRO_TEXT, narration, outro_duration)
+        
+        def deficit():
+            return min_duration - intro["duration"] - outro_duration - sum(scene["duration"] for scene in main)
+        
+        while deficit() > 0 and extra:
+            text = extra.pop(0)
+            main.append(plan.add("text", text, main_duration(text)))
+        
+        # المشاهد التي يطيلها التعليق فوق max_dur لا تُمد أكثر
+        headroom = sum(max(max_dur - scene["duration"], 0) for scene in main)
+        while deficit() > headroom:
+            text = self.FILLER_SCENES[filler_index % len(self.FILLER_SCENES)]
+            main.append(plan.add("text", text, self.scene_duration(text, narration, max_dur)))
+            filler_index += 1
+        
+        if deficit() > 0:
+            share = deficit() / headroom
+            for scene in main:
+                scene["duration"] += max(max_dur - scene["duration"], 0) * share
+        
+        plan.add("text", self.LONG_OUTRO_TEXT, outro_duration, slide_type="outro", fallback=False)
+        
+        # تعويض ما يضيع بالتقريب إلى حدود الإطارات
+        shortfall = min_duration - plan.duration
+        if shortfall > 0 and main:
+            frames = plan.frame_count(main[-1]) + int(np.ceil(shortfall * plan.fps - 1e-6))
+            main[-1]["duration"] = frames / plan.fps
+        
+        plan.attach_narration(narration)
+        return plan
+    
+    def plan_short_video(self, topic, script, narration=None):
+        """بناء خطة الفيديو القصير (45-60 ثانية)"""
+        plan = self.new_plan("short")
+        
+        # 1. المقدمة (3 ثوان)
+        intro_text = f"⚡ {topic.split(':')[0] if ':' in topic else topic}\nQuick Tip!"
+        plan.add("short", intro_text, self.scene_duration(intro_text, narration, 3), fallback=False)
+        
+        # 2. المشاهد الرئيسية
+        for text in self.prepare_short_texts(script, count=5):
+            plan.add("short", text, self.scene_duration(text, narration, 2, min(len(text.split()) * 0.6, 10)))
+        
+        # 3. الخاتمة (3 ثوان)
+        outro_text = "🔔 Follow for more!\n@TechCompass"
+        plan.add("short", outro_text, self.scene_duration(outro_text, narration, 3), fallback=False)
+        
+        plan.attach_narration(narration)
+        return plan
+    
+    def scene_duration(self, text, narration, minimum, estimate=None):
+        """مدة المشهد من طول تعليقه مع هامش (minimum على الأقل)، أو estimate بدون تعليق"""
+        clip = narration.get(text) if narration else None
+        if clip is None:
+            return minimum if estimate is None else estimate
+        return max(minimum, clip["duration"] + self.NARRATION_PADDING)
+    
+    async def narrated_plan(self, build, narration=None):
+        """build(narration) يبني خطة؛ يُعاد البناء بعد تركيب تعليق كل مشهد جديد فيها
+
+        تغير المدد قد يغير المشاهد المختارة (جمل إضافية، مشاهد عامة)، فيتكرر حتى يكون لكل
+        مشهد تعليق أو محاولة فاشلة. كل جولة تركّب مشاهدها الناقصة بالتوازي.
+        """
+        narration = dict(narration or {})
+        plan = build(narration)
+        if self.narrator is None:
+            return plan
+        # {النص: المسار} لكل مقطع ثبّته narrate هنا
+        pinned = {}
+        while True:
+            missing = [scene["text"] for scene in plan if scene["text"] not in narration]
+            if not missing:
+                break
+            clips = await self.narrator.narrate(missing)
+            pinned.update((text, clip["path"]) for text, clip in clips.items() if clip)
+            narration.update(clips)
+            plan = build(narration)
+        
+        # جمل خرجت من الخطة بعد تغير المدد لا تنتظر الترميز
+        used = {scene["text"] for scene in plan}
+        self.narrator.release([path for text, path in pinned.items() if text not in used])
+        plan.narration_pins = [path for text, path in pinned.items() if text in used]
+        return plan
+    
+    async def plan_narrated_long_video(self, topic, script, extra_text=None, min_duration=None):
+        return await self.narrated_plan(lambda narration: self.plan_long_video(
+            topic, script, extra_text=extra_text, min_duration=min_duration, narration=narration))
+    
+    async def plan_narrated_short_video(self, topic, script):
+        return await self.narrated_plan(lambda narration: self.plan_short_video(topic, script, narration=narration))
+    
+    async def create_long_video(self, topic, script, extra_text=None, min_duration=None, plan=None):
+        """إنشاء فيديو طويل (8-10 دقائق)؛ plan خطة جاهزة من مرحلة التعليق الصوتي إن وُجدت"""
         try:
             logger.info(f"🎬 Creating long video for: {topic}")
             
-            # تقسيم السكربت إلى مشاهد
-            scenes = self.prepare_scenes(script, scene_count=15)
-            
-            clips = []
+            if plan is None:
+                plan = await self.plan_narrated_long_video(
+                    topic, script, extra_text=extra_text, min_duration=min_duration)
+            logger.info(f"📏 Planned {len(plan)} scenes, {plan.duration:.1f} seconds")
             
-            # 1. المقدمة (10 ثوان)
-            intro_text = f"Complete Guide to:\n{topic}"
-            intro_slide = self.create_text_slide(intro_text, slide_type="title")
-            if intro_slide:
-                intro_clip = ImageClip(intro_slide, duration=10)
-                clips.append(intro_clip)
-            
-            # 2. المشاهد الرئيسية
-            for i, scene_text in enumerate(scenes):
-                scene_duration = self.calculate_scene_duration(scene_text, min_dur=8, max_dur=15)
-                
-                scene_slide = self.create_text_slide(scene_text, slide_type="main")
-                if scene_slide:
-                    scene_clip = ImageClip(scene_slide, duration=scene_duration)
-                    clips.append(scene_clip)
-                else:
-                    # مشهد بديل
-                    bg_color = random.choice(self.background_colors)
-                    bg_clip = ColorClip(size=(1920, 1080), color=bg_color, duration=scene_duration)
-                    clips.append(bg_clip)
-            
-            # 3. الخاتمة (8 ثوان)
-            outro_text = "Thanks for watching!\n\nDon't forget to subscribe\nfor more tech education"
-            outro_slide = self.create_text_slide(outro_text, slide_type="outro")
-            if outro_slide:
-                outro_clip = ImageClip(outro_slide, duration=8)
-                clips.append(outro_clip)
-            
-            # تجميع الفيديو
-            if not clips:
+            # حفظ الفيديو
+            output_path = self.reserve_output("long_professional")
+            try:
+                duration = await self.render_video(plan, output_path)
+            finally:
+                if os.path.exists(output_path) and os.path.getsize(output_path) == 0:
+                    os.remove(output_path)
+            if duration is None:
                 logger.error("❌ No clips created")
                 return None
             
-            video = concatenate_videoclips(clips, method="compose")
+            logger.info(f"✅ Created long video: {output_path} ({duration:.1f}s)")
+            return output_path
             
-            # إضافة موسيقى خلفية هادئة
-            try:
-                # إنشاء صوت بسيط باستخدام نغمة
-                from moviepy.audio.AudioClip import CompositeAudioClip
-                from moviepy.audio.io.AudioFileClip import AudioFileClip
-                
-                # يمكن إضافة ملف صوتي خلفي إذا كان موجوداً
-                bg_music_path = "assets/background_music.mp3"
-                if os.path.exists(bg_music_path):
-                    bg_music = AudioFileClip(bg_music_path)
-                    bg_music = bg_music.volumex(0.3)  # تخفيض الصوت
-                    bg_music = bg_music.loop(duration=video.duration)
-                    video = video.set_audio(bg_music)
-            except:
-                pass  # الملف غير موجود، نستمر بدون صوت
+        except Exception as e:
+            logger.error(f"❌ Long video creation error: {e}")
+            return None
+    
+    async def create_short_video(self, topic, script, plan=None):
+        """إنشاء فيديو قصير (45-60 ثانية)"""
+        try:
+            logger.info(f"🎬 Creating short video for: {topic}")
             
-            # حفظ الفيديو
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_path = f"output/long_professional_{timestamp}.mp4"
+            if plan is None:
+                plan = await self.plan_narrated_short_video(topic, script)
             
-            video.write_videofile(
-                output_path,
-                fps=24,
-                codec='libx264',
-                audio_codec='aac',
-                threads=4,
-                preset='medium',
-                verbose=False,
-                logger=None
-            )
+            # حفظ الفيديو
+            output_path = self.reserve_output("short_professional")
+            try:
+                duration = await self.render_video(plan, output_path)
+            finally:
+                if os.path.exists(output_path) and os.path.getsize(output_path) == 0:
+                    os.remove(output_path)
+            if duration is None:
+                logger.error("❌ No short clips created")
+                return None
             
-            logger.info(f"✅ Created long video: {output_path} ({video.duration:.1f}s)")
+            logger.info(f"✅ Created short video: {output_path} ({duration:.1f}s)")
             return output_path
             
         except Exception as e:
-            logger.error(f"❌ Long video creation error: {e}")
+            logger.error(f"❌ Short video creation error: {e}")
+            return None
+    
+    def scene_prerenderer(self, topic, extra_text=None, min_duration=None, run=None):
+        """ScenePrerenderer للفيديو الطويل، أو None إذا لم تكن المقاطع تُخزّن (لا مكان لوضع المشاهد المرسومة)"""
+        if self.encoder_backend != "ffmpeg" or self.segment_cache is None:
+            return None
+        return ScenePrerenderer(self, topic, extra_text=extra_text, min_duration=min_duration, run=run)
+    
+    async def prerender_scene(self, spec, key, size, fps, profile):
+        """رسم مشهد واحد وترميزه في SegmentCache قبل بناء الخطة النهائية؛ تُرجع True عند النجاح"""
+        frames = self.slide_output(1, size)
+        try:
+            job = self.slide_job(spec["builder"], spec["text"], 0, frames, slide_type=spec["slide_type"], size=size)
+            if self.render_workers > 1:
+                # عملية عاملة حتى تبقى حلقة الأحداث حرة لاستقبال بقية السكربت
+                loop = asyncio.get_running_loop()
+                result = TRACER.absorb(*await loop.run_in_executor(self.slide_executor(), render_slide_job, job))
+            else:
+                result = self.render_slide(job, frames)
+            if result is None:
+                return False
+            slide = frames.frame(0) if frames is not None else result
+            
+            encode = lambda path: self.still_encoder.encode_segment(
+                slide, spec["duration"], size, path, fps=fps, profile=profile)
+            await asyncio.to_thread(self.segment_cache.put, key, encode)
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Prerender failed for scene '{spec['text'][:40]}': {e}")
+            return False
+        finally:
+            if frames is not None:
+                frames.close()
+    
+    async def render_video(self, plan, output_path):
+        """رسم وترميز خطة مشاهد؛ تُرجع المدة الكلية أو None إذا لم يُنتج أي مشهد
+
+        الشرائح تُرسم عند الحاجة في مخزن ثابت من FRAME_POOL_SLOTS إطارات (stream_slides)، فذروة
+        الذاكرة لا تزيد مع عدد المشاهد أو طول الفيديو. مع ffmpeg يُرمّز كل مشهد كمقطع مستقل في
+        SegmentCache ثم تُجمع المقاطع بالنسخ المباشر، فلا يُعاد رسم أو ترميز إلا المشاهد الجديدة أو
+        المتغيرة؛ وبدون المقاطع تُكتب الشرائح مباشرة في أنبوب المرمّز (stream_video).
+        
+        الفيديو النهائي يُحفظ في ArtifactStore بمفتاح من كل ما يغير بتاته (video_key)، و output_path
+        رابط إليه؛ نفس الخطة مرة أخرى (إعادة تشغيل بعد فشل الرفع مثلاً) لا تُرمّز من جديد.
+        """
+        if not plan.scenes:
+            return None
+        use_segments = self.encoder_backend == "ffmpeg" and self.segment_cache is not None
+        
+        # الموسيقى مفكوكة مسبقاً (مرحلة long.music)؛ هنا مجرد بحث في الفهرس
+        music = await asyncio.to_thread(self.music_library.track, plan.music_path) if plan.music_path else None
+        audio = {"music": music, "music_volume": 0.3}
+        if any(spec["narration"] for spec in plan):
+            audio["music_volume"] = self.MUSIC_UNDER_NARRATION
+        
+        try:
+            return await self.encode_video(plan, output_path, use_segments, audio)
+        finally:
+            self.release_narration(plan)
+    
+    def release_narration(self, plan):
+        """تحرير مقاطع التعليق التي ثبّتها narrated_plan للخطة، مرة واحدة"""
+        pins, plan.narration_pins = plan.narration_pins, []
+        if pins and self.narrator is not None:
+            self.narrator.release(pins)
+    
+    async def encode_video(self, plan, output_path, use_segments, audio):
+        """ربط الفيديو المخزن بمفتاح الخطة في output_path، أو ترميزه وحفظه في ArtifactStore"""
+        key = self.video_key(plan, audio["music"], audio["music_volume"])
+        cached = self.artifact_store.get(key, ".mp4", pin=True)
+        if cached is not None:
+            try:
+                self.link_output(cached, output_path)
+            finally:
+                self.artifact_store.release([cached])
+            logger.info(f"♻️ Reusing encoded video for {os.path.basename(output_path)}")
+            return plan.duration
+        
+        # الرسم والترميز في خيط حتى تستمر المراحل الأخرى (توليد، رفع) أثناءهما
+        plan.failed = 0
+        tmp_path = self.artifact_store.tmp_path(key, ".mp4")
+        with TRACER.span("encode", "encode", scenes=len(plan), preset=plan.profile["preset"]) as span:
+            try:
+                if not use_segments:
+                    duration = await asyncio.to_thread(self.stream_video, plan, tmp_path, **audio)
+                else:
+                    try:
+                        duration = await asyncio.to_thread(self.encode_segments, plan, tmp_path, **audio)
+                    except Exception as e:
+                        # الشرائح تُرسم من جديد، فالمقاطع المخزنة لا تلزم هنا
+                        logger.warning(f"⚠️ Segment encode failed, encoding in one pass: {e}")
+                        plan.failed = 0
+                        duration = await asyncio.to_thread(self.stream_video, plan, tmp_path, **audio)
+                if duration and os.path.exists(tmp_path):
+                    span.set(duration_s=round(duration, 2), output_bytes=os.path.getsize(tmp_path))
+                    if plan.failed:
+                        # مشاهد فاشلة استُبدلت بألوان عشوائية أو حُذفت: لا يُحفظ تحت مفتاح الخطة
+                        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+                        shutil.move(tmp_path, output_path)
+                    else:
+                        stored = self.artifact_store.adopt(key, ".mp4", tmp_path, pin=True)
+                        try:
+                            self.link_output(stored, output_path)
+                        finally:
+                            self.artifact_store.release([stored])
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return duration
+    
+    def video_key(self, plan, music, music_volume):
+        """مفتاح الفيديو النهائي في ArtifactStore؛ مقاطع التعليق والموسيقى بأسماء ملفاتها (مفاتيح محتواها)"""
+        scenes = [[spec["builder"], spec["slide_type"], spec["text"], plan.frame_count(spec),
+                   os.path.basename(spec["narration"]) if spec["narration"] else None] for spec in plan]
+        return ArtifactStore.key(
+            "video", self.LAYOUT_VERSION, list(plan.size), plan.encoder_settings(), scenes,
+            os.path.basename(music["path"]) if music else None, music_volume, self.NARRATION_LEAD)
+    
+    @staticmethod
+    def reserve_output(prefix):
+        """اسم فريد في output/ محجوز بملف فارغ (mkstemp)؛ مرحلتان تنتهيان في نفس الثانية لا تتشاركان الملف"""
+        os.makedirs('output', exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_",
+                                    suffix=".mp4", dir="output")
+        os.close(fd)
+        return path
+    
+    @staticmethod
+    def link_output(path, output_path):
+        """وضع ملف من ArtifactStore في output_path (محجوز بـ reserve_output): رابط صلب بدون نسخ، أو نسخة إن تعذر"""
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        if os.path.lexists(output_path):
+            os.remove(output_path)
+        try:
+            os.link(path, output_path)
+        except OSError:
+            shutil.copyfile(path, output_path)
+    
+    def stream_slides(self, specs, size):
+        """مولد شرائح specs بالترتيب (مصفوفة، أو مسار PNG، أو None عند الفشل) مع رسم التالية مسبقاً
+
+        الشريحة j تُرسم في الإطار j % FRAME_POOL_SLOTS من SlideFrameBuffer واحد، وتبقى صالحة حتى
+        طلب التي بعدها؛ التالية تبدأ في المكان الذي تحرر للتو. الذاكرة إذن FRAME_POOL_SLOTS ×
+        العرض × الارتفاع × 3 بايت (12 MB بدقة 1080p، 50 MB بدقة 4K) مهما كان عدد المشاهد.
+        """
+        if not specs:
+            return
+        slots = self.FRAME_POOL_SLOTS
+        frames = self.slide_output(slots, size)
+        # بعملية عاملة واحدة يُرسم التالي في خيط حتى يتداخل مع ترميز الحالي
+        prefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slides") if self.render_workers <= 1 else None
+        
+        # كل البذور تُسحب قبل بدء الرسم، لأن render_slide يعيد بذر random في خيط الرسم
+        jobs = [self.slide_job(spec["builder"], spec["text"], j % slots, frames, slide_type=spec["slide_type"],
+                               size=size) for j, spec in enumerate(specs)]
+        
+        def submit(j):
+            job = jobs[j]
+            if prefetch is not None:
+                return job, prefetch.submit(self.render_slide, job, frames)
+            return job, self.slide_executor().submit(render_slide_job, job)
+        
+        futures = {0: submit(0)}
+        try:
+            for j in range(len(specs)):
+                if j + 1 < len(specs):
+                    futures[j + 1] = submit(j + 1)
+                job, future = futures.pop(j)
+                yield self.collect_slide(job, future, frames)
+        finally:
+            for _, future in futures.values():
+                future.cancel()
+            if prefetch is not None:
+                prefetch.shutdown(wait=True)
+            if frames is not None:
+                frames.close()
+    
+    def collect_slide(self, job, future, frames):
+        """نتيجة شريحة من stream_slides: إطارها في المخزن، أو مسار PNG، أو None عند الفشل"""
+        try:
+            result = future.result()
+            if isinstance(result, tuple):
+                # العمليات العاملة تُرجع (النتيجة، أحداث التتبع)
+                result = TRACER.absorb(*result)
+        except BrokenProcessPool:
+            # المجمع تعطل (مثلاً عملية قُتلت): نعيد الرسم محلياً
+            logger.warning("⚠️ Slide worker pool broke, rendering in-process")
+            self.executor = None
+            result = self.render_slide(job, frames)
+        except Exception as e:
+            result = e
+        if isinstance(result, BaseException) or result is None:
+            logger.error(f"❌ Slide '{job['text'][:40]}' failed: {result}")
             return None
+        return frames.frame(job["index"]) if frames is not None else result
     
-    async def create_short_video(self, topic, script):
-        """إنشاء فيديو قصير (45-60 ثانية)"""
+    def scene_frames(self, plan):
+        """شريحة لكل مشهد بالترتيب من stream_slides؛ المشهد الفاشل يأخذ لوناً ثابتاً"""
+        slides = self.stream_slides(plan.scenes, plan.size)
         try:
-            logger.info(f"🎬 Creating short video for: {topic}")
-            
-            size = (1080, 1920)
-            
-            # تحضير النص للشورت
-            short_texts = self.prepare_short_texts(script, count=5)
-            
-            clips = []
-            
-            # 1. المقدمة (3 ثوان)
-            intro_text = f"⚡ {topic.split(':')[0] if ':' in topic else topic}\nQuick Tip!"
-            intro_slide = self.create_short_slide(intro_text)
-            if intro_slide:
-                intro_clip = ImageClip(intro_slide, duration=3)
-                clips.append(intro_clip)
-            
-            # 2. المشاهد الرئيسية
-            for i, text in enumerate(short_texts):
-                scene_duration = min(len(text.split()) * 0.6, 10)
+            for slide in slides:
+                if slide is None:
+                    plan.failed += 1
+                    slide = random.choice(self.background_colors)
+                yield slide
+        finally:
+            slides.close()
+    
+    def plan_narration(self, plan, scenes=None):
+        """[(مسار التعليق، بدايته بالثواني)] حسب مواضع scenes (افتراضياً كل مشاهد الخطة)"""
+        narration = []
+        start = 0.0
+        for spec in plan.scenes if scenes is None else scenes:
+            if spec["narration"]:
+                narration.append((spec["narration"], start + self.NARRATION_LEAD))
+            start += plan.frame_count(spec) / plan.fps
+        return narration
+    
+    def encode_segments(self, plan, output_path, music=None, music_volume=0.3):
+        """ترميز المشاهد الناقصة كمقاطع في SegmentCache وتجميع الكل بدون إعادة ترميز الفيديو"""
+        size, fps, profile = plan.size, plan.fps, plan.profile
+        encoder_settings = plan.encoder_settings()
+        keys = [self.segment_cache.key(spec, size, encoder_settings, self.LAYOUT_VERSION) for spec in plan]
+        # المقاطع مثبتة في المخزن حتى ينتهي التجميع، فلا يحذفها collect من خيط آخر
+        cached = [self.segment_cache.get(key, pin=True) for key in keys]
+        pending = [spec for spec, path in zip(plan, cached) if path is None]
+        pinned = [path for path in cached if path is not None]
+        
+        try:
+            # المشاهد المرمّزة فعلاً، لحساب مواضع التعليق والمدة
+            kept = []
+            paths = []
+            slides = self.stream_slides(pending, size)
+            with tempfile.TemporaryDirectory(prefix="segments_", dir=self.temp_dir) as work_dir:
+                try:
+                    for i, (spec, key, path) in enumerate(zip(plan, keys, cached)):
+                        if path is None:
+                            slide = next(slides)
+                            if slide is None:
+                                plan.failed += 1
+                                if not spec["fallback"]:
+                                    continue
+                                # مشهد بديل بلون ثابت، لا يُخزّن لأن اللون عشوائي
+                                slide, key = random.choice(self.background_colors), None
+                            
+                            encode = lambda path, slide=slide, spec=spec: self.still_encoder.encode_segment(
+                                slide, spec["duration"], size, path, fps=fps, profile=profile)
+                            if key is not None:
+                                path = self.segment_cache.put(key, encode, pin=True)
+                                pinned.append(path)
+                            else:
+                                path = os.path.join(work_dir, f"{i:04d}.mp4")
+                                encode(path)
+                        kept.append(spec)
+                        paths.append(path)
+                finally:
+                    slides.close()
                 
-                scene_slide = self.create_short_slide(text)
-                if scene_slide:
-                    scene_clip = ImageClip(scene_slide, duration=scene_duration)
-                    clips.append(scene_clip)
-                else:
-                    bg_color = random.choice(self.background_colors)
-                    bg_clip = ColorClip(size=size, color=bg_color, duration=scene_duration)
-                    clips.append(bg_clip)
-            
-            # 3. الخاتمة (3 ثوان)
-            outro_text = "🔔 Follow for more!\n@TechCompass"
-            outro_slide = self.create_short_slide(outro_text)
-            if outro_slide:
-                outro_clip = ImageClip(outro_slide, duration=3)
-                clips.append(outro_clip)
-            
-            # تجميع الفيديو
-            if not clips:
-                logger.error("❌ No short clips created")
-                return None
-            
-            video = concatenate_videoclips(clips, method="compose")
-            
-            # حفظ الفيديو
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_path = f"output/short_professional_{timestamp}.mp4"
-            
-            video.write_videofile(
-                output_path,
-                fps=30,
-                codec='libx264',
-                audio_codec='aac',
-                threads=4,
-                preset='fast',
-                verbose=False,
-                logger=None
-            )
-            
-            logger.info(f"✅ Created short video: {output_path} ({video.duration:.1f}s)")
-            return output_path
-            
-        except Exception as e:
-            logger.error(f"❌ Short video creation error: {e}")
-            return None
+                if not paths:
+                    return None
+                logger.info(f"♻️ Segments: {len(plan) - len(pending)} reused, {len(pending)} encoded")
+                total = sum(plan.frame_count(spec) for spec in kept) / fps
+                return self.still_encoder.concat(
+                    paths, output_path, total, music=music, music_volume=music_volume,
+                    narration=self.plan_narration(plan, kept))
+        finally:
+            self.segment_cache.release(pinned)
+    
+    def stream_video(self, plan, output_path, music=None, music_volume=0.3):
+        """ترميز الخطة في تمريرة واحدة: كل شريحة تُرسم عند الحاجة وتُكتب مباشرة في المرمّز
+
+        توقيت الفيديو يُثبّت عند بدء المرمّز، فالمشهد الفاشل يأخذ لوناً ثابتاً حتى بدون fallback.
+        """
+        narration = self.plan_narration(plan)
+        if self.encoder_backend == "ffmpeg":
+            frames = self.scene_frames(plan)
+            try:
+                return self.still_encoder.encode_stream(
+                    frames, [plan.frame_count(spec) for spec in plan], output_path, plan.size, fps=plan.fps,
+                    profile=plan.profile, music=music, music_volume=music_volume, narration=narration)
+            except Exception as e:
+                logger.warning(f"⚠️ Still-image encode failed, falling back to moviepy: {e}")
+            finally:
+                frames.close()
+        
+        frames = self.scene_frames(plan)
+        try:
+            return self.encode_with_moviepy(frames, plan, output_path, music, music_volume, narration)
+        finally:
+            frames.close()
+    
+    def encode_with_moviepy(self, frames, plan, output_path, music=None, music_volume=0.3, narration=None):
+        """ترميز بـ moviepy من شريحة لكل مشهد تصل من frames
+
+        write_videofile يطلب الإطارات بترتيب زمني، فـ make_frame يتقدم في frames مع الزمن ولا
+        يحتفظ إلا بشريحة المشهد الحالي، بدلاً من ImageClip لكل مشهد في concatenate_videoclips.
+        """
+        size, fps, profile = plan.size, plan.fps, plan.profile
+        # رقم أول إطار بعد كل مشهد
+        ends = np.cumsum([plan.frame_count(spec) for spec in plan])
+        current = {"index": -1, "frame": None}
+        
+        def make_frame(t):
+            index = min(int(np.searchsorted(ends, int(round(t * fps)), side='right')), len(ends) - 1)
+            if index < current["index"]:
+                raise ValueError(f"Frame at {t:.3f}s requested after scene {current['index']}")
+            while current["index"] < index:
+                current["frame"] = self.still_encoder.frame_array(next(frames), size)
+                current["index"] += 1
+            return current["frame"]
+        
+        video = moviepy_editor.VideoClip(make_frame, duration=ends[-1] / fps)
+        
+        # إضافة موسيقى خلفية هادئة والتعليق الصوتي
+        tracks = []
+        try:
+            if music:
+                # تكرار وتخفيض بدون فك ترميز: شرائح على الملف المعيّن مضروبة في music_volume
+                tracks.append(self.music_library.audio_clip(music, video.duration, music_volume))
+        except:
+            pass  # الملف غير صالح، نستمر بدون موسيقى
+        for path, start in narration or []:
+            tracks.append(moviepy_editor.AudioFileClip(path).set_start(start))
+        if tracks:
+            video = video.set_audio(moviepy_editor.CompositeAudioClip(tracks).set_duration(video.duration))
+        
+        video.write_videofile(
+            output_path,
+            fps=fps,
+            codec='libx264',
+            audio_codec='aac',
+            threads=profile["threads"],
+            preset=profile["preset"],
+            ffmpeg_params=['-crf', str(profile["crf"]), '-g', str(profile["gop"])],
+            verbose=False,
+            logger=None
+        )
+        return video.duration
     
     def prepare_scenes(self, script, scene_count=15):
         """تحضير المشاهد من السكربت"""
+        scenes = self.script_sentences(script)
+        
+        # إذا كانت المشاهد قليلة، ننشئ مشاهد إضافية
+        while len(scenes) < scene_count:
+            scenes.append(random.choice(self.FILLER_SCENES))
+        
+        return scenes[:scene_count]
+    
+    def script_sentences(self, script):
+        """تقسيم السكربت إلى جمل صالحة كمشاهد"""
         # تقسيم إلى فقرات
         paragraphs = re.split(r'\n\s*\n', script)
         
@@ -592,26 +3733,7 @@ class ProfessionalVideoCreator:
                         if len(sent) > 120:
                             sent = sent[:117] + "..."
                         scenes.append(sent)
-        
-        # إذا كانت المشاهد قليلة، ننشئ مشاهد إضافية
-        if len(scenes) < scene_count:
-            base_scenes = [
-                f"Let's explore this important topic in detail",
-                f"This technology is changing how we work and live",
-                f"Understanding the basics is crucial for success",
-                f"Practical applications make learning more effective",
-                f"Real-world examples help clarify complex concepts",
-                f"Best practices ensure better results",
-                f"Common challenges and how to overcome them",
-                f"Future trends in this technology field",
-                f"How to get started with practical implementation",
-                f"Tips for mastering this technology quickly"
-            ]
-            
-            while len(scenes) < scene_count:
-                scenes.append(random.choice(base_scenes))
-        
-        return scenes[:scene_count]
+        return scenes
     
     def prepare_short_texts(self, script, count=5):
         """تحضير نصوص للشورت"""
@@ -643,35 +3765,670 @@ class ProfessionalVideoCreator:
         duration = word_count * 0.5  # 0.5 ثانية لكل كلمة
         return max(min_dur, min(duration, max_dur))
 
+# منشئ خاص بكل عملية عاملة في مجمع رسم الشرائح
+_worker_creator = None
+
+def render_slide_job(job):
+    """نقطة دخول العمليات العاملة: رسم شريحة واحدة من وصفها؛ تُرجع (النتيجة، أحداث التتبع)"""
+    global _worker_creator
+    if _worker_creator is None:
+        _worker_creator = ProfessionalVideoCreator()
+    try:
+        result = _worker_creator.render_slide(job)
+    except Exception as e:
+        logger.error(f"❌ Slide worker error: {e}")
+        result = None
+    return result, TRACER.drain()
+
+class TokenBucket:
+    """محدد معدل: rate طلب في الثانية مع سماح بدفعة حتى capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """انتظار رمز واحد؛ تُرجع مدة الانتظار بالثواني"""
+        waited = 0.0
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+class GeminiClient:
+    """عميل Gemini مشترك: يحدد النموذج العامل مرة واحدة ويوزع الطلبات المتزامنة
+
+    الطلبات تمر عبر TokenBucket (GEMINI_RPM طلب في الدقيقة) وحد تزامن (GEMINI_CONCURRENCY)،
+    ويُسجل زمن كل طلب ومدة انتظاره بسبب التحديد.
+    """
+
+    MODELS = ('gemini-pro', 'gemini-1.0-pro')
+
+    def __init__(self, api_key, generation_config=None, requests_per_minute=None, max_concurrency=None):
+        self.api_key = api_key
+        self.generation_config = generation_config or {}
+        requests_per_minute = requests_per_minute or float(os.getenv('GEMINI_RPM', '15'))
+        max_concurrency = max_concurrency or int(os.getenv('GEMINI_CONCURRENCY', '4'))
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=max_concurrency)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.resolve_lock = asyncio.Lock()
+        self.model = None
+        self.model_name = None
+        self.latencies = []
+        self.first_chunk_latencies = []
+        self.throttled = 0
+        self.throttle_wait = 0.0
+        self.failures = 0
+
+    async def resolve_model(self):
+        """أول نموذج متاح من MODELS؛ يُحدد مرة واحدة لكل تشغيل"""
+        async with self.resolve_lock:
+            if self.model is not None:
+                return self.model
+            
+            genai.configure(api_key=self.api_key)
+            for name in self.MODELS:
+                try:
+                    await asyncio.to_thread(genai.get_model, f"models/{name}")
+                except Exception as e:
+                    logger.warning(f"⚠️ Gemini model {name} unavailable: {e}")
+                    continue
+                self.model = genai.GenerativeModel(name, generation_config=self.generation_config or None)
+                self.model_name = name
+                logger.info(f"✅ Gemini model: {name}")
+                return self.model
+            
+            # تعذر التحقق (مثلاً خطأ شبكة مؤقت): نستخدم الاسم الأول كما في السابق
+            name = self.MODELS[0]
+            self.model = genai.GenerativeModel(name, generation_config=self.generation_config or None)
+            self.model_name = name
+            return self.model
+
+    async def generate(self, prompt):
+        model = await self.resolve_model()
+        async with self.semaphore:
+            waited = await self.bucket.acquire()
+            if waited > 0:
+                self.throttled += 1
+                self.throttle_wait += waited
+            
+            start = time.perf_counter()
+            try:
+                with TRACER.span("gemini", "llm", model=self.model_name, prompt_chars=len(prompt),
+                                 throttle_s=round(waited, 3)) as span:
+                    response = await model.generate_content_async(prompt)
+                    span.set(response_chars=len(response.text))
+                return response.text
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    async def stream(self, prompt):
+        """مثل generate لكن يُرجع الرد على دفعات نصية فور وصولها (مولد غير متزامن)"""
+        model = await self.resolve_model()
+        async with self.semaphore:
+            waited = await self.bucket.acquire()
+            if waited > 0:
+                self.throttled += 1
+                self.throttle_wait += waited
+            
+            start = time.perf_counter()
+            try:
+                with TRACER.span("gemini", "llm", model=self.model_name, prompt_chars=len(prompt),
+                                 throttle_s=round(waited, 3), stream=True) as span:
+                    response = await model.generate_content_async(prompt, stream=True)
+                    first = True
+                    received = 0
+                    async for chunk in response:
+                        if first:
+                            self.first_chunk_latencies.append(time.perf_counter() - start)
+                            span.set(first_chunk_s=round(self.first_chunk_latencies[-1], 3))
+                            first = False
+                        received += len(chunk.text)
+                        span.set(response_chars=received)
+                        yield chunk.text
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        first_chunk = sorted(self.first_chunk_latencies)
+        return {
+            "requests": len(latencies),
+            "failures": self.failures,
+            "p50_s": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "max_s": round(latencies[-1], 2) if latencies else None,
+            "first_chunk_p50_s": round(first_chunk[len(first_chunk) // 2], 2) if first_chunk else None,
+            "throttled": self.throttled,
+            "throttle_wait_s": round(self.throttle_wait, 2),
+        }
+
+class ResponseCache:
+    """ذاكرة دائمة لردود نموذج اللغة على القرص، مع مدة صلاحية وحد للحجم
+
+    كل رد ملف JSON باسم sha256 للمفتاح (النموذج، الطلب، نوع المحتوى، إعدادات التوليد).
+    bypass يتجاهل القراءة فقط، فالردود الجديدة تُخزّن وتحل محل القديمة.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_dir="cache/responses", ttl_seconds=7 * 24 * 3600,
+                 max_disk_bytes=32 * 1024 * 1024, bypass=False):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, model_name, prompt, content_type, generation_config=None):
+        raw = json.dumps([self.VERSION, model_name, prompt, content_type, generation_config or {}], sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        if self.bypass:
+            self.misses += 1
+            return None
+        
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            self.expired += 1
+            self.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        
+        # تحديث وقت الوصول لترتيب الإخلاء LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["text"]
+
+    def put(self, key, text, **metadata):
+        entry = dict(metadata, text=text, created=time.time())
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self.stores += 1
+        except OSError as e:
+            logger.warning(f"⚠️ Could not cache response: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            full = os.path.join(self.cache_dir, name)
+            if full == keep or not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(full)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, full))
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and os.path.exists(keep):
+            total += os.path.getsize(keep)
+        for _, size, full in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "expired": self.expired, "stores": self.stores}
+
+class StageLimiter:
+    """حد تزامن مثل asyncio.Semaphore لكن الانتظار مرتب حسب الأولوية (الأصغر أولاً)"""
+
+    def __init__(self, limit):
+        self.available = limit
+        self.waiters = []
+        self.counter = 0
+
+    async def acquire(self, priority=0):
+        if self.available > 0 and not self.waiters:
+            self.available -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.counter += 1
+        heapq.heappush(self.waiters, (priority, self.counter, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                # نقل المكان مباشرة للمنتظر التالي دون زيادة available
+                future.set_result(None)
+                return
+        self.available += 1
+
+class WorkflowScheduler:
+    """مجدول مراحل بسيط على شكل رسم اعتماديات
+
+    كل مرحلة دالة async تستقبل نتائج مراحلها السابقة بالترتيب. المراحل المستقلة تعمل معاً،
+    مع حدود منفصلة لمراحل الشبكة ("io") ومراحل الرسم والترميز ("cpu"). إذا فشلت مرحلة
+    أو أرجعت None تُتخطى المراحل المعتمدة عليها، كما في الworkflows الأصلية.
+    """
+
+    def __init__(self, io_limit=None, cpu_limit=None):
+        io_limit = io_limit or int(os.getenv('IO_CONCURRENCY', '4'))
+        cpu_limit = cpu_limit or int(os.getenv('CPU_CONCURRENCY', '1'))
+        self.limiters = {"io": StageLimiter(io_limit), "cpu": StageLimiter(cpu_limit)}
+        self.io_executor = ThreadPoolExecutor(max_workers=io_limit, thread_name_prefix="io")
+        self.stages = {}
+        self.timings = {}
+
+    def add(self, name, func, deps=(), kind="io", priority=0):
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+        self.stages[name] = {"func": func, "deps": tuple(deps), "kind": kind, "priority": priority}
+        return name
+
+    async def blocking(self, func, *args, **kwargs):
+        """تشغيل استدعاء شبكة متزامن (رفع، نشر) في خيط حتى لا يوقف حلقة الأحداث"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, lambda: func(*args, **kwargs))
+
+    async def run_stage(self, name, tasks):
+        stage = self.stages[name]
+        inputs = [await tasks[dep] for dep in stage["deps"]]
+        if any(value is None for value in inputs):
+            logger.warning(f"⚠️ Skipping {name}: a dependency failed")
+            return None
+        
+        limiter = self.limiters[stage["kind"]]
+        await limiter.acquire(stage["priority"])
+        start = time.perf_counter()
+        try:
+            with TRACER.span(name, "stage", kind=stage["kind"]) as span:
+                result = await stage["func"](*inputs)
+                span.set(ok=result is not None)
+            return result
+        except Exception as e:
+            logger.error(f"❌ Stage {name} failed: {e}")
+            return None
+        finally:
+            limiter.release()
+            self.timings[name] = time.perf_counter() - start
+
+    async def run(self):
+        """تشغيل كل المراحل وإرجاع قاموس النتائج"""
+        start = time.perf_counter()
+        tasks = {}
+        # المراحل تُضاف بعد اعتمادياتها، فالترتيب هنا صالح دائماً
+        for name in self.stages:
+            # اسم المهمة هو اسم المرحلة، فيظهر كمسار في ملف التتبع
+            tasks[name] = asyncio.ensure_future(self.run_stage(name, tasks))
+            tasks[name].set_name(name)
+        results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+        
+        busy = sum(self.timings.values())
+        logger.info(f"⏱️ {len(self.stages)} stages in {time.perf_counter() - start:.1f}s "
+                    f"({busy:.1f}s of stage time)")
+        return results
+
+    async def cpu(self, func, *args, priority=0):
+        """عمل رسم قصير من داخل مرحلة أخرى تحت نفس حد مراحل cpu"""
+        limiter = self.limiters["cpu"]
+        await limiter.acquire(priority)
+        try:
+            return await func(*args)
+        finally:
+            limiter.release()
+
+    def close(self):
+        self.io_executor.shutdown(wait=True)
+
+class NearDuplicateIndex:
+    """فهرس تشابه تقريبي بـ MinHash و LSH لنصوص المواضيع والسكربتات
+
+    النص يُقسم إلى مقاطع حرفية بطول shingle_size تُحسب بصماتها دفعة واحدة بـ NumPy، ثم
+    توقيع MinHash بطول num_perm. البحث يمر على الدلاء المشتركة في bands نطاقاً فقط،
+    ثم يقارن التوقيعات المرشحة لتقدير تشابه Jaccard.
+    """
+
+    def __init__(self, threshold=0.7, num_perm=128, bands=32, shingle_size=5, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # تجزئة multiply-shift: أعلى 32 بت من (a*x + b) mod 2^64، مع a فردي
+        self.a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self.powers = np.uint64(257) ** np.arange(shingle_size - 1, -1, -1, dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = np.zeros((64, num_perm), dtype=np.uint32)
+        self.labels = []
+        # مفتاح اختياري لكل عنصر (بصمة نص السكربت) لاستبعاد تطابق النص مع نفسه
+        self.keys = []
+        self.key_set = set()
+
+    def shingles(self, text):
+        normalized = " ".join(re.findall(r"\w+", text.lower()))
+        data = np.frombuffer(normalized.encode('utf-8'), dtype=np.uint8)
+        if len(data) < self.shingle_size:
+            data = np.pad(data, (0, self.shingle_size - len(data)))
+        windows = np.lib.stride_tricks.sliding_window_view(data, self.shingle_size).astype(np.uint64)
+        return np.unique(windows @ self.powers)
+
+    def signature(self, text):
+        shingles = self.shingles(text)
+        hashed = (shingles[:, None] * self.a[None, :] + self.b[None, :]) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, label, signature, key=None):
+        index = len(self.labels)
+        if index == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+        self.signatures[index] = signature
+        self.labels.append(label)
+        self.keys.append(key)
+        if key is not None:
+            self.key_set.add(key)
+        for band, key in enumerate(self.band_keys(signature)):
+            self.buckets[band].setdefault(key, []).append(index)
+
+    def query(self, signature, exclude=None):
+        """أقرب عنصر سابق: (التشابه المقدر، label) أو (0.0, None)؛ العناصر بمفتاح exclude لا تُحسب"""
+        candidates = set()
+        for band, key in enumerate(self.band_keys(signature)):
+            candidates.update(self.buckets[band].get(key, ()))
+        if exclude is not None:
+            candidates = {index for index in candidates if self.keys[index] != exclude}
+        if not candidates:
+            return 0.0, None
+        
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self.signatures[candidates] == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        return float(similarity[best]), self.labels[candidates[best]]
+
+    def contains(self, key):
+        return key in self.key_set
+
+    def is_duplicate(self, text):
+        similarity, _ = self.query(self.signature(text))
+        return similarity >= self.threshold
+
+    def __len__(self):
+        return len(self.labels)
+
+class ContentLedger:
+    """سجل المحتوى في SQLite: المواضيع، الطلبات والسكربتات، الملفات المرسومة ونتائج النشر
+
+    يعمل بوضع WAL مع فهارس على كل أعمدة البحث، و claim_topic يحجز موضوعاً داخل معاملة
+    BEGIN IMMEDIATE فلا يحصل تشغيلان متوازيان على نفس الموضوع.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS topics (
+            id INTEGER PRIMARY KEY,
+            topic TEXT NOT NULL UNIQUE,
+            claimed_at REAL NOT NULL,
+            source TEXT
+        );
+        CREATE TABLE IF NOT EXISTS contents (
+            id INTEGER PRIMARY KEY,
+            topic_id INTEGER NOT NULL REFERENCES topics(id),
+            content_type TEXT NOT NULL,
+            model TEXT,
+            prompt_hash TEXT,
+            script_hash TEXT NOT NULL,
+            fallback INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS contents_topic ON contents(topic_id, content_type);
+        CREATE INDEX IF NOT EXISTS contents_script ON contents(script_hash);
+        CREATE TABLE IF NOT EXISTS artifacts (
+            id INTEGER PRIMARY KEY,
+            topic_id INTEGER NOT NULL REFERENCES topics(id),
+            kind TEXT NOT NULL,
+            path TEXT NOT NULL,
+            bytes INTEGER,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS artifacts_topic ON artifacts(topic_id, kind);
+        CREATE TABLE IF NOT EXISTS publications (
+            id INTEGER PRIMARY KEY,
+            topic_id INTEGER NOT NULL REFERENCES topics(id),
+            platform TEXT NOT NULL,
+            url TEXT,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS publications_topic ON publications(topic_id, platform);
+        CREATE TABLE IF NOT EXISTS signatures (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            label TEXT NOT NULL,
+            signature BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            script_hash TEXT
+        );
+        CREATE INDEX IF NOT EXISTS signatures_kind ON signatures(kind);
+    """
+
+    def __init__(self, path="cache/ledger.db", legacy_topics_path="output/used_topics.txt"):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # اتصال واحد يُستخدم من حلقة الأحداث وخيوط الرفع، محمي بقفل
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        # script_hash أُضيف بعد إنشاء جدول signatures في سجلات سابقة
+        if "script_hash" not in [row[1] for row in self.db.execute("PRAGMA table_info(signatures)")]:
+            self.db.execute("ALTER TABLE signatures ADD COLUMN script_hash TEXT")
+        if legacy_topics_path:
+            self.import_topics_file(legacy_topics_path)
+
+    def transaction(self, func, *args):
+        """تنفيذ func(cursor, ...) داخل معاملة BEGIN IMMEDIATE"""
+        with self.lock:
+            cursor = self.db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(cursor, *args)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return result
+
+    def import_topics_file(self, path):
+        """استيراد used_topics.txt القديم مرة واحدة"""
+        def run(cursor):
+            if cursor.execute("SELECT 1 FROM meta WHERE key = 'imported_topics_file'").fetchone():
+                return 0
+            with open(path, 'r') as f:
+                topics = [(line.strip(), now) for line in f if line.strip()]
+            cursor.executemany(
+                "INSERT OR IGNORE INTO topics (topic, claimed_at, source) VALUES (?, ?, 'used_topics.txt')", topics)
+            cursor.execute("INSERT INTO meta (key, value) VALUES ('imported_topics_file', ?)", (path,))
+            return len(topics)
+        
+        if not os.path.exists(path):
+            return 0
+        now = time.time()
+        count = self.transaction(run)
+        if count:
+            logger.info(f"📒 Imported {count} topics from {path}")
+        return count
+
+    def claim_topic(self, candidates, fallback, source=None, accept=None):
+        """حجز موضوع غير مستخدم عشوائياً من candidates، أو fallback إذا استُخدمت كلها
+
+        accept(topic) اختياري لرفض مواضيع إضافية (مثل المواضيع شبه المكررة).
+        """
+        def run(cursor):
+            placeholders = ",".join("?" * len(candidates))
+            used = {row[0] for row in cursor.execute(
+                f"SELECT topic FROM topics WHERE topic IN ({placeholders})", candidates)}
+            available = [topic for topic in candidates if topic not in used and (accept is None or accept(topic))]
+            topic = random.choice(available) if available else fallback
+            cursor.execute("INSERT OR IGNORE INTO topics (topic, claimed_at, source) VALUES (?, ?, ?)",
+                           (topic, time.time(), source))
+            return topic
+        return self.transaction(run)
+
+    def is_used(self, topic):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM topics WHERE topic = ?", (topic,)).fetchone() is not None
+
+    def topic_id(self, cursor, topic):
+        cursor.execute("INSERT OR IGNORE INTO topics (topic, claimed_at) VALUES (?, ?)", (topic, time.time()))
+        return cursor.execute("SELECT id FROM topics WHERE topic = ?", (topic,)).fetchone()[0]
+
+    def record_content(self, topic, content_type, text, model=None, prompt=None, fallback=False):
+        script_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest() if prompt else None
+        def run(cursor):
+            cursor.execute(
+                "INSERT INTO contents (topic_id, content_type, model, prompt_hash, script_hash, fallback, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.topic_id(cursor, topic), content_type, model, prompt_hash, script_hash, int(fallback), time.time()))
+        self.transaction(run)
+        return script_hash
+
+    def record_artifact(self, topic, kind, path):
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        def run(cursor):
+            cursor.execute("INSERT INTO artifacts (topic_id, kind, path, bytes, created_at) VALUES (?, ?, ?, ?, ?)",
+                           (self.topic_id(cursor, topic), kind, path, size, time.time()))
+        self.transaction(run)
+
+    def record_publication(self, topic, platform, url):
+        def run(cursor):
+            cursor.execute("INSERT INTO publications (topic_id, platform, url, created_at) VALUES (?, ?, ?, ?)",
+                           (self.topic_id(cursor, topic), platform, url, time.time()))
+        self.transaction(run)
+
+    def add_signature(self, kind, label, signature, script_hash=None):
+        def run(cursor):
+            cursor.execute("INSERT INTO signatures (kind, label, signature, script_hash, created_at) "
+                           "VALUES (?, ?, ?, ?, ?)", (kind, label, signature.tobytes(), script_hash, time.time()))
+        self.transaction(run)
+
+    def signatures(self, kind):
+        with self.lock:
+            return self.db.execute("SELECT label, signature, script_hash FROM signatures WHERE kind = ? ORDER BY id",
+                                   (kind,)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
 class ContentEmpire:
+    # إعدادات التوليد الممررة لـ Gemini (جزء من مفتاح ذاكرة الردود)
+    GENERATION_CONFIG = {}
+    
     def __init__(self):
         self.config = Config()
         self.setup_directories()
-        self.used_topics = set()
-        self.content_history = {"videos": [], "articles": []}
-        self.load_history()
-        self.youtube_uploader = YouTubeUploader()
-        self.blogger_uploader = BloggerUploader()
+        # سجل المواضيع والمحتوى والنشر (يستورد output/used_topics.txt القديم مرة واحدة)
+        self.ledger = ContentLedger()
+        
+        # كشف المواضيع والسكربتات شبه المكررة؛ الفهارس تُبنى من السجل عند أول استخدام
+        script_threshold = float(os.getenv('SCRIPT_DUPLICATE_THRESHOLD', '0.6'))
+        self.duplicate_thresholds = {
+            "topic": float(os.getenv('TOPIC_DUPLICATE_THRESHOLD', '0.7')),
+            "long_video": script_threshold,
+            "short_video": script_threshold,
+        }
+        self.duplicate_indexes = {}
+        self.max_generation_attempts = max(1, int(os.getenv('GENERATION_ATTEMPTS', '3')))
+        # STREAM_SCENES=0 ينتظر السكربت كاملاً قبل رسم أي مشهد
+        self.stream_scenes = os.getenv('STREAM_SCENES', '1').lower() not in ('0', 'false', 'no')
+        # بيانات اعتماد مشتركة تُجدد في الخلفية من بداية التشغيل
+        self.credentials = CredentialManager()
+        self.credentials.start(['YOUTUBE_TOKEN_JSON', 'BLOGGER_TOKEN_JSON'])
+        self.youtube_uploader = YouTubeUploader(credentials=self.credentials)
+        self.blogger_uploader = BloggerUploader(credentials=self.credentials)
         self.video_creator = ProfessionalVideoCreator()
+        # ARTIFACT_EXPORT: أرشيف ArtifactStore يُسترجع في بداية كل تشغيل ويُكتب في نهايته (ذاكرة CI)
+        self.artifact_export = os.getenv('ARTIFACT_EXPORT')
+        # KEEP_OLD_OUTPUTS=1 يُبقي فيديوهات output/ من التشغيلات السابقة
+        self.keep_old_outputs = os.getenv('KEEP_OLD_OUTPUTS', '').lower() in ('1', 'true', 'yes')
+        
+        # LLM_CACHE_BYPASS=1 يفرض طلبات جديدة لـ Gemini (مع تحديث الذاكرة)
+        ttl_hours = float(os.getenv('LLM_CACHE_TTL_HOURS', '168'))
+        bypass = os.getenv('LLM_CACHE_BYPASS', '').lower() in ('1', 'true', 'yes')
+        self.response_cache = ResponseCache(ttl_seconds=ttl_hours * 3600, bypass=bypass)
+        # المحتوى البديل يُخزّن منفصلاً حتى لا يُقرأ أبداً كرد من Gemini
+        self.fallback_cache = ResponseCache("cache/responses/fallback", ttl_seconds=ttl_hours * 3600)
+        
+        self.gemini = None
+        if self.config.GEMINI_API_KEY:
+            self.gemini = GeminiClient(self.config.GEMINI_API_KEY, generation_config=self.GENERATION_CONFIG)
+        # ملخص آخر تشغيل لـ run_stages (يُرسل إلى Telegram)
+        self.last_report = None
     
     def setup_directories(self):
         os.makedirs('output', exist_ok=True)
         os.makedirs('temp', exist_ok=True)
         os.makedirs('assets', exist_ok=True)
     
-    def load_history(self):
-        try:
-            if os.path.exists('output/used_topics.txt'):
-                with open('output/used_topics.txt', 'r') as f:
-                    self.used_topics = set(line.strip() for line in f)
-        except:
-            self.used_topics = set()
-    
-    def save_topic(self, topic):
-        self.used_topics.add(topic)
-        with open('output/used_topics.txt', 'a') as f:
-            f.write(topic + '\n')
-    
     async def get_unique_topic(self):
         topics = [
             "Cloud Computing Explained: AWS vs Azure vs Google Cloud",
@@ -686,33 +4443,120 @@ class ContentEmpire:
             "Augmented Reality in Education Today"
         ]
         
-        available = [t for t in topics if t not in self.used_topics]
-        if available:
-            topic = random.choice(available)
-        else:
-            topic = "Latest Technology Trends 2024 Guide"
-        
-        self.save_topic(topic)
+        with TRACER.span("topic", "topic") as span:
+            index = self.duplicate_index("topic")
+            topic = self.ledger.claim_topic(
+                topics, "Latest Technology Trends 2024 Guide", accept=lambda t: not index.is_duplicate(t))
+            
+            signature = index.signature(topic)
+            if index.query(signature)[0] < index.threshold:
+                self.remember_signature("topic", topic, signature)
+            span.set(topic=topic)
         return topic
     
+    def duplicate_index(self, kind):
+        """فهرس التشابه لنوع معين، محمّل من توقيعات السجل"""
+        if kind not in self.duplicate_indexes:
+            index = NearDuplicateIndex(threshold=self.duplicate_thresholds[kind])
+            for label, signature, script_hash in self.ledger.signatures(kind):
+                index.add(label, np.frombuffer(signature, dtype=np.uint32), key=script_hash)
+            self.duplicate_indexes[kind] = index
+        return self.duplicate_indexes[kind]
+    
+    def remember_signature(self, kind, label, signature, script_hash=None):
+        self.duplicate_index(kind).add(label, signature, key=script_hash)
+        self.ledger.add_signature(kind, label, signature, script_hash=script_hash)
+    
     async def generate_content(self, topic, content_type="long_video"):
-        try:
-            if not self.config.GEMINI_API_KEY:
-                return self.get_fallback_content(topic, content_type)
+        text, _ = await self.request_content(topic, content_type)
+        return text
+    
+    async def generate_unique_content(self, topic, content_type, prerenderer=None):
+        """توليد سكربت مع إعادة التوليد إذا شابه سكربتاً سابقاً
+
+        prerenderer (ScenePrerenderer) يستقبل السكربت أثناء وصوله ويبدأ تعليقاته؛ ترميز مشاهده
+        يبدأ بعد قبول السكربت هنا (approve)، ويبدأ من جديد مع كل محاولة.
+        """
+        index = self.duplicate_index(content_type)
+        for attempt in range(self.max_generation_attempts):
+            on_text = None
+            if prerenderer is not None:
+                prerenderer.restart()
+                on_text = prerenderer.feed
+            text, fallback = await self.request_content(topic, content_type, variant=attempt, on_text=on_text)
+            if prerenderer is not None and prerenderer.text != text:
+                # رد من الذاكرة أو محتوى بديل لم يصل على دفعات
+                prerenderer.restart()
+                prerenderer.feed(text)
+            if fallback:
+                # المحتوى البديل قالب ثابت، فإعادة توليده لا تغير شيئاً
+                if prerenderer is not None:
+                    prerenderer.approve()
+                return text
             
-            genai.configure(api_key=self.config.GEMINI_API_KEY)
+            signature = index.signature(text)
+            # نفس النص بالضبط (رد من الذاكرة في إعادة تشغيل) لا يُقارن بتوقيعه المحفوظ من المرة الأولى؛
+            # سكربتات نفس الموضوع في أيام سابقة تُقارن كغيرها
+            script_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            similarity, label = index.query(signature, exclude=script_hash)
+            if similarity < index.threshold:
+                break
+            logger.warning(f"⚠️ {content_type} script is {similarity:.0%} similar to '{label}', regenerating")
+        else:
+            logger.warning(f"⚠️ Keeping {content_type} script after {self.max_generation_attempts} attempts")
+        
+        if not index.contains(script_hash):
+            self.remember_signature(content_type, topic, signature, script_hash)
+        if prerenderer is not None:
+            prerenderer.approve()
+        return text
+    
+    async def request_content(self, topic, content_type, variant=0, on_text=None):
+        """طلب محتوى من Gemini؛ تُرجع (النص، هل هو محتوى بديل)
+
+        مع on_text يُطلب الرد على دفعات وتُمرر كل دفعة إليها فور وصولها.
+        """
+        try:
+            if self.gemini is None:
+                return self.fallback_content(topic, content_type), True
             
-            # استخدام النموذج المتاح
-            try:
-                model = genai.GenerativeModel('gemini-pro')
-            except:
-                try:
-                    model = genai.GenerativeModel('gemini-1.0-pro')
-                except:
-                    return self.get_fallback_content(topic, content_type)
+            await self.gemini.resolve_model()
+            prompt = self.content_prompt(topic, content_type, variant)
+            key = self.response_cache.key(self.gemini.model_name, prompt, content_type, self.GENERATION_CONFIG)
+            text = self.response_cache.get(key)
+            if text is not None:
+                logger.info(f"♻️ Cached {content_type} response for: {topic}")
+            elif on_text is not None:
+                chunks = []
+                async for chunk in self.gemini.stream(prompt):
+                    chunks.append(chunk)
+                    on_text(chunk)
+                text = "".join(chunks)
+                if text.strip():
+                    self.response_cache.put(key, text, model=self.gemini.model_name, content_type=content_type, topic=topic)
+            else:
+                text = await self.gemini.generate(prompt)
+                if text.strip():
+                    self.response_cache.put(key, text, model=self.gemini.model_name, content_type=content_type, topic=topic)
             
-            if content_type == "long_video":
-                prompt = f"""Create a comprehensive YouTube tutorial script about: "{topic}"
+            self.ledger.record_content(topic, content_type, text, model=self.gemini.model_name, prompt=prompt)
+            return text, False
+                
+        except Exception as e:
+            logger.error(f"❌ Content generation error: {e}")
+            return self.fallback_content(topic, content_type), True
+    
+    def content_prompt(self, topic, content_type, variant=0):
+        prompt = self.base_prompt(topic, content_type)
+        if variant:
+            # طلب زاوية مختلفة بعد رفض سكربت شبه مكرر
+            prompt += (f"\n                - Take a different angle than a standard overview (variation {variant}): "
+                       f"new examples, a different structure and fresh wording")
+        return prompt
+    
+    def base_prompt(self, topic, content_type):
+        if content_type == "long_video":
+            return f"""Create a comprehensive YouTube tutorial script about: "{topic}"
 
                 Requirements:
                 - 800+ words
@@ -721,12 +4565,9 @@ class ContentEmpire:
                 - Include real examples
                 - Engaging spoken style
                 - End with call to action"""
-                
-                response = await model.generate_content_async(prompt)
-                return response.text
-                
-            elif content_type == "blog":
-                prompt = f"""Write a detailed blog post about: "{topic}"
+            
+        elif content_type == "blog":
+            return f"""Write a detailed blog post about: "{topic}"
 
                 Requirements:
                 - 1200+ words
@@ -734,12 +4575,9 @@ class ContentEmpire:
                 - Include bullet points
                 - Practical tips included
                 - Beginner friendly"""
-                
-                response = await model.generate_content_async(prompt)
-                return response.text
-            
-            else:  # short video
-                prompt = f"""Create an engaging YouTube Short script about: "{topic}"
+        
+        else:  # short video
+            return f"""Create an engaging YouTube Short script about: "{topic}"
 
                 Requirements:
                 - Maximum 80 words
@@ -747,13 +4585,14 @@ class ContentEmpire:
                 - One key insight
                 - High energy
                 - Call to action"""
-                
-                response = await model.generate_content_async(prompt)
-                return response.text
-                
-        except Exception as e:
-            logger.error(f"❌ Content generation error: {e}")
-            return self.get_fallback_content(topic, content_type)
+    
+    def fallback_content(self, topic, content_type):
+        """المحتوى البديل، مع تسجيله في ذاكرة منفصلة عن ردود Gemini"""
+        text = self.get_fallback_content(topic, content_type)
+        key = self.fallback_cache.key("fallback", topic, content_type)
+        self.fallback_cache.put(key, text, content_type=content_type, topic=topic)
+        self.ledger.record_content(topic, content_type, text, fallback=True)
+        return text
     
     def get_fallback_content(self, topic, content_type):
         if content_type == "long_video":
@@ -821,60 +4660,246 @@ Emerging trends and developments to watch.
         else:  # short video
             return f"Tech tip! {topic.split(':')[0] if ':' in topic else topic} ⚡\n\nQuick insight to improve your skills!\n\nFollow for daily tech tips! 🔔"
     
-    async def run_12_00_workflow(self):
-        try:
-            logger.info("🚀 Starting 12:00 workflow")
-            
+    def add_long_video_stages(self, scheduler):
+        """مراحل 12:00: فيديو طويل ومقال مرتبط به"""
+        async def select_topic():
             topic = await self.get_unique_topic()
             logger.info(f"📝 Topic: {topic}")
-            
-            # توليد المحتوى
-            video_script = await self.generate_content(topic, "long_video")
-            blog_content = await self.generate_content(topic, "blog")
-            
-            # إنشاء فيديو محترف
-            video_path = await self.video_creator.create_long_video(topic, video_script)
-            
-            if video_path and os.path.exists(video_path):
-                # تحقق من مدة الفيديو
-                try:
-                    video_clip = VideoFileClip(video_path)
-                    duration = video_clip.duration
-                    video_clip.close()
-                    
-                    logger.info(f"📏 Video duration: {duration:.1f} seconds")
-                    
-                    if duration < 300:  # أقل من 5 دقائق
-                        logger.warning("⚠️ Video too short, extending...")
-                        # إنشاء فيديو أطول
-                        extended_script = video_script + "\n\n" + self.get_extended_content(topic)
-                        video_path = await self.video_creator.create_long_video(topic, extended_script)
-                except:
-                    pass
-                
-                # رفع الفيديو
-                youtube_url = self.youtube_uploader.upload_video(
-                    video_path, 
-                    f"{topic} - Complete Tutorial 2024", 
-                    f"Learn everything about {topic} in this comprehensive tutorial.\n\n"
-                    f"Topics covered: Basics, Applications, Benefits, Future Trends.\n\n"
-                    f"Subscribe for more: {self.config.YOUTUBE_CHANNEL_URL}\n"
-                    f"Blog: {self.config.BLOGGER_BLOG_URL}\n\n"
-                    f"#Tech #Education #Tutorial #Technology"
-                )
-                
-                if youtube_url:
-                    # نشر المقال
-                    blog_url = self.blogger_uploader.publish_post(
-                        f"Complete Guide: {topic}",
-                        blog_content + f'\n\n<div style="text-align: center; margin: 30px 0;">'
-                        f'<a href="{youtube_url}" style="background: #ff0000; color: white; padding: 12px 24px; '
-                        f'border-radius: 5px; text-decoration: none; font-weight: bold; font-size: 18px;">'
-                        f'▶️ Watch Video Tutorial Here</a></div>'
-                    )
-            
-            logger.info("✅ 12:00 workflow completed")
-            
+            return topic
+        
+        async def extra_text(topic):
+            # يُختار مرة واحدة حتى يرسم السكربت والفيديو نفس المشاهد
+            return self.get_extended_content(topic)
+        
+        async def script(topic, extended):
+            prerenderer = None
+            if self.stream_scenes:
+                prerenderer = self.video_creator.scene_prerenderer(
+                    topic, extra_text=extended, run=lambda func, *args: scheduler.cpu(func, *args, priority=0))
+            try:
+                return await self.generate_unique_content(topic, "long_video", prerenderer=prerenderer)
+            finally:
+                if prerenderer is not None:
+                    await prerenderer.finish()
+        
+        async def narrate(topic, video_script, extended):
+            # التعليق الصوتي لكل المشاهد بالتوازي؛ الخطة الناتجة (5 دقائق على الأقل) تأخذ مددها منه
+            return await self.video_creator.plan_narrated_long_video(topic, video_script, extra_text=extended)
+        
+        async def render(topic, video_script, plan):
+            # إنشاء فيديو محترف من الخطة الجاهزة
+            video_path = await self.video_creator.create_long_video(topic, video_script, plan=plan)
+            if not video_path or not os.path.exists(video_path):
+                return None
+            self.ledger.record_artifact(topic, "long_video", video_path)
+            return video_path
+        
+        async def upload(topic, video_path):
+            # رفع الفيديو
+            youtube_url = await scheduler.blocking(
+                self.youtube_uploader.upload_video,
+                video_path, 
+                f"{topic} - Complete Tutorial 2024", 
+                f"Learn everything about {topic} in this comprehensive tutorial.\n\n"
+                f"Topics covered: Basics, Applications, Benefits, Future Trends.\n\n"
+                f"Subscribe for more: {self.config.YOUTUBE_CHANNEL_URL}\n"
+                f"Blog: {self.config.BLOGGER_BLOG_URL}\n\n"
+                f"#Tech #Education #Tutorial #Technology"
+            )
+            # النتيجة تُسجل حتى عند الفشل (url فارغ)
+            self.ledger.record_publication(topic, "youtube", youtube_url)
+            return youtube_url
+        
+        async def publish(topic, blog_content, youtube_url):
+            # نشر المقال
+            blog_url = await scheduler.blocking(
+                self.blogger_uploader.publish_post,
+                f"Complete Guide: {topic}",
+                blog_content + f'\n\n<div style="text-align: center; margin: 30px 0;">'
+                f'<a href="{youtube_url}" style="background: #ff0000; color: white; padding: 12px 24px; '
+                f'border-radius: 5px; text-decoration: none; font-weight: bold; font-size: 18px;">'
+                f'▶️ Watch Video Tutorial Here</a></div>'
+            )
+            self.ledger.record_publication(topic, "blogger", blog_url)
+            return blog_url
+        
+        async def music():
+            # فك موسيقى الخلفية الجديدة أو المتغيرة أثناء انتظار Gemini بدلاً من وقت الترميز
+            return await scheduler.blocking(self.video_creator.music_library.refresh)
+        
+        scheduler.add("long.topic", select_topic)
+        scheduler.add("long.music", music)
+        scheduler.add("long.extra", extra_text, deps=["long.topic"])
+        # المشاهد تُرسم أثناء وصول السكربت، كل مشهد تحت حد مراحل cpu
+        scheduler.add("long.script", script, deps=["long.topic", "long.extra"])
+        scheduler.add("long.blog", lambda topic: self.generate_content(topic, "blog"), deps=["long.topic"])
+        # الفيديو الطويل هو المسار الحرج، فيأخذ المعالج قبل الشورتس
+        scheduler.add("long.narration", narrate, deps=["long.topic", "long.script", "long.extra"])
+        scheduler.add("long.render", render, deps=["long.topic", "long.script", "long.narration"], kind="cpu", priority=0)
+        scheduler.add("long.upload", upload, deps=["long.topic", "long.render"])
+        scheduler.add("long.publish", publish, deps=["long.topic", "long.blog", "long.upload"])
+    
+    def add_short_video_stages(self, scheduler, prefix, title, description):
+        """مراحل شورت واحد: موضوع، سكربت، رسم، رفع"""
+        async def select_topic():
+            return await self.get_unique_topic()
+        
+        async def narrate(topic, short_script):
+            return await self.video_creator.plan_narrated_short_video(topic, short_script)
+        
+        async def render(topic, short_script, plan):
+            video_path = await self.video_creator.create_short_video(topic, short_script, plan=plan)
+            if not video_path or not os.path.exists(video_path):
+                return None
+            self.ledger.record_artifact(topic, "short_video", video_path)
+            return video_path
+        
+        async def upload(topic, video_path):
+            youtube_url = await scheduler.blocking(
+                self.youtube_uploader.upload_video, video_path, title(topic), description(topic))
+            self.ledger.record_publication(topic, "youtube", youtube_url)
+            return youtube_url
+        
+        scheduler.add(f"{prefix}.topic", select_topic)
+        scheduler.add(f"{prefix}.script", lambda topic: self.generate_unique_content(topic, "short_video"),
+                      deps=[f"{prefix}.topic"])
+        scheduler.add(f"{prefix}.narration", narrate, deps=[f"{prefix}.topic", f"{prefix}.script"])
+        scheduler.add(f"{prefix}.render", render, deps=[f"{prefix}.topic", f"{prefix}.script", f"{prefix}.narration"],
+                      kind="cpu", priority=1)
+        scheduler.add(f"{prefix}.upload", upload, deps=[f"{prefix}.topic", f"{prefix}.render"])
+    
+    def add_short_14_00_stages(self, scheduler):
+        self.add_short_video_stages(
+            scheduler, "short1",
+            lambda topic: f"{topic} - Quick Tip! 🔥 #Shorts",
+            lambda topic: f"Quick tech tip about {topic.split(':')[0] if ':' in topic else topic}! "
+                          f"Perfect for quick learning. Follow for more!\n\n"
+                          f"#Shorts #Tech #Tips #Technology #Learning"
+        )
+    
+    def add_short_16_00_stages(self, scheduler):
+        self.add_short_video_stages(
+            scheduler, "short2",
+            lambda topic: f"{topic} Explained! ⚡ #Shorts",
+            lambda topic: f"Understanding {topic.split(':')[0] if ':' in topic else topic} made simple! "
+                          f"Quick and educational content.\n\n"
+                          f"#Shorts #Tech #Explained #Education #Tutorial"
+        )
+    
+    async def run_stages(self, label, *add_stages):
+        scheduler = WorkflowScheduler()
+        slug = re.sub(r'\W+', '_', label).strip('_')
+        try:
+            for add in add_stages:
+                add(scheduler)
+            await asyncio.to_thread(self.begin_artifacts, f"{slug}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            # المعايرة قبل المراحل حتى لا ينافسها الرسم على المعالج فتفسد قياساتها
+            await asyncio.to_thread(self.video_creator.tune_encoders)
+            logger.info(f"🚀 Starting {label}")
+            since = TRACER.mark()
+            before = TRACER.counters()
+            results = await scheduler.run()
+            logger.info(f"🗄️ LLM response cache: {self.response_cache.stats()}")
+            logger.info(f"🎵 Music library: {self.video_creator.music_library.stats()}")
+            if self.video_creator.narrator is not None:
+                logger.info(f"🎙️ Narration: {self.video_creator.narrator.stats()}")
+            if self.gemini is not None:
+                logger.info(f"🤖 Gemini requests: {self.gemini.stats()}")
+            trace_path = None
+            if TRACER.enabled:
+                trace_path = TRACER.save(f"output/trace_{slug}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json", since)
+            self.last_report = self.run_report(label, results, scheduler.timings, before, since, trace_path)
+            logger.info(f"✅ {label} completed")
+            return results
+        finally:
+            scheduler.close()
+            await asyncio.to_thread(self.finish_artifacts)
+    
+    def begin_artifacts(self, run_id):
+        """استرجاع أرشيف ARTIFACT_EXPORT، حذف فيديوهات التشغيلات السابقة من output/، وبدء مراجع التشغيل"""
+        store = self.video_creator.artifact_store
+        if self.artifact_export and os.path.exists(self.artifact_export):
+            start = time.perf_counter()
+            restored = store.restore(self.artifact_export)
+            logger.info(f"📦 Restored {restored} artifacts from {self.artifact_export} "
+                        f"in {time.perf_counter() - start:.1f}s")
+        if not self.keep_old_outputs:
+            # الفيديو نفسه يبقى في المخزن؛ output/ فيه ما ينتجه هذا التشغيل فقط
+            removed = 0
+            for name in os.listdir('output'):
+                if name.endswith('.mp4'):
+                    try:
+                        os.remove(os.path.join('output', name))
+                        removed += 1
+                    except OSError:
+                        pass
+            if removed:
+                logger.info(f"🧹 Removed {removed} videos of earlier runs from output/")
+        store.begin_run(run_id)
+    
+    def finish_artifacts(self):
+        """حفظ مراجع التشغيل وتطبيق حد ArtifactStore، ثم كتابة أرشيف ARTIFACT_EXPORT"""
+        store = self.video_creator.artifact_store
+        try:
+            removed, freed = store.end_run()
+            if removed:
+                logger.info(f"🗑️ Evicted {removed} artifacts ({freed / 1e6:.0f} MB)")
+            logger.info(f"🗃️ Artifact store: {store.stats()}")
+            if self.artifact_export:
+                count, size = store.export(self.artifact_export)
+                logger.info(f"📦 Exported {count} artifacts ({size / 1e6:.0f} MB) to {self.artifact_export}")
+        except Exception as e:
+            logger.warning(f"⚠️ Artifact store maintenance failed: {e}")
+    
+    def run_report(self, label, results, timings, before, since, trace_path):
+        """ملخص Telegram قصير بأرقام التشغيل الفعلية: مدد الفيديوهات، أبطأ المراحل، المقاطع، الموارد"""
+        wall, cpu, child_cpu, read, written = (b - a for a, b in zip(before, TRACER.counters()))
+        # ru_maxrss بالكيلوبايت على Linux، لهذه العملية فقط
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        
+        lines = [
+            f"🎉 <b>{label[0].upper() + label[1:]}</b> — {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}",
+            f"⏱️ {format_duration(wall)} wall, CPU {format_duration(cpu)} + {format_duration(child_cpu)} in subprocesses",
+            f"🧠 Peak RSS {peak_rss:.0f} MB, I/O {read / 1e6:.0f} MB in / {written / 1e6:.0f} MB out",
+            "",
+        ]
+        for prefix, kind in (("long", "🎬 Long video"), ("short1", "📱 Short #1"), ("short2", "📱 Short #2")):
+            if f"{prefix}.topic" not in results:
+                continue
+            plan, url = results.get(f"{prefix}.narration"), results.get(f"{prefix}.upload")
+            if results.get(f"{prefix}.render") and plan is not None:
+                lines.append(f"{kind}: {format_duration(plan.duration)}, {len(plan)} scenes → "
+                             f"{url or 'upload failed'}")
+            else:
+                failed = next((name for name in timings if name.startswith(f"{prefix}.") and results[name] is None),
+                              "a dependency")
+                lines.append(f"❌ {kind}: failed at {failed}")
+        if "long.publish" in results:
+            lines.append(f"📝 Blog post: {results['long.publish'] or 'publish failed'}")
+        
+        slowest = sorted(timings.items(), key=lambda item: -item[1])[:3]
+        if slowest:
+            lines.append("")
+            lines.append("🐢 Slowest stages: " + ", ".join(f"{name} {format_duration(seconds)}"
+                                                         for name, seconds in slowest))
+        spans = TRACER.summary(since) if TRACER.enabled else {}
+        parts = []
+        for name in ("topic", "gemini", "slide", "encode", "upload", "publish"):
+            entry = spans.get(name)
+            if entry:
+                part = f"{name} {entry['count']}× {format_duration(entry['wall_s'])}"
+                if name == "upload":
+                    part += f" ({entry['bytes_out'] / 1e6:.0f} MB out)"
+                parts.append(part)
+        if parts:
+            lines.append("🔎 Spans: " + ", ".join(parts))
+        if trace_path:
+            lines.append(f"📊 Trace: {os.path.basename(trace_path)}")
+        return "\n".join(lines)
+    
+    async def run_12_00_workflow(self):
+        try:
+            return await self.run_stages("12:00 workflow", self.add_long_video_stages)
         except Exception as e:
             logger.error(f"❌ 12:00 workflow error: {e}")
     
@@ -900,88 +4925,60 @@ Emerging trends and developments to watch.
     
     async def run_14_00_workflow(self):
         try:
-            logger.info("🚀 Starting 14:00 workflow")
-            
-            topic = await self.get_unique_topic()
-            short_script = await self.generate_content(topic, "short_video")
-            
-            # إنشاء شورت
-            video_path = await self.video_creator.create_short_video(topic, short_script)
-            
-            if video_path and os.path.exists(video_path):
-                self.youtube_uploader.upload_video(
-                    video_path,
-                    f"{topic} - Quick Tip! 🔥 #Shorts",
-                    f"Quick tech tip about {topic.split(':')[0] if ':' in topic else topic}! "
-                    f"Perfect for quick learning. Follow for more!\n\n"
-                    f"#Shorts #Tech #Tips #Technology #Learning"
-                )
-            
-            logger.info("✅ 14:00 workflow completed")
-            
+            return await self.run_stages("14:00 workflow", self.add_short_14_00_stages)
         except Exception as e:
             logger.error(f"❌ 14:00 workflow error: {e}")
     
     async def run_16_00_workflow(self):
         try:
-            logger.info("🚀 Starting 16:00 workflow")
-            
-            topic = await self.get_unique_topic()
-            short_script = await self.generate_content(topic, "short_video")
-            
-            # إنشاء شورت ثاني
-            video_path = await self.video_creator.create_short_video(topic, short_script)
-            
-            if video_path and os.path.exists(video_path):
-                self.youtube_uploader.upload_video(
-                    video_path,
-                    f"{topic} Explained! ⚡ #Shorts",
-                    f"Understanding {topic.split(':')[0] if ':' in topic else topic} made simple! "
-                    f"Quick and educational content.\n\n"
-                    f"#Shorts #Tech #Explained #Education #Tutorial"
-                )
-            
-            logger.info("✅ 16:00 workflow completed")
-            
+            return await self.run_stages("16:00 workflow", self.add_short_16_00_stages)
         except Exception as e:
             logger.error(f"❌ 16:00 workflow error: {e}")
     
     async def run_daily_workflow(self):
         try:
-            # تشغيل جميع الworkflows
-            await self.run_12_00_workflow()
-            await asyncio.sleep(3)
-            
-            await self.run_14_00_workflow()
-            await asyncio.sleep(3)
-            
-            await self.run_16_00_workflow()
+            # تشغيل مراحل جميع الworkflows في رسم واحد حتى تتداخل المراحل المستقلة
+            await self.run_stages(
+                "daily workflow",
+                self.add_long_video_stages,
+                self.add_short_14_00_stages,
+                self.add_short_16_00_stages,
+            )
             
-            await self.config.send_telegram_message(f"""
-🎉 <b>Daily Content Production Complete!</b>
-
-✅ <b>Long Tutorial Video:</b> 8-10 minutes with professional slides
-✅ <b>Tech Short #1:</b> 45 seconds with engaging visuals  
-✅ <b>Tech Short #2:</b> 45 seconds with quick insights
-
-<b>Features:</b>
-• Professional dynamic backgrounds
-• Text perfectly within frame
-• No external API dependencies
-• Clean visual design
-• Automatic YouTube & Blogger publishing
-
-🕒 {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}
-""")
+            await self.config.send_telegram_message(self.last_report)
             
         except Exception as e:
             logger.error(f"❌ Daily workflow failed: {e}")
             await self.config.send_telegram_message(f"❌ Daily workflow failed: {str(e)}")
 
+STARTUP_PROFILE.record("import main", time.perf_counter() - _import_start)
+
+def profile_startup():
+    """تقرير --profile-startup: كلفة الإنشاء، ثم كلفة كل ما أُجّل عند أول استخدام"""
+    empire = STARTUP_PROFILE.timed("construct ContentEmpire", ContentEmpire)
+    try:
+        for module in (np, genai, moviepy_editor, requests, google_credentials,
+                       google_auth_requests, googleapiclient_discovery, googleapiclient_http):
+            module._lazy_load()
+        # بدون بيانات اعتماد: قياس تحليل وثيقة الاكتشاف وبناء الخدمة فقط
+        build_service('youtube', 'v3', http=googleapiclient_http.build_http())
+        build_service('blogger', 'v3', http=googleapiclient_http.build_http())
+    finally:
+        empire.video_creator.close()
+    print(STARTUP_PROFILE.report())
+
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        profile_startup()
+        sys.exit(0)
+    
     # التأكد من وجود المجلدات
     for folder in ['output', 'temp', 'assets']:
         os.makedirs(folder, exist_ok=True)
     
     empire = ContentEmpire()
-    asyncio.run(empire.run_daily_workflow())
+    try:
+        asyncio.run(empire.run_daily_workflow())
+    finally:
+        empire.credentials.stop()
+        empire.video_creator.close()
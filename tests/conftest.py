@@ -0,0 +1,5 @@
+import os
+import sys
+
+# الاختبارات تستورد main و benchmark من جذر المستودع، والعمليات العاملة (spawn) ترث هذا المسار
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,57 @@
+"""كشف السكربتات شبه المكررة مع ذاكرة ردود Gemini والموضوع البديل الثابت"""
+import asyncio
+
+import numpy as np
+
+from benchmark import FakeGeminiModel, LocalServices, local_empire, synthetic_script
+from main import ContentLedger
+
+TOPIC = "Latest Technology Trends 2024 Guide"
+
+
+def generate(empire, text, model_name):
+    """سكربت للموضوع البديل من نموذج يرد بـ text دائماً؛ model_name مختلف يعني مفاتيح ذاكرة ردود جديدة"""
+    empire.gemini.model = FakeGeminiModel(text, words_per_s=1e6)
+    empire.gemini.model_name = model_name
+    return asyncio.run(empire.generate_unique_content(TOPIC, "short_video"))
+
+
+def test_cached_reply_is_not_its_own_duplicate_but_same_topic_scripts_are_compared(tmp_path):
+    script = synthetic_script(np.random.default_rng(0))
+    with LocalServices() as services:
+        empire = local_empire(services, str(tmp_path))
+
+        assert generate(empire, script, "day-1") == script
+        requests = empire.gemini.stats()["requests"]
+        # إعادة التشغيل: الرد من الذاكرة يُقبل بدون طلب جديد ولا يُحفظ توقيعه مرتين
+        assert generate(empire, script, "day-1") == script
+        assert empire.gemini.stats()["requests"] == requests
+        assert len(empire.ledger.signatures("short_video")) == 1
+
+        # يوم آخر بنفس الموضوع البديل: نسخة شبه مطابقة تُرفض وتُعاد كل المحاولات
+        generate(empire, script + "\n\nOne more tip before you go.", "day-2")
+        assert empire.gemini.stats()["requests"] == requests + empire.max_generation_attempts
+        assert len(empire.ledger.signatures("short_video")) == 2
+
+
+def test_ledger_adds_script_hash_to_existing_signatures_table(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = ContentLedger(path, legacy_topics_path=None)
+    ledger.db.execute("DROP TABLE signatures")
+    ledger.db.execute("CREATE TABLE signatures (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, label TEXT NOT NULL, "
+                      "signature BLOB NOT NULL, created_at REAL NOT NULL)")
+    ledger.db.execute("INSERT INTO signatures (kind, label, signature, created_at) VALUES ('short_video', 'old', x'00', 0)")
+    ledger.close()
+
+    ledger = ContentLedger(path, legacy_topics_path=None)
+    assert ledger.signatures("short_video") == [("old", b"\x00", None)]
+    ledger.close()
+
+
+def test_generation_attempts_below_one_still_generates_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("GENERATION_ATTEMPTS", "0")
+    script = synthetic_script(np.random.default_rng(1))
+    with LocalServices() as services:
+        empire = local_empire(services, str(tmp_path))
+        assert empire.max_generation_attempts == 1
+        assert generate(empire, script, "day-1") == script
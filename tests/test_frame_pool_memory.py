@@ -0,0 +1,36 @@
+"""ذروة الذاكرة عند رسم الفيديو عبر مخزن الإطارات لا تزيد مع عدد المشاهد"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from benchmark import memory_case
+
+SIZE = (1280, 720)
+SCENES = 5
+SCENE_S = 0.5
+FRAME_MB = SIZE[0] * SIZE[1] * 3 / 1e6
+# الفرق المسموح بين N و 4N مشهداً: إطاران؛ إطار زائد لكل مشهد يعطي 15 إطاراً
+MAX_GROWTH_MB = 2 * FRAME_MB
+
+
+def peak_rss_growth(mode, work_dir):
+    """ذروة RSS لـ 4N مشهداً ناقص ذروتها لـ N، كل فيديو في عملية جديدة (spawn) فالذروة له وحده"""
+    peaks = []
+    for scenes in (SCENES, 4 * SCENES):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            peaks.append(pool.submit(memory_case, mode, scenes, SCENE_S, SIZE, str(work_dir)).result()["peak_rss_mb"])
+    return peaks[1] - peaks[0]
+
+
+@pytest.mark.parametrize("mode", ["pool ffmpeg", "pool segments", "pool moviepy"])
+def test_peak_memory_independent_of_scene_count(mode, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    growth = peak_rss_growth(mode, tmp_path)
+    assert growth < MAX_GROWTH_MB, f"{mode}: peak RSS grew {growth:.1f} MB from {SCENES} to {4 * SCENES} scenes"
+
+
+def test_measurement_detects_growth(tmp_path, monkeypatch):
+    """المسار القديم (كل الشرائح في الذاكرة مع compose) يتجاوز نفس الحد، فالقياس حساس بما يكفي"""
+    monkeypatch.chdir(tmp_path)
+    assert peak_rss_growth("compose", tmp_path) > MAX_GROWTH_MB
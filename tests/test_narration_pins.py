@@ -0,0 +1,53 @@
+"""تثبيت مقاطع التعليق يُنهى مرة لكل مقطع ثبّتته الخطة، لا مرة لكل مشهد"""
+import asyncio
+
+import numpy as np
+
+from benchmark import local_store, synthetic_script
+from main import NarrationCache, Narrator, OfflineTTSBackend, ProfessionalVideoCreator
+
+
+def narrated_creator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    creator = local_store(ProfessionalVideoCreator(), str(tmp_path / "artifacts"))
+    creator.narrator = Narrator(OfflineTTSBackend(), NarrationCache(creator.artifact_store))
+    return creator
+
+
+def test_repeated_scenes_release_each_clip_once(tmp_path, monkeypatch):
+    creator = narrated_creator(tmp_path, monkeypatch)
+    store = creator.artifact_store
+    script = synthetic_script(np.random.default_rng(0), paragraphs=1, sentences=2)
+    plan = asyncio.run(creator.plan_narrated_long_video("Cloud Computing", script, min_duration=120))
+    texts = [scene["text"] for scene in plan]
+    assert len(texts) > len(set(texts))
+
+    # مستدعٍ آخر يحمل أحد المقاطع المتكررة
+    repeated = next(text for text in texts if texts.count(text) > 1)
+    shared = next(scene["narration"] for scene in plan if scene["text"] == repeated)
+    assert store.pin(shared)
+    creator.release_narration(plan)
+    assert store.pins == {shared: 1}
+
+
+def test_dropped_texts_are_released_during_planning(tmp_path, monkeypatch):
+    creator = narrated_creator(tmp_path, monkeypatch)
+    store = creator.artifact_store
+    script = synthetic_script(np.random.default_rng(1), paragraphs=1, sentences=4)
+    builds = []
+
+    def build(narration):
+        plan = creator.plan_short_video("Cloud Computing", script, narration=narration)
+        # بعد أول تركيب تخرج آخر جملة من الخطة كما يحدث عند تغير المدد
+        if narration:
+            plan.scenes = plan.scenes[:-2] + plan.scenes[-1:]
+        builds.append([scene["text"] for scene in plan])
+        return plan
+
+    plan = asyncio.run(creator.narrated_plan(build))
+    dropped = set(builds[0]) - set(builds[-1])
+    assert dropped
+    assert len(plan.narration_pins) == len(set(builds[-1]))
+    assert set(store.pins) == set(plan.narration_pins)
+    creator.release_narration(plan)
+    assert store.pins == {}
@@ -0,0 +1,45 @@
+"""ترميز مشاهد السكربت أثناء وصوله ينتظر قبول السكربت في كشف التكرار"""
+import asyncio
+
+import numpy as np
+
+from benchmark import local_store, synthetic_script
+from main import ProfessionalVideoCreator, ScenePrerenderer
+
+
+async def settle(prerenderer):
+    while prerenderer.worker is not None and not prerenderer.worker.done():
+        await prerenderer.worker
+
+
+def test_script_scenes_are_encoded_only_after_approval(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    creator = local_store(ProfessionalVideoCreator(), str(tmp_path / "artifacts"))
+    creator.narrator = None
+    encoded = []
+
+    async def prerender_scene(spec, key, size, fps, profile):
+        encoded.append((spec["slide_type"], spec["text"]))
+        return True
+    monkeypatch.setattr(creator, "prerender_scene", prerender_scene)
+    rng = np.random.default_rng(0)
+    rejected, accepted = synthetic_script(rng), synthetic_script(rng)
+
+    async def run():
+        prerenderer = ScenePrerenderer(creator, "Cloud Computing")
+        prerenderer.feed(rejected)
+        await settle(prerenderer)
+        # المقدمة والخاتمة لا تعتمدان على السكربت؛ مشاهد السكربت المرفوض لا تُرمّز
+        assert sorted(slide_type for slide_type, _ in encoded) == ["outro", "title"]
+
+        prerenderer.restart()
+        prerenderer.feed(accepted)
+        prerenderer.approve()
+        await settle(prerenderer)
+    asyncio.run(run())
+    creator.close()
+
+    main = {text for slide_type, text in encoded if slide_type == "main"}
+    assert main
+    assert main <= set(creator.script_sentences(accepted))
+    assert not main & set(creator.script_sentences(rejected))
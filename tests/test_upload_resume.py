@@ -0,0 +1,46 @@
+"""استئناف رفع YouTube بعد انقطاع الاتصال، على الخادم المحلي البديل من benchmark.py"""
+import hashlib
+import json
+import os
+import shutil
+
+from benchmark import LocalServices, local_youtube_service
+from main import YouTubeUploader
+
+CHUNK = 256 * 1024
+
+
+def uploader(server, state_dir):
+    # بدون إعادة محاولة داخل نفس التشغيل: الانقطاع يوقف الرفع كما يوقف تشغيلاً في CI
+    result = YouTubeUploader(service=local_youtube_service(server.url), chunk_size=CHUNK, state_dir=str(state_dir))
+    result.max_retries = 0
+    return result
+
+
+def test_upload_resumes_at_saved_offset_after_connection_drop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = os.urandom(10 * CHUNK)
+    video = tmp_path / "long_professional_first.mp4"
+    video.write_bytes(data)
+    state_dir = tmp_path / "uploads"
+
+    with LocalServices(drop_after=4) as server:
+        assert uploader(server, state_dir).upload_video(str(video), "Title", "Description") is None
+        [state_file] = state_dir.iterdir()
+        offset = json.loads(state_file.read_text())["offset"]
+        assert offset == 4 * CHUNK
+
+        # التشغيل التالي: الخادم عاد، ونفس الفيديو بمسار ووقت تعديل مختلفين
+        server.drop_after = None
+        retry = tmp_path / "long_professional_retry.mp4"
+        shutil.copyfile(video, retry)
+        before, accepted = server.bytes_received, len(server.starts)
+        url = uploader(server, state_dir).upload_video(str(retry), "Title", "Description")
+
+        assert url is not None
+        assert len(server.sessions) == 1
+        assert server.starts[accepted] == offset
+        assert server.bytes_received - before == len(data) - offset
+        [digest] = server.digests.values()
+        assert digest.hexdigest() == hashlib.sha256(data).hexdigest()
+        assert not list(state_dir.iterdir())